@@ -8,9 +8,12 @@ from flask_jwt_extended import JWTManager
 from config import Config
 from routes import auth, documents, chat
 from database import init_db
+from utils.logger import setup_logging
 
 def create_app(config_class=Config):
     """Application factory"""
+    setup_logging()
+    
     app = Flask(__name__)
     app.config.from_object(config_class)
     
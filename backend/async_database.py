@@ -0,0 +1,68 @@
+"""
+Async database access layer for the FastAPI routes
+
+The models in database.py are synchronous sqlite3 calls. Awaiting them
+through this module runs each call on a small dedicated thread pool so
+the event loop never blocks on SQLite. The Flask app keeps using
+database.py directly.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import database
+from config import Config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the DB executor, sized to match the connection pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, Config.DB_POOL_SIZE),
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+async def run_db(func, *args, **kwargs):
+    """Run a synchronous DB callable off the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so per-request timings include the DB call
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_executor():
+    """Stop the DB executor (call on shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+class AsyncModel:
+    """Awaitable proxy exposing a sync model's static methods as coroutines"""
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name):
+        method = getattr(self._model, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            return await run_db(method, *args, **kwargs)
+
+        # Cache so repeated lookups skip __getattr__
+        setattr(self, name, wrapper)
+        return wrapper
+
+User = AsyncModel(database.User)
+Document = AsyncModel(database.Document)
+ChatHistory = AsyncModel(database.ChatHistory)
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for ingestion, retrieval and end-to-end queries
+"""
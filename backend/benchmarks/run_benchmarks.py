@@ -0,0 +1,418 @@
+"""
+Benchmark harness
+
+Runs fully offline against a throwaway data directory: synthetic PDFs,
+a hashing embedder instead of the HuggingFace model (unless --embedder model)
+and a stub LLM client. Results are written as JSON; pass --compare with an
+earlier result file to print what got faster or slower.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --only search,delete --index-sizes 1000,100000
+    python -m benchmarks.run_benchmarks --output new.json --compare bench.json
+    python -m benchmarks.run_benchmarks --only pdf_backends --pdf-files 'corpus/*.pdf'
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from benchmarks.synthetic import HashingEmbeddings, StubLLMClient, make_pages, random_vectors, write_pdf
+
+BENCHMARKS = ('ingestion', 'pdf_backends', 'embeddings', 'search', 'delete', 'end_to_end', 'startup')
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Latency distribution of a list of millisecond samples"""
+    ordered = sorted(samples_ms)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+def configure(workdir: str, embedder: str, llm_latency_ms: float):
+    """Point the app at a scratch directory and swap in offline stand-ins"""
+    Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    Config.UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+    Config.VECTOR_STORE_PATH = os.path.join(workdir, 'vector_stores')
+    Config.TEXT_CACHE_PATH = os.path.join(workdir, 'text_cache')
+    Config.INGEST_RECONCILE_ON_STARTUP = False
+    Config.REINDEX_ON_STARTUP = False
+    Config.BCRYPT_ROUNDS = 4
+    Config.LOG_LEVEL = 'WARNING'
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(Config.VECTOR_STORE_PATH, exist_ok=True)
+
+    import utils.vector_store as vector_store_module
+    import utils.rag_pipeline as rag_pipeline_module
+    # Seed the shared model and client caches so the real ones are never loaded
+    if embedder == 'stub':
+        vector_store_module._embeddings[Config.LOCAL_EMBEDDING_MODEL] = HashingEmbeddings(Config.LOCAL_EMBEDDING_MODEL)
+    rag_pipeline_module._llm_client = StubLLMClient(latency=llm_latency_ms / 1000)
+
+def _fill_store(store, size: int, chunks_per_doc: int = 50, seed: int = 0):
+    """Load a vector store with `size` random vectors spread over documents"""
+    import faiss
+    store.index = faiss.IndexFlatL2(store.dimension)
+    store.metadata = []
+    chunks = [
+        {
+            'text': f"synthetic chunk {i} about {i % 97} and {i % 89}",
+            'metadata': {'doc_id': i // chunks_per_doc, 'filename': f"doc{i // chunks_per_doc}.pdf",
+                         'page_number': (i % chunks_per_doc) // 3 + 1, 'chunk_index': i % chunks_per_doc}
+        }
+        for i in range(size)
+    ]
+    store.append_embeddings(chunks, random_vectors(size, store.dimension, seed))
+
+def bench_ingestion(args, workdir: str) -> Dict:
+    """PDF extraction, chunking and streaming ingestion throughput"""
+    from utils.document_processor import DocumentProcessor
+    from utils.vector_store import VectorStore
+    from utils.ingestion import IngestionPipeline
+    from utils.pdf_backends import get_pdf_backend
+
+    path = os.path.join(workdir, 'ingest.pdf')
+    write_pdf(path, make_pages(args.pages, seed=args.seed))
+    processor = DocumentProcessor()
+
+    started = time.perf_counter()
+    pages = list(processor.iter_pages(path))
+    extract_s = time.perf_counter() - started
+
+    # The first pass filled the text cache; this one reads it back
+    started = time.perf_counter()
+    list(processor.iter_pages(path))
+    cached_extract_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = processor.chunk_text(pages, 1, 'ingest.pdf')
+    chunk_s = time.perf_counter() - started
+
+    store = VectorStore(900001)
+    started = time.perf_counter()
+    result = IngestionPipeline(processor, store).run(path, 1, 'ingest.pdf')
+    pipeline_s = time.perf_counter() - started
+
+    return {
+        'pdf_backend': get_pdf_backend().name,
+        'pages': len(pages),
+        'file_bytes': os.path.getsize(path),
+        'chunks': len(chunks),
+        'extract_pages_per_s': round(len(pages) / extract_s, 1),
+        'cached_extract_pages_per_s': round(len(pages) / cached_extract_s, 1),
+        'chunk_pages_per_s': round(len(pages) / chunk_s, 1),
+        'chunks_per_s': round(len(chunks) / chunk_s, 1),
+        'pipeline_pages_per_s': round(len(pages) / pipeline_s, 1),
+        'pipeline_chunks': result['chunks'],
+    }
+
+def bench_pdf_backends(args, workdir: str) -> Dict:
+    """Text extraction speed of every installed PDF backend, and how closely its words match PyPDF2's"""
+    from utils.pdf_backends import FALLBACK_BACKEND, PDF_BACKENDS
+
+    files = sorted(path for pattern in args.pdf_files for path in glob.glob(pattern))
+    if not files:
+        files = [os.path.join(workdir, 'backends.pdf')]
+        write_pdf(files[0], make_pages(args.pages, seed=args.seed))
+
+    def extract(backend):
+        started = time.perf_counter()
+        texts = [text or '' for path in files for _, text in backend.iter_pages(path)]
+        return texts, time.perf_counter() - started
+
+    reference, _ = extract(FALLBACK_BACKEND)
+    reference_words = set(' '.join(reference).split())
+    results = {'files': len(files), 'pages': len(reference)}
+    for name, backend in PDF_BACKENDS.items():
+        if not backend.is_available():
+            results[name] = {'available': False}
+            continue
+        texts, seconds = extract(backend)
+        words = set(' '.join(texts).split())
+        results[name] = {
+            'available': True,
+            'pages_per_s': round(len(texts) / seconds, 1),
+            'empty_pages': sum(1 for text in texts if not text.strip()),
+            'chars': sum(len(text) for text in texts),
+            # Jaccard similarity of the vocabularies; low values mean garbled or missing text
+            'word_overlap': round(len(words & reference_words) / max(1, len(words | reference_words)), 3),
+        }
+    return results
+
+def bench_embeddings(args, workdir: str) -> Dict:
+    """generate_embeddings throughput at several batch sizes"""
+    from utils.vector_store import VectorStore
+
+    store = VectorStore(900002)
+    texts = [' '.join(line for line in page if line) for page in make_pages(64, seed=args.seed)]
+    texts = (texts * ((args.embed_texts // len(texts)) + 1))[:args.embed_texts]
+    results = {'embedder': args.embedder, 'texts': len(texts)}
+    for batch_size in args.embed_batch_sizes:
+        started = time.perf_counter()
+        for offset in range(0, len(texts), batch_size):
+            store.generate_embeddings(texts[offset:offset + batch_size])
+        results[f"batch_{batch_size}_texts_per_s"] = round(len(texts) / (time.perf_counter() - started), 1)
+    return results
+
+def bench_search(args, workdir: str) -> Dict:
+    """VectorStore.search_by_vector latency by index size and FAISS index type"""
+    import faiss
+    import numpy as np
+    from utils.vector_store import VectorStore
+
+    results = {}
+    queries = random_vectors(args.queries, 384, args.seed + 1)
+    for size in args.index_sizes:
+        store = VectorStore(900003)
+        _fill_store(store, size, seed=args.seed)
+        vectors = store._reconstruct(np.arange(size))
+        for index_type in args.index_types:
+            if index_type == 'flat':
+                index = faiss.IndexFlatL2(store.dimension)
+            elif index_type == 'hnsw':
+                index = faiss.IndexHNSWFlat(store.dimension, 32)
+            elif index_type == 'ivf':
+                nlist = max(1, min(size // 39, int(4 * size ** 0.5)))
+                index = faiss.IndexIVFFlat(faiss.IndexFlatL2(store.dimension), store.dimension, nlist)
+                index.train(vectors)
+                index.nprobe = min(nlist, 8)
+            else:
+                raise ValueError(f"Unknown index type: {index_type}")
+            started = time.perf_counter()
+            index.add(vectors)
+            build_ms = (time.perf_counter() - started) * 1000
+            store.index = index
+
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                store.search_by_vector(query, Config.TOP_K_RETRIEVAL)
+                samples.append((time.perf_counter() - started) * 1000)
+            entry = {'build_ms': round(build_ms, 1), **summarize(samples)}
+
+            if index_type == 'flat':
+                # Scoped to one document, as a filtered chat query would be
+                filtered = []
+                for query in queries:
+                    started = time.perf_counter()
+                    store.search_by_vector(query, Config.TOP_K_RETRIEVAL, filters={'doc_ids': [0]})
+                    filtered.append((time.perf_counter() - started) * 1000)
+                entry['filtered_one_doc'] = summarize(filtered)
+            results[f"{index_type}_{size}"] = entry
+    return results
+
+def bench_delete(args, workdir: str) -> Dict:
+    """VectorStore.delete_document cost by index size (it rebuilds the index)"""
+    from utils.vector_store import VectorStore
+
+    results = {'embedder': args.embedder}
+    for size in args.delete_sizes:
+        store = VectorStore(900004)
+        _fill_store(store, size, seed=args.seed)
+        started = time.perf_counter()
+        store.delete_document(0)
+        results[f"delete_{size}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return results
+
+def bench_end_to_end(args, workdir: str) -> Dict:
+    """Upload and /api/chat/query through the FastAPI app with a stub LLM"""
+    from fastapi.testclient import TestClient
+    import main
+
+    path = os.path.join(workdir, 'e2e.pdf')
+    write_pdf(path, make_pages(args.pages, seed=args.seed))
+    questions = [f"What does section {i % args.pages + 1} say about {word}?"
+                 for i, word in enumerate(['revenue', 'risk', 'contract', 'security', 'budget', 'delivery'] * args.queries)]
+    questions = questions[:args.queries]
+
+    with TestClient(main.app) as client:
+        client.post('/api/auth/register', json={'email': 'bench@example.com', 'password': 'benchmark-pass'})
+        token = client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': 'benchmark-pass'}).json()['access_token']
+        headers = {'Authorization': f"Bearer {token}"}
+
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            response = client.post('/api/documents/upload', files=[('files', ('e2e.pdf', f, 'application/pdf'))], headers=headers)
+        upload_ms = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+
+        samples = []
+        stages = {}
+        for question in questions:
+            started = time.perf_counter()
+            response = client.post('/api/chat/query', json={'question': question, 'session_id': 'bench'}, headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            for entry in response.headers.get('server-timing', '').split(','):
+                name, _, duration = entry.strip().partition(';dur=')
+                if duration:
+                    stages.setdefault(name, []).append(float(duration))
+
+    return {
+        'upload_ms': round(upload_ms, 1),
+        'llm_latency_ms': args.llm_latency_ms,
+        'query': summarize(samples),
+        'query_stage_mean_ms': {name: round(statistics.fmean(values), 3) for name, values in sorted(stages.items())},
+    }
+
+def bench_startup(args, workdir: str) -> Dict:
+    """Cold import time of the API app (`import main` in a fresh interpreter) and its slowest packages"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'LOG_LEVEL': 'WARNING'}
+    samples = []
+    packages = {}  # top-level package -> cumulative import ms per run; lazily imported ones never appear
+    for _ in range(args.startup_runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=backend_dir,
+                                env=env, capture_output=True, text=True, timeout=600)
+        if result.returncode != 0:
+            raise RuntimeError(f"import main failed: {result.stderr.strip().splitlines()[-1]}")
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | <indented module name>"
+            fields = line.partition('import time:')[2].split('|')
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            cumulative_ms = int(fields[1]) / 1000
+            if name == 'main':
+                samples.append(cumulative_ms)
+            elif '.' not in name:
+                # Top-level packages, wherever they were first imported (nested ones overlap)
+                packages.setdefault(name, []).append(cumulative_ms)
+    slowest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:10]
+    return {
+        'import_main': summarize(samples),
+        'slowest_packages_ms': {name: round(statistics.median(values), 1) for name, values in slowest},
+    }
+
+def _flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Flatten nested results to dotted keys with numeric values"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(current: Dict, baseline: Dict, threshold: float):
+    """Print metrics that moved by more than `threshold` (a fraction) against a baseline run"""
+    now, before = _flatten(current['results']), _flatten(baseline['results'])
+    print(f"Changes beyond {threshold:.0%} vs baseline ({baseline['meta'].get('timestamp')}):")
+    changed = False
+    for key in sorted(now.keys() & before.keys()):
+        old, new = before[key], now[key]
+        if not old or key.endswith('.n'):
+            continue
+        ratio = new / old
+        if abs(ratio - 1) < threshold:
+            continue
+        # Latencies should go down, throughputs up
+        if key.endswith('_ms'):
+            verdict = 'faster' if ratio < 1 else 'SLOWER'
+        elif key.endswith('_per_s'):
+            verdict = 'faster' if ratio > 1 else 'SLOWER'
+        else:
+            verdict = 'changed'
+        print(f"  {key}: {old} -> {new} ({ratio:.2f}x, {verdict})")
+        changed = True
+    if not changed:
+        print("  none")
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        return ''
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run offline performance benchmarks")
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help=f"Comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument('--pages', type=int, default=50, help="Pages in the synthetic PDFs")
+    parser.add_argument('--pdf-files', action='append', default=[],
+                        help="Glob of real PDFs for the pdf_backends benchmark (repeatable; default: a synthetic PDF)")
+    parser.add_argument('--index-sizes', type=_int_list, default=[1000, 10000, 50000])
+    parser.add_argument('--index-types', default='flat,hnsw,ivf')
+    parser.add_argument('--delete-sizes', type=_int_list, default=[1000, 10000])
+    parser.add_argument('--queries', type=int, default=200, help="Queries per search / end-to-end run")
+    parser.add_argument('--embed-texts', type=int, default=512)
+    parser.add_argument('--embed-batch-sizes', type=_int_list, default=[1, 16, 64])
+    parser.add_argument('--embedder', choices=('stub', 'model'), default='stub',
+                        help="'model' uses the real HuggingFace model (must already be cached for offline runs)")
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help="Delay added by the stub LLM")
+    parser.add_argument('--startup-runs', type=int, default=5, help="Fresh interpreters timed by the startup benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="Baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change reported by --compare")
+    args = parser.parse_args(argv)
+    args.index_types = [item for item in args.index_types.split(',') if item]
+    selected = [name for name in args.only.split(',') if name]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix='docintel-bench-') as workdir:
+        configure(workdir, args.embedder, args.llm_latency_ms)
+        results = {}
+        for name in BENCHMARKS:
+            if name in selected:
+                print(f"Running {name}...", file=sys.stderr)
+                started = time.perf_counter()
+                results[name] = globals()[f"bench_{name}"](args, workdir)
+                print(f"  done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        from database import close_db
+        close_db()
+
+    import faiss
+    import numpy as np
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'faiss': getattr(faiss, '__version__', ''),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f), args.threshold)
+
+if __name__ == '__main__':
+    main()
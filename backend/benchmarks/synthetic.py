@@ -0,0 +1,118 @@
+"""
+Synthetic documents and stand-ins for offline benchmarking
+"""
+import hashlib
+import random
+import time
+import types
+from typing import List
+import numpy as np
+
+_WORDS = (
+    "analysis revenue quarter growth market customer product service contract "
+    "policy risk compliance report system network security data model training "
+    "evaluation result method approach design process quality performance cost "
+    "budget forecast strategy operation team project milestone delivery review "
+    "agreement liability payment invoice schedule requirement specification"
+).split()
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 20))]
+    return ' '.join(words).capitalize() + '.'
+
+def make_pages(page_count: int, paragraphs_per_page: int = 4, seed: int = 0) -> List[List[str]]:
+    """
+    Generate page text as lines: a numbered heading, then wrapped paragraphs
+
+    Returns:
+        One list of lines per page (empty strings separate paragraphs)
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(1, page_count + 1):
+        lines = [f"{page_number}. {rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()}", ""]
+        for _ in range(paragraphs_per_page):
+            paragraph = ' '.join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+            # Wrap like a real PDF layout would
+            line = ""
+            for word in paragraph.split():
+                if len(line) + len(word) + 1 > 90:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}".strip()
+            lines.append(line)
+            lines.append("")
+        pages.append(lines)
+    return pages
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Write a minimal text-only PDF (Helvetica, one content stream per page)"""
+    page_count = len(pages)
+    font_ref = 3 + 2 * page_count
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            ' '.join(f"{3 + 2 * i} 0 R" for i in range(page_count)), page_count
+        ),
+    ]
+    for i, lines in enumerate(pages):
+        escaped = [line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in lines]
+        content = "BT /F1 9 Tf 40 800 Td 11 TL " + ' '.join(f"({line}) '" for line in escaped) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_ref} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += ''.join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, 'w', encoding='latin-1') as f:
+        f.write(output)
+
+def random_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Unit-length random vectors, float32"""
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+class HashingEmbeddings:
+    """Deterministic bag-of-words embedder with the HuggingFaceEmbeddings interface (no model download)"""
+
+    def __init__(self, model_name: str = None, dimension: int = 384, **kwargs):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.md5(word.strip('.,?!').encode('utf-8')).digest()
+                vectors[row, int.from_bytes(digest[:4], 'little') % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class StubLLMClient:
+    """Stands in for the Groq/OpenAI client: returns a canned answer after an optional delay"""
+
+    def __init__(self, api_key: str = None, latency: float = 0.0, **kwargs):
+        self.latency = latency
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        message = types.SimpleNamespace(content="Stub answer based on the provided context [Source 1].")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
@@ -17,6 +17,15 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))  # verified tokens kept in memory
+    AUTH_REVOCATION_TTL = float(os.getenv('AUTH_REVOCATION_TTL', '30'))  # seconds a user's token_version is cached
+    
+    # Password hashing
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))  # existing hashes are upgraded on next login
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+    PASSWORD_HASH_MAX_PER_IP = int(os.getenv('PASSWORD_HASH_MAX_PER_IP', '4'))
+    PASSWORD_HASH_MAX_PER_EMAIL = int(os.getenv('PASSWORD_HASH_MAX_PER_EMAIL', '2'))
     
     # AI Provider Configuration
     AI_PROVIDER = os.getenv('AI_PROVIDER', 'groq').lower()  # 'openai' or 'groq'
@@ -32,21 +41,104 @@ class Config:
     
     # Dynamic model selection
     EMBEDDING_MODEL = OPENAI_EMBEDDING_MODEL  # Groq doesn't provide embeddings
+    LOCAL_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'  # Used by VectorStore
     LLM_MODEL = GROQ_LLM_MODEL if AI_PROVIDER == 'groq' else OPENAI_LLM_MODEL
+    # Override the provider's API endpoint, e.g. http://127.0.0.1:8100 for loadtest/fake_llm_server.py
+    # (Groq clients take the server root, OpenAI clients the /v1 prefix)
+    LLM_BASE_URL = os.getenv('LLM_BASE_URL') or None
     
     # File uploads
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
-    ALLOWED_EXTENSIONS = {'pdf'}
+    ALLOWED_EXTENSIONS = {'pdf', 'docx', 'html', 'htm', 'xhtml', 'md', 'markdown', 'txt', 'text'}  # each needs an extractor (utils/extractors.py)
+    TEXT_SECTION_CHARS = 4000  # formats without pages are split into sections of about this size
+    PDF_BACKEND = os.getenv('PDF_BACKEND', 'auto')  # 'auto' (pypdfium2 if installed), 'pypdfium2', 'pdfminer' or 'pypdf2'
+    
+    # Extracted text cache (keyed by file hash and extractor version)
+    TEXT_CACHE_ENABLED = os.getenv('TEXT_CACHE_ENABLED', 'true').lower() == 'true'
+    TEXT_CACHE_PATH = os.getenv('TEXT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'text_cache'))
+    TEXT_CACHE_MAX_MB = int(os.getenv('TEXT_CACHE_MAX_MB', '1024'))  # least recently used entries are evicted beyond this
+    TEXT_CACHE_COMPRESSION = 6  # gzip level
     
     # Vector store
     VECTOR_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vector_stores')
+    INDEX_VERSIONS_KEPT = int(os.getenv('INDEX_VERSIONS_KEPT', '1'))  # replaced index versions kept for rollback
+    
+    # Index rebuilds (new embedding model or chunking settings; see utils/reindex.py)
+    REINDEX_ON_STARTUP = os.getenv('REINDEX_ON_STARTUP', 'true').lower() == 'true'  # rebuild stale indexes in the background
+    REINDEX_CPU_FRACTION = float(os.getenv('REINDEX_CPU_FRACTION', '0.25'))  # share of a CPU a rebuild may keep busy
     
     # Database
     DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # seconds to wait for a free connection
+    DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+    DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')  # NORMAL is durable enough under WAL
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))  # page cache per connection
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024)))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '256'))
     
     # RAG settings
-    CHUNK_SIZE = 1000
+    CHUNK_SIZE = 1000  # characters, used by the 'recursive' chunker
     CHUNK_OVERLAP = 200
+    CHUNK_STRATEGY = os.getenv('CHUNK_STRATEGY', 'structured')  # 'structured' (token-based) or 'recursive'
+    CHUNK_SIZE_TOKENS = 220  # stays under the 256-token input limit of all-MiniLM-L6-v2
+    CHUNK_OVERLAP_TOKENS = 40
     TOP_K_RETRIEVAL = 5
     TEMPERATURE = 0.1
+    FILTER_EXACT_SCAN_MAX = 20000  # filtered searches over fewer chunks skip the index scan
+    
+    # Streaming ingestion
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))  # chunks embedded per model call
+    INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '2'))  # batches buffered between stages
+    INGEST_SAVE_EVERY_BATCHES = int(os.getenv('INGEST_SAVE_EVERY_BATCHES', '4'))  # index flush + checkpoint interval
+    UPLOAD_READ_SIZE = 1024 * 1024  # bytes read per step when saving uploads
+    INGEST_RECONCILE_ON_STARTUP = os.getenv('INGEST_RECONCILE_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Startup
+    WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() == 'true'  # load models in the background; /api/ready waits for it
+    
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # per-logger overrides, e.g. "auth=DEBUG,access=WARNING"
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' or 'text'
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')  # fraction of requests logged, e.g. "access=0.1"
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # records beyond this are dropped, not waited on
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'  # serve /api/metrics
+    TIMING_HEADERS_ENABLED = os.getenv('TIMING_HEADERS_ENABLED', 'true').lower() == 'true'  # Server-Timing header
+    
+    # Profiling (opt-in; cProfile of the retrieval and ingestion paths, stored by request id)
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')  # "X-Profile: <token>" profiles a request; empty disables the header
+    PROFILE_USER_IDS = os.getenv('PROFILE_USER_IDS', '')  # comma-separated users whose requests are always profiled
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # fraction of all requests profiled
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+    PROFILE_MAX_REQUESTS = int(os.getenv('PROFILE_MAX_REQUESTS', '500'))  # oldest stored profiles are pruned
+    
+    # Batch queries
+    BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '100'))
+    BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', '4'))
+    
+    # Prompt sizing (tokens)
+    TOKENIZER_ENCODING = 'cl100k_base'
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '2500'))  # retrieved context plus conversation history per query
+    CONTEXT_MIN_CHUNK_TOKENS = 40  # smaller trimmed chunks are dropped instead of sent
+    LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '1000'))
+    SUMMARY_CONTEXT_TOKEN_BUDGET = int(os.getenv('SUMMARY_CONTEXT_TOKEN_BUDGET', '6000'))
+    SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '500'))
+    
+    # Re-ranking (optional, needs sentence-transformers)
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '50'))  # over-fetched from the vector store
+    RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', '4'))  # chunks passed on to the LLM
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', '16'))
+    
+    # Conversation-aware retrieval
+    CONVERSATION_HISTORY_TURNS = 3  # previous turns blended into the retrieval query
+    CONVERSATION_HISTORY_WEIGHT = 0.5  # weight of the latest previous question, halved per older turn
+    CONVERSATION_REUSE_THRESHOLD = 0.95  # cosine similarity above which the last turn's chunks are reused
+    CONVERSATION_CACHE_SIZE = 1000  # sessions kept in memory
+    CONVERSATION_ANSWER_PREVIEW = 500  # characters of each previous answer sent to the LLM
@@ -2,24 +2,160 @@
 Database models and initialization
 """
 import sqlite3
+import queue
+import json
+import base64
+import threading
 import bcrypt
 from datetime import datetime
 from contextlib import contextmanager
 from config import Config
+from utils.metrics import instrument_methods
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections shared across threads"""
+    
+    def __init__(self, database_path: str, size: int):
+        self.database_path = database_path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply performance pragmas"""
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=Config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # Connections move between threads via the pool
+            cached_statements=Config.DB_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while a writer is active
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA busy_timeout={int(Config.DB_BUSY_TIMEOUT_MS)}')
+        # Negative cache_size is expressed in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size=-{int(Config.DB_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(Config.DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under the pool size"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            return self._idle.get(timeout=Config.DB_POOL_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+    
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool"""
+        if self._closed:
+            self.discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except Exception:
+            self.discard(conn)
+    
+    def discard(self, conn: sqlite3.Connection):
+        """Close a connection that should not be reused"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+    
+    def close(self):
+        """Close all idle connections and refuse new checkouts"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None or _pool.database_path != Config.DATABASE_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.database_path != Config.DATABASE_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(Config.DATABASE_PATH, Config.DB_POOL_SIZE)
+    return _pool
+
+def close_db():
+    """Close pooled connections (call on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
 @contextmanager
 def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(Config.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Get a pooled database connection"""
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pool.discard(conn)
+            conn = None
         raise
     finally:
-        conn.close()
+        if conn is not None:
+            pool.release(conn)
+
+def encode_cursor(*values) -> str:
+    """Encode a keyset position as an opaque pagination cursor"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a pagination cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid pagination cursor")
+    return values
 
 def init_db():
     """Initialize database tables"""
@@ -70,10 +206,136 @@ def init_db():
         except sqlite3.OperationalError:
             pass  # Column already exists
         
-        # Create indexes for performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_session_id ON chat_history(session_id)')
+        # Token version for revoking issued JWTs (migration)
+        try:
+            cursor.execute('ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Per-document ingest details (migration)
+        for column in ('chunk_count INTEGER NOT NULL DEFAULT 0', 'file_size INTEGER NOT NULL DEFAULT 0', 'embedding_model TEXT',
+                       "status TEXT NOT NULL DEFAULT 'ready'", 'last_page_indexed INTEGER NOT NULL DEFAULT 0',
+                       'file_hash TEXT'):
+            try:
+                cursor.execute(f'ALTER TABLE documents ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+        
+        # Per-user aggregates read by the dashboard (kept up to date by the Document model)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'")
+        stats_table_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY,
+                total_documents INTEGER NOT NULL DEFAULT 0,
+                total_pages INTEGER NOT NULL DEFAULT 0,
+                total_chunks INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                embedding_model TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Backfill aggregates from existing documents (migration, runs once)
+        if not stats_table_exists:
+            _backfill_document_stats(cursor)
+        
+        # Chat sessions table (denormalized summary of chat_history, kept up to date by ChatHistory.create)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_sessions'")
+        sessions_table_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                user_id INTEGER NOT NULL,
+                session_id TEXT NOT NULL,
+                first_question TEXT,
+                first_message TIMESTAMP,
+                last_message TIMESTAMP,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, session_id),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Backfill sessions from existing history (migration, runs once)
+        if not sessions_table_exists:
+            cursor.execute('''
+                INSERT OR IGNORE INTO chat_sessions
+                    (user_id, session_id, first_question, first_message, last_message, message_count)
+                SELECT user_id, session_id,
+                       (SELECT question FROM chat_history ch2
+                        WHERE ch2.user_id = chat_history.user_id
+                          AND ch2.session_id = chat_history.session_id
+                        ORDER BY timestamp ASC, id ASC LIMIT 1),
+                       MIN(timestamp), MAX(timestamp), COUNT(*)
+                FROM chat_history
+                WHERE session_id IS NOT NULL
+                GROUP BY user_id, session_id
+            ''')
+        
+        # Create indexes for performance (composite indexes back the keyset pagination queries)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_user_upload ON documents(user_id, upload_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_user_time ON chat_history(user_id, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_user_session_time ON chat_history(user_id, session_id, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_last ON chat_sessions(user_id, last_message)')
+        
+        # Single-column indexes superseded by the composite ones above
+        cursor.execute('DROP INDEX IF EXISTS idx_documents_user_id')
+        cursor.execute('DROP INDEX IF EXISTS idx_chat_history_user_id')
+        cursor.execute('DROP INDEX IF EXISTS idx_chat_history_session_id')
+
+def _backfill_document_stats(cursor):
+    """Derive chunk counts, file sizes and user_stats rows for documents that predate them"""
+    import os
+    import pickle
+    
+    cursor.execute('SELECT id, user_id, file_path FROM documents')
+    documents = cursor.fetchall()
+    
+    chunk_counts = {}
+    for user_id in {doc['user_id'] for doc in documents}:
+        metadata_path = os.path.join(Config.VECTOR_STORE_PATH, f"user_{user_id}", "metadata.pkl")
+        if not os.path.exists(metadata_path):
+            continue
+        try:
+            with open(metadata_path, 'rb') as f:
+                metadata = pickle.load(f)
+        except Exception:
+            continue  # Unreadable metadata, leave chunk counts at 0
+        for item in metadata:
+            key = (user_id, item['metadata'].get('doc_id'))
+            chunk_counts[key] = chunk_counts.get(key, 0) + 1
+    
+    for doc in documents:
+        file_size = os.path.getsize(doc['file_path']) if os.path.exists(doc['file_path']) else 0
+        cursor.execute(
+            'UPDATE documents SET chunk_count = ?, file_size = ? WHERE id = ?',
+            (chunk_counts.get((doc['user_id'], doc['id']), 0), file_size, doc['id'])
+        )
+    
+    cursor.execute('''
+        INSERT OR REPLACE INTO user_stats
+            (user_id, total_documents, total_pages, total_chunks, total_bytes)
+        SELECT user_id, COUNT(*), COALESCE(SUM(page_count), 0), SUM(chunk_count), SUM(file_size)
+        FROM documents
+        GROUP BY user_id
+    ''')
+
+def _update_user_stats(cursor, user_id, documents=0, pages=0, chunks=0, size=0, embedding_model=None):
+    """Apply deltas to a user's aggregate row, creating it if needed"""
+    cursor.execute(
+        '''INSERT INTO user_stats
+               (user_id, total_documents, total_pages, total_chunks, total_bytes, embedding_model)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (user_id) DO UPDATE SET
+               total_documents = user_stats.total_documents + excluded.total_documents,
+               total_pages = user_stats.total_pages + excluded.total_pages,
+               total_chunks = user_stats.total_chunks + excluded.total_chunks,
+               total_bytes = user_stats.total_bytes + excluded.total_bytes,
+               embedding_model = COALESCE(excluded.embedding_model, user_stats.embedding_model),
+               updated_at = CURRENT_TIMESTAMP''',
+        (user_id, documents, pages, chunks, size, embedding_model)
+    )
 
 class User:
     """User model"""
@@ -81,8 +343,14 @@ class User:
     @staticmethod
     def create(email, password):
         """Create a new user"""
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
+        password_hash = bcrypt.hashpw(
+            password.encode('utf-8'), bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)
+        ).decode('utf-8')
+        return User.create_with_hash(email, password_hash)
+    
+    @staticmethod
+    def create_with_hash(email, password_hash):
+        """Create a new user from an already computed password hash"""
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -107,6 +375,39 @@ class User:
             cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
             return cursor.fetchone()
     
+    @staticmethod
+    def update_password_hash(user_id, password_hash):
+        """Replace a user's stored password hash"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE users SET password_hash = ? WHERE id = ?',
+                (password_hash, user_id)
+            )
+            return cursor.rowcount > 0
+    
+    @staticmethod
+    def get_token_version(user_id):
+        """Get the user's current token version, or None if the user does not exist"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT token_version FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+            return row['token_version'] if row else None
+    
+    @staticmethod
+    def revoke_tokens(user_id):
+        """Invalidate every token issued to the user so far, returning the new version"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE users SET token_version = token_version + 1 WHERE id = ?',
+                (user_id,)
+            )
+            cursor.execute('SELECT token_version FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+            return row['token_version'] if row else None
+    
     @staticmethod
     def verify_password(user, password):
         """Verify user password"""
@@ -116,16 +417,71 @@ class Document:
     """Document model"""
     
     @staticmethod
-    def create(user_id, filename, original_filename, file_path, page_count):
-        """Create a new document record"""
+    def create(user_id, filename, original_filename, file_path, page_count, file_size=None, status='ready',
+               file_hash=None):
+        """Create a new document record ('processing' while its chunks are still being indexed)"""
+        import os
+        
+        if file_size is None:
+            file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                '''INSERT INTO documents (user_id, filename, original_filename, file_path, page_count)
-                   VALUES (?, ?, ?, ?, ?)''',
-                (user_id, filename, original_filename, file_path, page_count)
+                '''INSERT INTO documents (user_id, filename, original_filename, file_path, page_count, file_size, status, file_hash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (user_id, filename, original_filename, file_path, page_count, file_size, status, file_hash)
             )
-            return cursor.lastrowid
+            doc_id = cursor.lastrowid
+            _update_user_stats(cursor, user_id, documents=1, pages=page_count or 0, size=file_size)
+            return doc_id
+    
+    @staticmethod
+    def set_chunk_count(doc_id, user_id, chunk_count, embedding_model=None, last_page=None):
+        """Record how many chunks a document contributed to the vector store (and up to which page)"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT chunk_count FROM documents WHERE id = ? AND user_id = ?',
+                (doc_id, user_id)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return False
+            cursor.execute(
+                '''UPDATE documents SET chunk_count = ?, embedding_model = COALESCE(?, embedding_model),
+                   last_page_indexed = COALESCE(?, last_page_indexed)
+                   WHERE id = ?''',
+                (chunk_count, embedding_model, last_page, doc_id)
+            )
+            _update_user_stats(
+                cursor, user_id,
+                chunks=chunk_count - row['chunk_count'],
+                embedding_model=embedding_model
+            )
+            return True
+    
+    @staticmethod
+    def set_status(doc_id, user_id, status):
+        """Set a document's ingestion status ('processing', 'ready' or 'failed')"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE documents SET status = ? WHERE id = ? AND user_id = ?',
+                (status, doc_id, user_id)
+            )
+            return cursor.rowcount > 0
+    
+    @staticmethod
+    def get_all():
+        """Get every document's owner, file and ingestion checkpoint (for startup reconciliation)"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                '''SELECT id, user_id, original_filename, file_path, file_hash, status, chunk_count, last_page_indexed
+                   FROM documents ORDER BY id'''
+            )
+            return cursor.fetchall()
     
     @staticmethod
     def get_by_user(user_id):
@@ -138,6 +494,51 @@ class Document:
             )
             return cursor.fetchall()
     
+    @staticmethod
+    def get_page_by_user(user_id, limit=50, cursor=None):
+        """
+        Get one page of a user's documents, newest first
+        
+        Returns:
+            Dict with 'items' and 'next_cursor' (None on the last page)
+        """
+        query = 'SELECT * FROM documents WHERE user_id = ?'
+        params = [user_id]
+        if cursor:
+            upload_date, doc_id = decode_cursor(cursor, 2)
+            query += ' AND (upload_date, id) < (?, ?)'
+            params += [upload_date, doc_id]
+        query += ' ORDER BY upload_date DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        
+        with get_db() as conn:
+            rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['upload_date'], rows[-1]['id'])
+        return {'items': rows, 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def find_ids(user_id, filename=None, uploaded_after=None, uploaded_before=None):
+        """Get IDs of a user's documents matching a filename substring and/or upload date range"""
+        query = 'SELECT id FROM documents WHERE user_id = ?'
+        params = [user_id]
+        if uploaded_after is not None:
+            query += ' AND upload_date >= ?'
+            params.append(uploaded_after)
+        if uploaded_before is not None:
+            query += ' AND upload_date <= ?'
+            params.append(uploaded_before)
+        if filename:
+            query += " AND original_filename LIKE ? ESCAPE '\\'"
+            escaped = filename.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        
+        with get_db() as conn:
+            return [row['id'] for row in conn.execute(query, params).fetchall()]
+    
     @staticmethod
     def get_by_id(doc_id, user_id):
         """Get a specific document"""
@@ -154,46 +555,47 @@ class Document:
         """Delete a document"""
         with get_db() as conn:
             cursor = conn.cursor()
+            cursor.execute(
+                'SELECT page_count, chunk_count, file_size FROM documents WHERE id = ? AND user_id = ?',
+                (doc_id, user_id)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return False
             cursor.execute(
                 'DELETE FROM documents WHERE id = ? AND user_id = ?',
                 (doc_id, user_id)
             )
-            return cursor.rowcount > 0
+            _update_user_stats(
+                cursor, user_id,
+                documents=-1,
+                pages=-(row['page_count'] or 0),
+                chunks=-row['chunk_count'],
+                size=-row['file_size']
+            )
+            return True
     
     @staticmethod
     def get_stats(user_id):
         """Get document statistics for a user"""
-        import os
-        import pickle
-        from config import Config
-        
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                '''SELECT 
-                    COUNT(*) as total_documents,
-                    COALESCE(SUM(page_count), 0) as total_pages
-                   FROM documents WHERE user_id = ?''',
+                '''SELECT total_documents, total_pages, total_chunks, total_bytes, embedding_model
+                   FROM user_stats WHERE user_id = ?''',
                 (user_id,)
             )
-            result = cursor.fetchone()
-            
-            # Calculate total chunks from vector store metadata
-            total_chunks = 0
-            metadata_path = os.path.join(Config.VECTOR_STORE_PATH, f"user_{user_id}", "metadata.pkl")
-            if os.path.exists(metadata_path):
-                try:
-                    with open(metadata_path, 'rb') as f:
-                        metadata = pickle.load(f)
-                        total_chunks = len(metadata)
-                except Exception:
-                    pass  # If error reading metadata, keep chunks as 0
+            row = cursor.fetchone()
             
-            return {
-                'total_documents': result['total_documents'],
-                'total_pages': result['total_pages'],
-                'total_chunks': total_chunks
-            }
+            if not row:
+                return {
+                    'total_documents': 0,
+                    'total_pages': 0,
+                    'total_chunks': 0,
+                    'total_bytes': 0,
+                    'embedding_model': None
+                }
+            return dict(row)
 
 class ChatHistory:
     """Chat history model"""
@@ -201,7 +603,6 @@ class ChatHistory:
     @staticmethod
     def create(user_id, question, answer, sources, session_id=None):
         """Create a new chat history entry"""
-        import json
         sources_json = json.dumps(sources) if sources else None
         
         with get_db() as conn:
@@ -211,50 +612,71 @@ class ChatHistory:
                    VALUES (?, ?, ?, ?, ?)''',
                 (user_id, session_id, question, answer, sources_json)
             )
-            return cursor.lastrowid
+            history_id = cursor.lastrowid
+            
+            # Keep the session summary in step within the same transaction
+            if session_id is not None:
+                cursor.execute(
+                    '''INSERT INTO chat_sessions
+                           (user_id, session_id, first_question, first_message, last_message, message_count)
+                       SELECT user_id, session_id, question, timestamp, timestamp, 1
+                       FROM chat_history WHERE id = ?
+                       ON CONFLICT (user_id, session_id) DO UPDATE SET
+                           last_message = excluded.last_message,
+                           message_count = chat_sessions.message_count + 1''',
+                    (history_id,)
+                )
+            return history_id
+    
+    @staticmethod
+    def _to_dict(row):
+        """Convert a history row to a dict with parsed sources"""
+        item = dict(row)
+        if item['sources']:
+            item['sources'] = json.loads(item['sources'])
+        return item
     
     @staticmethod
     def get_by_user(user_id, limit=50):
         """Get chat history for a user"""
-        import json
+        return ChatHistory.get_page_by_user(user_id, limit=limit)['items']
+    
+    @staticmethod
+    def get_page_by_user(user_id, limit=50, cursor=None):
+        """
+        Get one page of a user's chat history, newest first
+        
+        Returns:
+            Dict with 'items' and 'next_cursor' (None on the last page)
+        """
+        query = 'SELECT * FROM chat_history WHERE user_id = ?'
+        params = [user_id]
+        if cursor:
+            timestamp, history_id = decode_cursor(cursor, 2)
+            query += ' AND (timestamp, id) < (?, ?)'
+            params += [timestamp, history_id]
+        query += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
         
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''SELECT * FROM chat_history WHERE user_id = ?
-                   ORDER BY timestamp DESC LIMIT ?''',
-                (user_id, limit)
-            )
-            rows = cursor.fetchall()
-            
-            # Parse sources JSON
-            history = []
-            for row in rows:
-                item = dict(row)
-                if item['sources']:
-                    item['sources'] = json.loads(item['sources'])
-                history.append(item)
-            
-            return history
+            rows = conn.execute(query, params).fetchall()
+        
+        history = [ChatHistory._to_dict(row) for row in rows]
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = encode_cursor(history[-1]['timestamp'], history[-1]['id'])
+        return {'items': history, 'next_cursor': next_cursor}
     
     @staticmethod
     def get_sessions(user_id):
         """Get all chat sessions for a user"""
-        import json
-        
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                '''SELECT session_id, 
-                          MIN(timestamp) as first_message,
-                          MAX(timestamp) as last_message,
-                          COUNT(*) as message_count,
-                          (SELECT question FROM chat_history ch2 
-                           WHERE ch2.session_id = chat_history.session_id 
-                           ORDER BY timestamp ASC LIMIT 1) as first_question
-                   FROM chat_history 
-                   WHERE user_id = ? AND session_id IS NOT NULL
-                   GROUP BY session_id
+                '''SELECT session_id, first_message, last_message, message_count, first_question
+                   FROM chat_sessions
+                   WHERE user_id = ?
                    ORDER BY last_message DESC''',
                 (user_id,)
             )
@@ -267,29 +689,58 @@ class ChatHistory:
             return sessions
     
     @staticmethod
-    def get_by_session(user_id, session_id, limit=100):
-        """Get chat history for a specific session"""
-        import json
+    def get_by_session(user_id, session_id, limit=None):
+        """Get chat history for a specific session (all messages unless limit is given)"""
+        if limit is not None:
+            return ChatHistory.get_page_by_session(user_id, session_id, limit=limit)['items']
         
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''SELECT * FROM chat_history 
+            rows = conn.execute(
+                '''SELECT * FROM chat_history
                    WHERE user_id = ? AND session_id = ?
-                   ORDER BY timestamp ASC LIMIT ?''',
+                   ORDER BY timestamp ASC, id ASC''',
+                (user_id, session_id)
+            ).fetchall()
+        return [ChatHistory._to_dict(row) for row in rows]
+    
+    @staticmethod
+    def get_recent_by_session(user_id, session_id, limit=5):
+        """Get the latest messages of a session in chronological order"""
+        with get_db() as conn:
+            rows = conn.execute(
+                '''SELECT * FROM chat_history
+                   WHERE user_id = ? AND session_id = ?
+                   ORDER BY timestamp DESC, id DESC LIMIT ?''',
                 (user_id, session_id, limit)
-            )
-            rows = cursor.fetchall()
-            
-            # Parse sources JSON
-            history = []
-            for row in rows:
-                item = dict(row)
-                if item['sources']:
-                    item['sources'] = json.loads(item['sources'])
-                history.append(item)
-            
-            return history
+            ).fetchall()
+        return [ChatHistory._to_dict(row) for row in reversed(rows)]
+    
+    @staticmethod
+    def get_page_by_session(user_id, session_id, limit=100, cursor=None):
+        """
+        Get one page of a session's chat history, oldest first
+        
+        Returns:
+            Dict with 'items' and 'next_cursor' (None on the last page)
+        """
+        query = 'SELECT * FROM chat_history WHERE user_id = ? AND session_id = ?'
+        params = [user_id, session_id]
+        if cursor:
+            timestamp, history_id = decode_cursor(cursor, 2)
+            query += ' AND (timestamp, id) > (?, ?)'
+            params += [timestamp, history_id]
+        query += ' ORDER BY timestamp ASC, id ASC LIMIT ?'
+        params.append(limit + 1)
+        
+        with get_db() as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        history = [ChatHistory._to_dict(row) for row in rows]
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = encode_cursor(history[-1]['timestamp'], history[-1]['id'])
+        return {'items': history, 'next_cursor': next_cursor}
     
     @staticmethod
     def delete_by_user(user_id):
@@ -297,4 +748,10 @@ class ChatHistory:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM chat_history WHERE user_id = ?', (user_id,))
-            return cursor.rowcount
+            deleted_count = cursor.rowcount
+            cursor.execute('DELETE FROM chat_sessions WHERE user_id = ?', (user_id,))
+            return deleted_count
+
+# Time every model method as a 'db' stage
+for _model in (User, Document, ChatHistory):
+    instrument_methods(_model, 'db')
@@ -0,0 +1,3 @@
+"""
+Load-testing tools: a local fake LLM server and a traffic generator
+"""
@@ -0,0 +1,104 @@
+"""
+Fake OpenAI/Groq-compatible chat completions server
+
+Answers POST .../chat/completions (both the OpenAI /v1 and the Groq
+/openai/v1 paths) after a configurable delay: a fixed time to first token
+plus the completion length divided by a token rate. Nothing leaves the
+machine, so the API can be load tested without provider quotas or costs.
+
+Usage (from backend/):
+    python -m loadtest.fake_llm_server --port 8100 --latency-ms 300 --tokens-per-s 250
+    LLM_BASE_URL=http://127.0.0.1:8100 uvicorn main:app --port 5000
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+class FakeLLMSettings:
+    """Behaviour of the fake server"""
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 50.0, tokens_per_s: float = 250.0,
+                 completion_tokens: int = 150, error_rate: float = 0.0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_s = tokens_per_s
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+def _estimate_tokens(messages) -> int:
+    """Rough prompt size (4 characters per token)"""
+    return sum(len(str(message.get('content', ''))) for message in messages) // 4
+
+def create_app(settings: FakeLLMSettings = None) -> FastAPI:
+    """Build the fake server"""
+    settings = settings or FakeLLMSettings()
+    app = FastAPI(title="Fake LLM server")
+    app.state.requests = 0
+
+    @app.post("/{prefix:path}chat/completions")
+    async def chat_completions(prefix: str, request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        max_tokens = body.get('max_tokens') or settings.completion_tokens
+        completion_tokens = max(1, min(settings.completion_tokens, max_tokens))
+
+        delay_ms = settings.latency_ms + settings.random.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if settings.tokens_per_s > 0:
+            delay_ms += completion_tokens / settings.tokens_per_s * 1000
+        await asyncio.sleep(max(0.0, delay_ms) / 1000)
+
+        if settings.random.random() < settings.error_rate:
+            return JSONResponse(
+                status_code=503,
+                content={'error': {'message': 'Injected failure from fake LLM server', 'type': 'server_error'}}
+            )
+
+        prompt_tokens = _estimate_tokens(body.get('messages', []))
+        content = ' '.join(['Stub'] + ['answer'] * (completion_tokens - 2) + ['[Source 1].'])
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake-llm'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {'requests': app.state.requests}
+
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI/Groq chat completions API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency-ms', type=float, default=300.0, help="Time to first token")
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help="Uniform +/- noise on the latency")
+    parser.add_argument('--tokens-per-s', type=float, default=250.0, help="Generation speed (0 = instant)")
+    parser.add_argument('--completion-tokens', type=int, default=150, help="Answer length (capped by max_tokens)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    settings = FakeLLMSettings(args.latency_ms, args.jitter_ms, args.tokens_per_s,
+                               args.completion_tokens, args.error_rate, args.seed)
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level='warning')
+
+if __name__ == '__main__':
+    main()
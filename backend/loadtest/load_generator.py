@@ -0,0 +1,208 @@
+"""
+Load generator for the DocIntel API
+
+Simulates concurrent users. Each registers an account and uploads a
+synthetic PDF, then loops over a weighted mix of queries, stats polling,
+session listing and further uploads until the run ends. It reports
+throughput, tail latencies and error rates per endpoint, and how many users
+actually signed up.
+
+All users register from one address, so the API's per-IP password hashing
+limit (PASSWORD_HASH_MAX_PER_IP) turns most of a burst of sign-ups into 429s.
+Registration is retried with backoff; raise the limit on the API for large
+runs, or spread sign-ups with --ramp-up.
+
+Usage (from backend/, with the API and loadtest/fake_llm_server.py running):
+    python -m loadtest.load_generator --base-url http://127.0.0.1:5000 --users 20 --duration 60
+    python -m loadtest.load_generator --mix query=8,stats=3,sessions=2,upload=1 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_pages, write_pdf
+from benchmarks.run_benchmarks import summarize
+
+DEFAULT_MIX = 'query=6,stats=2,sessions=1,upload=1'
+QUESTIONS = [
+    "What does the document say about revenue growth?",
+    "Summarize the main risks mentioned.",
+    "What are the payment terms in the contract?",
+    "Which milestones are scheduled for delivery?",
+    "How is security handled in the system design?",
+    "What is the budget forecast for next quarter?",
+]
+
+class Recorder:
+    """Latency and outcome samples per endpoint"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.users = {'started': 0, 'signed_up': 0, 'failed': 0}
+
+    def record(self, endpoint: str, elapsed_ms: float, status: str, ok: bool):
+        self.samples.setdefault(endpoint, []).append(elapsed_ms)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, duration_s: float) -> Dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            errors = self.errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'throughput_per_s': round(len(samples) / duration_s, 2),
+                'error_rate': round(errors / len(samples), 4),
+                'statuses': self.statuses[endpoint],
+                **summarize(samples),
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            'duration_s': round(duration_s, 2),
+            'requests': total,
+            'throughput_per_s': round(total / duration_s, 2) if duration_s else 0.0,
+            'error_rate': round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            'users': dict(self.users),
+            'endpoints': endpoints,
+        }
+
+async def timed_request(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    """Send one request and record its latency and outcome"""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = str(response.status_code)
+        ok = response.status_code < 400
+    except httpx.HTTPError as e:
+        response = None
+        status = type(e).__name__
+        ok = False
+    recorder.record(endpoint, (time.perf_counter() - started) * 1000, status, ok)
+    return response
+
+async def register(client: httpx.AsyncClient, recorder: Recorder, deadline: float, rng: random.Random):
+    """Create an account, retrying with jittered backoff while the API answers 429; the response or None"""
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    delay = 0.25
+    while True:
+        response = await timed_request(client, recorder, 'register', 'POST', '/api/auth/register',
+                                       json={'email': email, 'password': 'load-test-password'})
+        if response is None or response.status_code != 429 or time.monotonic() + delay >= deadline:
+            return response
+        await asyncio.sleep(delay * rng.uniform(0.5, 1.5))
+        delay = min(delay * 2, 5.0)
+
+async def virtual_user(number: int, args, pdf_bytes: bytes, recorder: Recorder, deadline: float, rng: random.Random):
+    """One simulated user: sign up, upload, then loop over the operation mix"""
+    operations, weights = zip(*args.mix.items())
+    recorder.users['started'] += 1
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        response = await register(client, recorder, deadline, rng)
+        if response is None or response.status_code >= 400:
+            recorder.users['failed'] += 1
+            status = response.status_code if response is not None else 'no response'
+            print(f"virtual user {number} could not sign up ({status}); it sends no further requests", file=sys.stderr)
+            return
+        recorder.users['signed_up'] += 1
+        headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+        async def upload():
+            await timed_request(client, recorder, 'upload', 'POST', '/api/documents/upload', headers=headers,
+                                files=[('files', (f"load-{number}.pdf", pdf_bytes, 'application/pdf'))])
+
+        await upload()
+        session_id = f"load-{number}-{uuid.uuid4().hex[:8]}"
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            if operation == 'query':
+                await timed_request(client, recorder, 'query', 'POST', '/api/chat/query', headers=headers,
+                                    json={'question': rng.choice(QUESTIONS), 'session_id': session_id})
+            elif operation == 'stats':
+                await timed_request(client, recorder, 'stats', 'GET', '/api/documents/stats', headers=headers)
+            elif operation == 'sessions':
+                await timed_request(client, recorder, 'sessions', 'GET', '/api/chat/sessions', headers=headers)
+            elif operation == 'upload':
+                await upload()
+            if args.think_time_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_time_ms))
+
+async def run(args) -> Dict:
+    """Drive all virtual users until the duration elapses"""
+    pages = make_pages(args.pdf_pages, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load-test.pdf')
+        write_pdf(path, pages)
+        with open(path, 'rb') as f:
+            pdf_bytes = f.read()
+
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    users = []
+    for number in range(args.users):
+        users.append(asyncio.create_task(
+            virtual_user(number, args, pdf_bytes, recorder, deadline, random.Random(args.seed + number))
+        ))
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up / args.users)
+    await asyncio.gather(*users)
+    return recorder.report(time.monotonic() - started)
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in ('query', 'stats', 'sessions', 'upload'):
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def print_report(report: Dict):
+    print(f"{report['requests']} requests in {report['duration_s']}s: "
+          f"{report['throughput_per_s']} req/s, {report['error_rate']:.2%} errors")
+    users = report['users']
+    print(f"{users['signed_up']} of {users['started']} virtual users signed up"
+          + (f", {users['failed']} failed (see PASSWORD_HASH_MAX_PER_IP)" if users['failed'] else ""))
+    print(f"{'endpoint':<10} {'reqs':>6} {'req/s':>8} {'err%':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<10} {stats['requests']:>6} {stats['throughput_per_s']:>8} {stats['error_rate']:>7.2%} "
+              f"{stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms {stats['max_ms']:>7.1f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate concurrent load against the DocIntel API")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run after start")
+    parser.add_argument('--ramp-up', type=float, default=0.0, help="Seconds over which users are started")
+    parser.add_argument('--mix', type=_parse_mix, default=_parse_mix(DEFAULT_MIX),
+                        help=f"Weighted operation mix (default: {DEFAULT_MIX})")
+    parser.add_argument('--think-time-ms', type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument('--pdf-pages', type=int, default=10, help="Pages in each uploaded synthetic PDF")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,22 @@
 FastAPI application entry point
 """
 import os
+import threading
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from config import Config
 from routes_fastapi import auth, documents, chat
-from database import init_db
+from database import init_db, close_db
+from async_database import shutdown_executor
+from utils.password_hasher import password_hasher
+from utils.ingestion import reconcile_ingestion
+from utils.metrics import TimingMiddleware, render_metrics
+from utils.logger import RequestContextMiddleware, setup_logging, shutdown_logging
+from utils.profiling import ProfilingMiddleware
+from utils.reindex import schedule_stale_rebuilds
+from utils.warmup import readiness, warm_up
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -16,11 +26,26 @@ async def lifespan(app: FastAPI):
     init_db()
     os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(Config.VECTOR_STORE_PATH, exist_ok=True)
+    if Config.INGEST_RECONCILE_ON_STARTUP:
+        # Resume interrupted uploads in the background so startup is not blocked
+        threading.Thread(target=reconcile_ingestion, name="ingest-reconcile", daemon=True).start()
+    if Config.REINDEX_ON_STARTUP:
+        # Indexes built with another embedding model or chunking are rebuilt while the old ones keep serving
+        threading.Thread(target=schedule_stale_rebuilds, name="reindex-schedule", daemon=True).start()
+    if Config.WARMUP_ON_STARTUP:
+        # Load models off the startup path; /api/ready turns ready when done
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    password_hasher.shutdown()
+    shutdown_executor()
+    close_db()
+    shutdown_logging()
 
 def create_app():
     """Application factory"""
+    setup_logging()
+    
     app = FastAPI(
         title="DocIntel AI API",
         description="Intelligent Document Analysis with RAG",
@@ -37,6 +62,14 @@ def create_app():
         allow_headers=["*"],
     )
     
+    # Latency histograms and Server-Timing headers
+    app.add_middleware(TimingMiddleware)
+    if Config.PROFILING_ENABLED:
+        # Opt-in cProfile of the retrieval and ingestion paths (needs the request id, so sits inside it)
+        app.add_middleware(ProfilingMiddleware)
+    # Request ids and access log (outermost, so it covers everything above)
+    app.add_middleware(RequestContextMiddleware)
+    
     # Register routers
     app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
     app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
@@ -46,6 +79,18 @@ def create_app():
     async def health_check():
         return {"status": "healthy", "message": "API is running"}
     
+    @app.get("/api/ready")
+    async def readiness_check():
+        """Readiness probe: 503 until the models are warm (health_check only says the process is up)"""
+        state = readiness()
+        return JSONResponse(status_code=200 if state['ready'] else 503, content=state)
+    
+    if Config.METRICS_ENABLED:
+        @app.get("/api/metrics", response_class=PlainTextResponse)
+        async def metrics():
+            """Stage and request latency histograms in Prometheus text format"""
+            return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+    
     return app
 
 app = create_app()
@@ -9,9 +9,11 @@ from werkzeug.utils import secure_filename
 from database import Document
 from utils.document_processor import DocumentProcessor
 from utils.vector_store import VectorStore
+from utils.logger import get_logger
 from config import Config
 
 bp = Blueprint('documents', __name__)
+logger = get_logger('documents')
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -21,21 +23,19 @@ def allowed_file(filename):
 @bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_documents():
-    """Upload and process multiple PDF documents"""
+    """Upload and process multiple documents (PDF, DOCX, HTML, Markdown or plain text)"""
     try:
         user_id = get_jwt_identity()
-        print(f"[UPLOAD] User ID: {user_id}")
-        
         # Check if files are present
         if 'files' not in request.files:
-            print("[UPLOAD ERROR] No files in request")
+            logger.info("Upload rejected: no files in request", extra={'user_id': user_id})
             return jsonify({'error': 'No files provided'}), 400
         
         files = request.files.getlist('files')
-        print(f"[UPLOAD] Received {len(files)} files")
+        logger.info("Upload received", extra={'user_id': user_id, 'files': len(files)})
         
         if not files or all(file.filename == '' for file in files):
-            print("[UPLOAD ERROR] No files selected")
+            logger.info("Upload rejected: no files selected", extra={'user_id': user_id})
             return jsonify({'error': 'No files selected'}), 400
         
         processor = DocumentProcessor()
@@ -46,7 +46,6 @@ def upload_documents():
         for file in files:
             if file and allowed_file(file.filename):
                 try:
-                    print(f"[UPLOAD] Processing: {file.filename}")
                     # Generate unique filename
                     original_filename = secure_filename(file.filename)
                     unique_filename = f"{uuid.uuid4()}_{original_filename}"
@@ -56,11 +55,10 @@ def upload_documents():
                     os.makedirs(user_upload_dir, exist_ok=True)
                     file_path = os.path.join(user_upload_dir, unique_filename)
                     file.save(file_path)
-                    print(f"[UPLOAD] Saved to: {file_path}")
+                    logger.debug("Upload saved", extra={'path': file_path})
                     
                     # Get page count
                     page_count = processor.get_page_count(file_path)
-                    print(f"[UPLOAD] Page count: {page_count}")
                     
                     # Save to database
                     doc_id = Document.create(
@@ -70,18 +68,17 @@ def upload_documents():
                         file_path=file_path,
                         page_count=page_count
                     )
-                    print(f"[UPLOAD] DB doc_id: {doc_id}")
                     
                     # Process document
-                    print(f"[UPLOAD] Extracting text...")
                     pages = processor.extract_text_from_pdf(file_path)
                     chunks = processor.chunk_text(pages, doc_id, original_filename)
-                    print(f"[UPLOAD] Created {len(chunks)} chunks")
                     
                     # Add to vector store
-                    print(f"[UPLOAD] Generating embeddings...")
                     vector_store.add_documents(chunks)
-                    print(f"[UPLOAD] Successfully added to vector store")
+                    Document.set_chunk_count(doc_id, user_id, len(chunks), vector_store.model_name)
+                    logger.info("Document indexed", extra={
+                        'user_id': user_id, 'doc_id': doc_id, 'pages': page_count, 'chunks': len(chunks)
+                    })
                     
                     uploaded_docs.append({
                         'id': doc_id,
@@ -91,9 +88,7 @@ def upload_documents():
                     })
                     
                 except Exception as e:
-                    print(f"[UPLOAD ERROR] Failed to process {file.filename}: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("Failed to process upload", extra={'user_id': user_id, 'upload': file.filename})
                     errors.append({
                         'filename': file.filename,
                         'error': str(e)
@@ -101,7 +96,7 @@ def upload_documents():
             else:
                 errors.append({
                     'filename': file.filename,
-                    'error': 'Invalid file type. Only PDF files are allowed.'
+                    'error': f"Invalid file type. Allowed types: {', '.join(sorted(Config.ALLOWED_EXTENSIONS))}."
                 })
         
         response = {
@@ -112,13 +107,13 @@ def upload_documents():
         if errors:
             response['errors'] = errors
         
-        print(f"[UPLOAD] Complete. Success: {len(uploaded_docs)}, Errors: {len(errors)}")
+        logger.info("Upload complete", extra={
+            'user_id': user_id, 'succeeded': len(uploaded_docs), 'failed': len(errors)
+        })
         return jsonify(response), 201 if uploaded_docs else 400
         
     except Exception as e:
-        print(f"[UPLOAD CRITICAL ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Upload failed")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
         
     except Exception as e:
@@ -229,21 +224,8 @@ def get_stats():
     """Get document statistics"""
     try:
         user_id = get_jwt_identity()
-        
-        # Get document count from database
-        documents = Document.get_by_user(user_id)
-        total_docs = len(documents)
-        total_pages = sum(doc['page_count'] or 0 for doc in documents)
-        
-        # Get vector store stats
-        vector_store = VectorStore(user_id)
-        total_chunks = vector_store.get_chunk_count()
-        
-        return jsonify({
-            'total_documents': total_docs,
-            'total_pages': total_pages,
-            'total_chunks': total_chunks
-        }), 200
+        stats = Document.get_stats(user_id)
+        return jsonify(stats), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch stats: {str(e)}'}), 500
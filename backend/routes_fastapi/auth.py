@@ -1,14 +1,19 @@
 """
 Authentication routes for FastAPI
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from pydantic import BaseModel, EmailStr
-from database import User
+from async_database import User
 import jwt
 from config import Config
 from datetime import datetime, timedelta
+from utils.token_cache import token_cache
+from utils.password_hasher import password_hasher, PasswordHashingBusyError
+from utils.logger import get_logger
+from .dependencies import get_current_user
 
 router = APIRouter()
+logger = get_logger('auth')
 
 class RegisterRequest(BaseModel):
     email: EmailStr
@@ -22,42 +27,49 @@ class AuthResponse(BaseModel):
     access_token: str
     user: dict
 
-def create_access_token(user_id: int):
+def create_access_token(user_id: int, token_version: int = 0):
     """Create JWT access token"""
     payload = {
         "sub": str(user_id),
+        "ver": token_version,
         "exp": datetime.utcnow() + Config.JWT_ACCESS_TOKEN_EXPIRES,
         "iat": datetime.utcnow()
     }
     token = jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm="HS256")
     return token
 
+def _client_ip(request: Request):
+    """Best-effort client address used for rate limiting"""
+    return request.client.host if request.client else None
+
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
-async def register(request: RegisterRequest):
+async def register(request: RegisterRequest, http_request: Request):
     """Register a new user"""
     try:
-        print(f"[REGISTER] Attempting registration for: {request.email}")
+        logger.debug("Registration attempt", extra={'email': request.email})
         
         # Check if user exists
-        existing_user = User.find_by_email(request.email)
+        existing_user = await User.find_by_email(request.email)
         if existing_user:
-            print(f"[REGISTER] Email already exists: {request.email}")
+            logger.info("Registration rejected: email already registered", extra={'email': request.email})
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        print(f"[REGISTER] Creating new user...")
-        # Create user
-        user_id = User.create(request.email, request.password)
-        print(f"[REGISTER] User created with ID: {user_id}")
+        # Create user (hashing runs off the event loop)
+        password_hash = await password_hasher.hash(
+            request.password,
+            client_ip=_client_ip(http_request),
+            email=request.email
+        )
+        user_id = await User.create_with_hash(request.email, password_hash)
+        logger.info("User registered", extra={'user_id': user_id})
         
-        user = User.find_by_id(user_id)
-        print(f"[REGISTER] Fetched user data")
+        user = await User.find_by_id(user_id)
         
         # Generate token
-        access_token = create_access_token(user_id)
-        print(f"[REGISTER] Token created, registration successful")
+        access_token = create_access_token(user_id, user["token_version"])
         
         return {
             "access_token": access_token,
@@ -68,40 +80,49 @@ async def register(request: RegisterRequest):
         }
     except HTTPException:
         raise
+    except PasswordHashingBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
     except Exception as e:
-        print(f"[REGISTER ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Registration failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
         )
 
 @router.post("/login", response_model=AuthResponse)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     """Login user"""
     try:
-        print(f"[LOGIN] Attempting login for: {request.email}")
-        user = User.find_by_email(request.email)
+        logger.debug("Login attempt", extra={'email': request.email})
+        user = await User.find_by_email(request.email)
         
         if not user:
-            print(f"[LOGIN] User not found: {request.email}")
+            logger.info("Login failed: unknown email", extra={'email': request.email})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
-        print(f"[LOGIN] User found, verifying password...")
-        if not User.verify_password(user, request.password):
-            print(f"[LOGIN] Password verification failed")
+        client_ip = _client_ip(http_request)
+        if not await password_hasher.verify(
+            request.password, user["password_hash"], client_ip=client_ip, email=request.email
+        ):
+            logger.info("Login failed: wrong password", extra={'user_id': user['id']})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
-        print(f"[LOGIN] Password verified, creating token...")
-        access_token = create_access_token(user["id"])
-        print(f"[LOGIN] Login successful for user ID: {user['id']}")
+        # Upgrade hashes made at a different cost than currently configured
+        if password_hasher.needs_rehash(user["password_hash"]):
+            new_hash = await password_hasher.hash(request.password, client_ip=client_ip, email=request.email)
+            await User.update_password_hash(user["id"], new_hash)
+        
+        access_token = create_access_token(user["id"], user["token_version"])
+        logger.info("Login succeeded", extra={'user_id': user['id']})
         
         return {
             "access_token": access_token,
@@ -112,11 +133,27 @@ async def login(request: LoginRequest):
         }
     except HTTPException:
         raise
+    except PasswordHashingBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
     except Exception as e:
-        print(f"[LOGIN ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Login failed: {str(e)}"
         )
+
+@router.post("/logout-all")
+async def logout_all(user_id: int = Depends(get_current_user)):
+    """Revoke every token issued to the current user"""
+    try:
+        await User.revoke_tokens(user_id)
+        token_cache.invalidate_user(user_id)
+        return {"message": "All sessions have been signed out"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to revoke tokens: {str(e)}"
+        )
@@ -1,20 +1,71 @@
 """
 Chat routes for FastAPI
 """
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
+from datetime import datetime, timezone
 import uuid
-from database import ChatHistory
+from async_database import ChatHistory, Document
 from utils.rag_pipeline import RAGPipeline
+from config import Config
 from .dependencies import get_current_user
 
 router = APIRouter()
 
-class QueryRequest(BaseModel):
+class QueryScope(BaseModel):
+    """Optional retrieval scope shared by single and batch queries"""
+    doc_ids: Optional[List[int]] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    filename: Optional[str] = None
+    uploaded_after: Optional[datetime] = None  # times without an offset are taken as UTC
+    uploaded_before: Optional[datetime] = None
+
+class QueryRequest(QueryScope):
     question: str
     session_id: Optional[str] = None
 
+class BatchQueryItem(QueryScope):
+    question: str
+
+class BatchQueryRequest(BaseModel):
+    questions: List[BatchQueryItem]
+
+def _sqlite_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Format a datetime like SQLite's CURRENT_TIMESTAMP (UTC), converting any offset first"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+async def build_filters(request: QueryScope, user_id: int) -> Optional[dict]:
+    """Turn the request's scope fields into vector store filters"""
+    doc_ids = request.doc_ids
+    if request.filename or request.uploaded_after or request.uploaded_before:
+        # Filename and upload date live in the documents table, so resolve them to IDs
+        matching = await Document.find_ids(
+            user_id,
+            filename=request.filename,
+            uploaded_after=_sqlite_timestamp(request.uploaded_after),
+            uploaded_before=_sqlite_timestamp(request.uploaded_before)
+        )
+        if doc_ids is None:
+            doc_ids = matching
+        else:
+            matching = set(matching)
+            doc_ids = [doc_id for doc_id in doc_ids if doc_id in matching]
+    
+    if doc_ids is None and request.page_start is None and request.page_end is None:
+        return None
+    return {
+        'doc_ids': doc_ids,
+        'page_start': request.page_start,
+        'page_end': request.page_end
+    }
+
 @router.post("/query")
 async def query(request: QueryRequest, user_id: int = Depends(get_current_user)):
     """Process a query using RAG"""
@@ -29,12 +80,16 @@ async def query(request: QueryRequest, user_id: int = Depends(get_current_user))
         # Create session_id if not provided
         session_id = request.session_id or str(uuid.uuid4())
         
-        # Process query using RAG
-        rag = RAGPipeline(user_id, session_id=session_id)
-        result = rag.query(question)
+        # Process query using RAG (loading the index, embedding, search and the LLM call all block)
+        filters = await build_filters(request, user_id)
+        
+        def answer():
+            return RAGPipeline(user_id, session_id=session_id).query(question, filters=filters)
+        
+        result = await run_in_threadpool(answer)
         
         # Save to chat history
-        ChatHistory.create(
+        await ChatHistory.create(
             user_id=user_id,
             question=question,
             answer=result['answer'],
@@ -57,12 +112,61 @@ async def query(request: QueryRequest, user_id: int = Depends(get_current_user))
             detail=f"Query failed: {str(e)}"
         )
 
+@router.post("/query/batch")
+async def query_batch(request: BatchQueryRequest, user_id: int = Depends(get_current_user)):
+    """Answer many independent questions in one call (not saved to chat history)"""
+    try:
+        if not request.questions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="At least one question is required"
+            )
+        if len(request.questions) > Config.BATCH_MAX_QUESTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {Config.BATCH_MAX_QUESTIONS} questions per batch"
+            )
+        
+        items = [
+            {'question': item.question, 'filters': await build_filters(item, user_id)}
+            for item in request.questions
+        ]
+        
+        # Loading the index, embedding, search and LLM calls all block, so keep them off the event loop
+        def answer():
+            return RAGPipeline(user_id).query_batch(items)
+        
+        results = await run_in_threadpool(answer)
+        
+        return {
+            'results': results,
+            'succeeded': sum(1 for result in results if 'error' not in result),
+            'failed': sum(1 for result in results if 'error' in result)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch query failed: {str(e)}"
+        )
+
 @router.get("/history")
-async def get_history(limit: int = 50, user_id: int = Depends(get_current_user)):
-    """Get chat history for current user"""
+async def get_history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user)
+):
+    """Get chat history for current user (newest first, cursor-paginated)"""
     try:
-        history = ChatHistory.get_by_user(user_id, limit=limit)
-        return {"history": history}
+        page = await ChatHistory.get_page_by_user(user_id, limit=limit, cursor=cursor)
+        return {"history": page["items"], "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -73,7 +177,7 @@ async def get_history(limit: int = 50, user_id: int = Depends(get_current_user))
 async def get_sessions(user_id: int = Depends(get_current_user)):
     """Get all chat sessions for current user"""
     try:
-        sessions = ChatHistory.get_sessions(user_id)
+        sessions = await ChatHistory.get_sessions(user_id)
         return {"sessions": sessions}
     except Exception as e:
         raise HTTPException(
@@ -82,11 +186,21 @@ async def get_sessions(user_id: int = Depends(get_current_user)):
         )
 
 @router.get("/sessions/{session_id}")
-async def get_session_history(session_id: str, user_id: int = Depends(get_current_user)):
-    """Get chat history for a specific session"""
+async def get_session_history(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user)
+):
+    """Get chat history for a specific session (oldest first, cursor-paginated)"""
     try:
-        history = ChatHistory.get_by_session(user_id, session_id)
-        return {"history": history, "session_id": session_id}
+        page = await ChatHistory.get_page_by_session(user_id, session_id, limit=limit, cursor=cursor)
+        return {"history": page["items"], "session_id": session_id, "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -97,7 +211,7 @@ async def get_session_history(session_id: str, user_id: int = Depends(get_curren
 async def clear_history(user_id: int = Depends(get_current_user)):
     """Clear all chat history for current user"""
     try:
-        deleted_count = ChatHistory.delete_by_user(user_id)
+        deleted_count = await ChatHistory.delete_by_user(user_id)
         return {
             "message": "Chat history cleared successfully",
             "deleted_count": deleted_count
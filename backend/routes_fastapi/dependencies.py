@@ -4,6 +4,18 @@ FastAPI dependencies for authentication
 from fastapi import Header, HTTPException, status
 import jwt
 from config import Config
+from async_database import User
+from utils.token_cache import token_cache
+from utils.profiling import note_user
+
+async def _current_token_version(user_id: int):
+    """Get the user's token_version, hitting the database at most once per TTL"""
+    version = token_cache.get_version(user_id)
+    if version is None:
+        version = await User.get_token_version(user_id)
+        if version is not None:
+            token_cache.put_version(user_id, version)
+    return version
 
 async def get_current_user(authorization: str = Header(None)) -> int:
     """Extract and validate JWT token from Authorization header"""
@@ -22,24 +34,42 @@ async def get_current_user(authorization: str = Header(None)) -> int:
                 detail="Invalid authentication scheme"
             )
         
-        # Decode JWT
-        payload = jwt.decode(
-            token, 
-            Config.JWT_SECRET_KEY, 
-            algorithms=["HS256"],
-            options={"verify_signature": True}
-        )
-        user_id_str = payload.get("sub")
+        # Fast path: token already verified and not yet expired
+        cached = token_cache.get(token)
+        if cached:
+            user_id, token_version = cached
+        else:
+            # Decode JWT
+            payload = jwt.decode(
+                token, 
+                Config.JWT_SECRET_KEY, 
+                algorithms=["HS256"],
+                options={"verify_signature": True}
+            )
+            user_id_str = payload.get("sub")
+            
+            if not user_id_str:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid token payload"
+                )
+            
+            user_id = int(user_id_str)
+            token_version = int(payload.get("ver", 0))
+            token_cache.put(token, user_id, token_version, payload["exp"])
         
-        if not user_id_str:
+        # Tokens issued before the last revocation carry an older version
+        if await _current_token_version(user_id) != token_version:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token payload"
+                detail="Token has been revoked"
             )
         
-        user_id = int(user_id_str)
+        note_user(user_id)
         return user_id
         
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
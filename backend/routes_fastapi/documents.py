@@ -1,17 +1,23 @@
 """
 Documents routes for FastAPI
 """
+import hashlib
 import os
 import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends
-from typing import List
-from database import Document
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
+from async_database import Document
 from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStore
+from utils.vector_store import VectorStore, index_lock
+from utils.ingestion import ingest_document
+from utils.reindex import index_status, schedule_rebuild
+from utils.logger import get_logger
 from config import Config
 from .dependencies import get_current_user
 
 router = APIRouter()
+logger = get_logger('documents')
 
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
@@ -22,10 +28,9 @@ async def upload_documents(
     files: List[UploadFile] = File(...),
     user_id: int = Depends(get_current_user)
 ):
-    """Upload and process multiple PDF documents"""
+    """Upload and process multiple documents (PDF, DOCX, HTML, Markdown or plain text)"""
     try:
-        print(f"[UPLOAD] User ID: {user_id}")
-        print(f"[UPLOAD] Received {len(files)} files")
+        logger.info("Upload received", extra={'user_id': user_id, 'files': len(files)})
         
         if not files:
             raise HTTPException(
@@ -34,15 +39,12 @@ async def upload_documents(
             )
         
         processor = DocumentProcessor()
-        vector_store = VectorStore(user_id)
         uploaded_docs = []
         errors = []
         
         for file in files:
             if file.filename and allowed_file(file.filename):
                 try:
-                    print(f"[UPLOAD] Processing: {file.filename}")
-                    
                     # Generate unique filename
                     original_filename = file.filename
                     unique_filename = f"{uuid.uuid4()}_{original_filename}"
@@ -52,48 +54,55 @@ async def upload_documents(
                     os.makedirs(user_upload_dir, exist_ok=True)
                     file_path = os.path.join(user_upload_dir, unique_filename)
                     
-                    # Read and save file content
-                    content = await file.read()
+                    # Stream file content to disk without holding it all in memory
+                    file_size = 0
+                    file_hash = hashlib.sha256()  # keys the extracted text cache
                     with open(file_path, 'wb') as f:
-                        f.write(content)
-                    print(f"[UPLOAD] Saved to: {file_path}")
+                        while True:
+                            block = await file.read(Config.UPLOAD_READ_SIZE)
+                            if not block:
+                                break
+                            f.write(block)
+                            file_hash.update(block)
+                            file_size += len(block)
+                    file_hash = file_hash.hexdigest()
+                    logger.debug("Upload saved", extra={'path': file_path, 'bytes': file_size})
                     
-                    # Get page count
-                    page_count = processor.get_page_count(file_path)
-                    print(f"[UPLOAD] Page count: {page_count}")
+                    # Get page count (formats without pages are extracted for it, into the text cache)
+                    page_count = await run_in_threadpool(processor.get_page_count, file_path, file_hash)
                     
                     # Save to database
-                    doc_id = Document.create(
+                    doc_id = await Document.create(
                         user_id=user_id,
                         filename=unique_filename,
                         original_filename=original_filename,
                         file_path=file_path,
-                        page_count=page_count
+                        page_count=page_count,
+                        file_size=file_size,
+                        status='processing',
+                        file_hash=file_hash
                     )
-                    print(f"[UPLOAD] DB doc_id: {doc_id}")
-                    
-                    # Process document
-                    print(f"[UPLOAD] Extracting text...")
-                    pages = processor.extract_text_from_pdf(file_path)
-                    chunks = processor.chunk_text(pages, doc_id, original_filename)
-                    print(f"[UPLOAD] Created {len(chunks)} chunks")
                     
-                    # Add to vector store
-                    print(f"[UPLOAD] Generating embeddings...")
-                    vector_store.add_documents(chunks)
-                    print(f"[UPLOAD] Successfully added to vector store")
+                    # Stream pages -> chunks -> embeddings -> index, checkpointing as it goes
+                    # (the index is opened in the worker thread too: loading it reads files and the model)
+                    result = await run_in_threadpool(
+                        ingest_document, processor, None,
+                        user_id, doc_id, file_path, original_filename,
+                        file_hash=file_hash
+                    )
+                    logger.info("Document indexed", extra={
+                        'user_id': user_id, 'doc_id': doc_id, 'pages': page_count, 'chunks': result['chunks']
+                    })
                     
                     uploaded_docs.append({
                         'id': doc_id,
                         'filename': original_filename,
                         'page_count': page_count,
-                        'chunks': len(chunks)
+                        'chunks': result['chunks']
                     })
                     
                 except Exception as e:
-                    print(f"[UPLOAD ERROR] Failed to process {file.filename}: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("Failed to process upload", extra={'user_id': user_id, 'upload': file.filename})
                     errors.append({
                         'filename': file.filename,
                         'error': str(e)
@@ -101,7 +110,7 @@ async def upload_documents(
             else:
                 errors.append({
                     'filename': file.filename or 'unknown',
-                    'error': 'Invalid file type. Only PDF files are allowed.'
+                    'error': f"Invalid file type. Allowed types: {', '.join(sorted(Config.ALLOWED_EXTENSIONS))}."
                 })
         
         response = {
@@ -112,7 +121,9 @@ async def upload_documents(
         if errors:
             response['errors'] = errors
         
-        print(f"[UPLOAD] Complete. Success: {len(uploaded_docs)}, Errors: {len(errors)}")
+        logger.info("Upload complete", extra={
+            'user_id': user_id, 'succeeded': len(uploaded_docs), 'failed': len(errors)
+        })
         
         if not uploaded_docs and errors:
             raise HTTPException(
@@ -125,20 +136,30 @@ async def upload_documents(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[UPLOAD CRITICAL ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Upload failed", extra={'user_id': user_id})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Upload failed: {str(e)}"
         )
 
 @router.get("")
-async def get_documents(user_id: int = Depends(get_current_user)):
-    """Get all documents for current user"""
+async def get_documents(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user)
+):
+    """Get documents for current user (all of them, or one cursor page when limit is given)"""
     try:
-        documents = Document.get_by_user(user_id)
-        return {"documents": documents}
+        if limit is None and cursor is None:
+            documents = await Document.get_by_user(user_id)
+            return {"documents": documents, "next_cursor": None}
+        page = await Document.get_page_by_user(user_id, limit=limit or 50, cursor=cursor)
+        return {"documents": page["items"], "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -149,7 +170,7 @@ async def get_documents(user_id: int = Depends(get_current_user)):
 async def get_stats(user_id: int = Depends(get_current_user)):
     """Get document statistics"""
     try:
-        stats = Document.get_stats(user_id)
+        stats = await Document.get_stats(user_id)
         return stats
     except Exception as e:
         raise HTTPException(
@@ -157,11 +178,39 @@ async def get_stats(user_id: int = Depends(get_current_user)):
             detail=f"Failed to fetch stats: {str(e)}"
         )
 
+@router.get("/index")
+async def get_index_status(user_id: int = Depends(get_current_user)):
+    """Get the active index version and the progress of its latest rebuild"""
+    try:
+        return await run_in_threadpool(index_status, user_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch index status: {str(e)}"
+        )
+
+@router.post("/index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_index(user_id: int = Depends(get_current_user)):
+    """Rebuild the index with the current embedding model and chunking settings, in the background"""
+    try:
+        queued = schedule_rebuild(user_id)
+        logger.info("Index rebuild requested", extra={'user_id': user_id, 'queued': queued})
+        return {
+            "message": "Index rebuild queued" if queued else "Index rebuild already in progress",
+            **(await run_in_threadpool(index_status, user_id))
+        }
+    except Exception as e:
+        logger.exception("Index rebuild request failed", extra={'user_id': user_id})
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to queue index rebuild: {str(e)}"
+        )
+
 @router.get("/{doc_id}")
 async def get_document(doc_id: int, user_id: int = Depends(get_current_user)):
     """Get document by ID"""
     try:
-        doc = Document.get_by_id(doc_id, user_id)
+        doc = await Document.get_by_id(doc_id, user_id)
         if not doc:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -180,45 +229,36 @@ async def get_document(doc_id: int, user_id: int = Depends(get_current_user)):
 async def delete_document(doc_id: int, user_id: int = Depends(get_current_user)):
     """Delete document"""
     try:
-        print(f"[DELETE] User ID: {user_id}, Doc ID: {doc_id}")
-        
-        doc = Document.get_by_id(doc_id, user_id)
+        doc = await Document.get_by_id(doc_id, user_id)
         if not doc:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
         
-        print(f"[DELETE] Found document: {doc['filename']}")
+        # Delete from database first, so an index rebuild finishing meanwhile leaves the document out
+        await Document.delete(doc_id, user_id)
+        
+        # Delete from vector store (whichever version is active once any swap in progress is done)
+        def delete_chunks():
+            with index_lock(user_id):
+                VectorStore(user_id).delete_document(doc_id)
         
-        # Delete from vector store
         try:
-            print(f"[DELETE] Initializing vector store...")
-            vector_store = VectorStore(user_id)
-            print(f"[DELETE] Deleting from vector store...")
-            vector_store.delete_document(doc_id)
-            print(f"[DELETE] Deleted from vector store")
-        except Exception as ve:
-            print(f"[DELETE ERROR] Vector store error: {str(ve)}")
-            import traceback
-            traceback.print_exc()
+            await run_in_threadpool(delete_chunks)
+        except Exception:
+            logger.exception("Failed to delete document chunks", extra={'user_id': user_id, 'doc_id': doc_id})
         
         # Delete file
         if os.path.exists(doc["file_path"]):
             os.remove(doc["file_path"])
-            print(f"[DELETE] Deleted file: {doc['file_path']}")
-        
-        # Delete from database
-        Document.delete(doc_id, user_id)
-        print(f"[DELETE] Deleted from database")
+        logger.info("Document deleted", extra={'user_id': user_id, 'doc_id': doc_id})
         
         return {"message": "Document deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DELETE CRITICAL ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Delete failed", extra={'user_id': user_id, 'doc_id': doc_id})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete document: {str(e)}"
@@ -230,15 +270,17 @@ async def get_summary(doc_id: int, user_id: int = Depends(get_current_user)):
     try:
         from utils.rag_pipeline import RAGPipeline
         
-        doc = Document.get_by_id(doc_id, user_id)
+        doc = await Document.get_by_id(doc_id, user_id)
         if not doc:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
         
-        rag = RAGPipeline(user_id)
-        summary = rag.summarize_document(doc_id, doc["filename"])
+        def summarize():
+            return RAGPipeline(user_id).summarize_document(doc_id, doc["filename"])
+        
+        summary = await run_in_threadpool(summarize)
         
         return {"summary": summary}
     except HTTPException:
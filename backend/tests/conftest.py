@@ -0,0 +1,45 @@
+"""
+Shared fixtures: an isolated workspace (database, indexes, uploads, text cache)
+and the offline stand-ins from benchmarks/synthetic.py instead of the real
+embedding model
+
+Run from backend/:
+    python -m pytest -q
+"""
+import pytest
+from benchmarks.synthetic import HashingEmbeddings, make_pages, write_pdf
+from config import Config
+from database import User, close_db, init_db
+from utils import vector_store
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Point every on-disk path at a temporary directory and create the tables"""
+    for name, path in (('DATABASE_PATH', 'data.db'), ('VECTOR_STORE_PATH', 'vector_stores'),
+                       ('UPLOAD_FOLDER', 'uploads'), ('TEXT_CACHE_PATH', 'text_cache'),
+                       ('PROFILE_DIR', 'profiles')):
+        monkeypatch.setattr(Config, name, str(tmp_path / path))
+    monkeypatch.setitem(vector_store._embeddings, Config.LOCAL_EMBEDDING_MODEL,
+                        HashingEmbeddings(Config.LOCAL_EMBEDDING_MODEL))
+    init_db()
+    yield tmp_path
+    close_db()
+
+@pytest.fixture
+def make_user(workspace):
+    """Create users without paying for bcrypt"""
+    created = []
+
+    def create(email=None):
+        user_id = User.create_with_hash(email or f"user{len(created)}@example.com", 'not-a-real-hash')
+        created.append(user_id)
+        return user_id
+
+    return create
+
+@pytest.fixture
+def sample_pdf(workspace):
+    """A six-page text PDF with a heading and several paragraphs per page"""
+    path = workspace / 'sample.pdf'
+    write_pdf(str(path), make_pages(6, seed=3))
+    return str(path)
@@ -0,0 +1,40 @@
+"""
+Chat routes: query scope filters
+"""
+import asyncio
+from database import Document, get_db
+from routes_fastapi.chat import QueryScope, build_filters
+
+def _documents(user_id, *names):
+    return [Document.create(user_id, name, name, name, page_count=1, file_size=1) for name in names]
+
+def test_build_filters_without_scope_searches_everything(make_user):
+    assert asyncio.run(build_filters(QueryScope(), make_user())) is None
+
+def test_build_filters_intersects_doc_ids_with_filename_matches(make_user):
+    user_id = make_user()
+    report, notes, report_2 = _documents(user_id, 'report.pdf', 'notes.pdf', 'report-2.pdf')
+    other_user_report, = _documents(make_user(), 'report.pdf')
+
+    by_name = asyncio.run(build_filters(QueryScope(filename='report'), user_id))
+    assert sorted(by_name['doc_ids']) == [report, report_2]
+
+    scoped = asyncio.run(build_filters(
+        QueryScope(doc_ids=[notes, report_2, other_user_report], filename='report', page_start=2), user_id
+    ))
+    assert scoped == {'doc_ids': [report_2], 'page_start': 2, 'page_end': None}
+
+def test_upload_date_bounds_are_compared_in_utc(make_user):
+    user_id = make_user()
+    doc_id, = _documents(user_id, 'report.pdf')
+    with get_db() as conn:
+        conn.execute("UPDATE documents SET upload_date = '2026-01-01 10:00:00' WHERE id = ?", (doc_id,))
+
+    def matches(**bounds):
+        return asyncio.run(build_filters(QueryScope(**bounds), user_id))['doc_ids'] == [doc_id]
+
+    # 15:00+05:30 is 09:30 UTC, before the upload; as wall time it would be after it
+    assert matches(uploaded_after='2026-01-01T15:00:00+05:30')
+    assert not matches(uploaded_before='2026-01-01T15:00:00+05:30')
+    assert matches(uploaded_before='2026-01-01T10:00:00Z')
+    assert not matches(uploaded_after='2026-01-01T10:00:01')  # no offset: UTC
@@ -0,0 +1,77 @@
+"""
+Chunking strategies: token limits, structure, page spans and numbering
+"""
+import pytest
+from benchmarks.synthetic import make_pages
+from config import Config
+from utils.chunker import StructuredChunker
+from utils.document_processor import DocumentProcessor
+from utils.tokenizer import count_tokens
+
+def _pages(count=6, seed=3):
+    return [{'page_number': number, 'text': '\n'.join(lines), 'metadata': {}}
+            for number, lines in enumerate(make_pages(count, seed=seed), start=1)]
+
+def test_chunks_stay_within_the_token_budget():
+    chunker = StructuredChunker(chunk_tokens=80, overlap_tokens=20)
+    chunks = list(chunker.iter_chunks(_pages(), 1, 'doc.pdf'))
+    assert len(chunks) > 6
+    assert all(count_tokens(chunk['text']) <= 80 + 5 for chunk in chunks)
+    assert all(chunk['metadata']['tokens'] <= 80 for chunk in chunks)
+
+def test_chunks_record_their_heading_and_page_span():
+    chunks = list(StructuredChunker(chunk_tokens=80, overlap_tokens=20).iter_chunks(_pages(), 1, 'doc.pdf'))
+    starts = [chunk['metadata']['page_start'] for chunk in chunks]
+    assert starts == sorted(starts)
+    for chunk in chunks:
+        metadata = chunk['metadata']
+        assert metadata['page_start'] <= metadata['page_number'] <= metadata['page_end']
+        # make_pages opens every page with a numbered heading, e.g. "3. Budget Review"
+        assert metadata['heading'] and metadata['heading'].split('.')[0].isdigit()
+
+def test_sentences_overlap_between_chunks_of_a_section():
+    chunks = list(StructuredChunker(chunk_tokens=80, overlap_tokens=30).iter_chunks(_pages(1), 1, 'doc.pdf'))
+    assert len(chunks) > 2
+    overlapping = [
+        earlier for earlier, later in zip(chunks, chunks[1:])
+        if later['text'].split('. ')[0] in earlier['text']
+    ]
+    assert overlapping
+
+def test_paragraph_split_across_pages_is_rejoined():
+    pages = [
+        {'page_number': 1, 'text': "Intro paragraph ends here.\n\nThe contract covers payment and", 'metadata': {}},
+        {'page_number': 2, 'text': "delivery of the product. Next sentence follows.", 'metadata': {}},
+    ]
+    chunks = list(StructuredChunker().iter_chunks(pages, 1, 'doc.pdf'))
+    assert len(chunks) == 1
+    assert "covers payment and delivery of the product." in chunks[0]['text']
+    assert chunks[0]['metadata']['page_number'] == 1  # where the paragraph starts
+    assert (chunks[0]['metadata']['page_start'], chunks[0]['metadata']['page_end']) == (1, 2)
+
+def test_chunk_of_a_rejoined_paragraph_covers_both_pages():
+    pages = [
+        {'page_number': 1, 'text': "Intro paragraph ends here.\n\nThe contract covers payment and", 'metadata': {}},
+        {'page_number': 2, 'text': "delivery of the product. " + "Filler sentence on page two. " * 30, 'metadata': {}},
+        {'page_number': 3, 'text': "Page three stands alone.", 'metadata': {}},
+    ]
+    chunks = list(StructuredChunker(chunk_tokens=40, overlap_tokens=0).iter_chunks(pages, 1, 'doc.pdf'))
+    first = next(chunk for chunk in chunks if 'delivery of the product.' in chunk['text'])
+    assert (first['metadata']['page_start'], first['metadata']['page_end']) == (1, 2)
+    # Sentences wholly on page 2 are not attributed to page 1
+    assert all(chunk['metadata']['page_start'] == 2 for chunk in chunks[1:])
+    assert chunks[-1]['metadata']['page_end'] == 3
+
+def test_closing_quotes_and_brackets_stay_with_their_sentence():
+    text = 'He said "Stop now." Then he left (see note 1.) After that it rained.'
+    assert StructuredChunker()._sentences(text) == [
+        'He said "Stop now."', 'Then he left (see note 1.)', 'After that it rained.'
+    ]
+
+@pytest.mark.parametrize('strategy', ['structured', 'recursive'])
+def test_chunks_are_numbered_from_start_index(monkeypatch, strategy):
+    if strategy == 'recursive':
+        pytest.importorskip('langchain.text_splitter')
+    monkeypatch.setattr(Config, 'CHUNK_STRATEGY', strategy)
+    chunks = list(DocumentProcessor().iter_chunks(_pages(), 1, 'doc.pdf', start_index=5))
+    assert [chunk['metadata']['chunk_index'] for chunk in chunks] == list(range(5, 5 + len(chunks)))
@@ -0,0 +1,71 @@
+"""
+Packing retrieved chunks into the prompt's token budget
+"""
+from benchmarks.synthetic import StubLLMClient, make_pages
+from config import Config
+from utils import rag_pipeline
+from utils.context_packer import ContextPacker, source_header
+from utils.tokenizer import count_tokens
+
+def _chunk(text, page, index, filename='report.pdf', page_end=None):
+    return {'text': text, 'metadata': {'doc_id': 1, 'filename': filename, 'page_number': page,
+                                       'page_end': page_end or page, 'chunk_index': index}}
+
+def _paragraphs(count):
+    return [line for page in make_pages(count, seed=5) for line in page if len(line) > 40]
+
+def _context_tokens(packed):
+    """Tokens the packed chunks take in the prompt, headers included"""
+    return sum(count_tokens(source_header(number, item['metadata'])) + item['tokens']
+               for number, item in enumerate(packed, 1))
+
+def test_packed_context_fits_the_budget_with_its_headers():
+    chunks = [_chunk(text, page=number, index=number * 10, filename='a-rather-long-file-name.docx')
+              for number, text in enumerate(_paragraphs(8), 1)]
+    packed = ContextPacker(budget=300).pack(chunks)
+    assert len(packed) > 2
+    assert _context_tokens(packed) <= 300
+
+def test_consecutive_chunks_are_merged_without_their_overlap():
+    first = "Revenue grew in the third quarter. Costs were flat. The outlook is stable."
+    second = "The outlook is stable. Hiring resumes next year."
+    packed = ContextPacker(budget=500).pack([_chunk(second, 3, 5, page_end=4), _chunk(first, 3, 4)])
+    assert len(packed) == 1
+    assert packed[0]['text'] == first + " Hiring resumes next year."
+    assert source_header(1, packed[0]['metadata']) == "[Source 1] Document: report.pdf, Page: 3-4\n"
+
+def test_headers_name_sections_for_formats_without_pages():
+    assert source_header(2, _chunk("text", 5, 0, filename='notes.md')['metadata']) == \
+        "[Source 2] Document: notes.md, Section: 5\n"
+
+def test_truncated_chunks_end_on_a_sentence():
+    text = " ".join(_paragraphs(3))
+    truncated = ContextPacker.truncate(text, 60)
+    assert count_tokens(truncated) <= 60
+    assert truncated.endswith('.')
+
+def test_conversation_history_comes_out_of_the_budget(make_user, monkeypatch):
+    monkeypatch.setattr(rag_pipeline, '_llm_client', StubLLMClient())
+    monkeypatch.setattr(Config, 'CONTEXT_TOKEN_BUDGET', 600)
+    pipeline = rag_pipeline.RAGPipeline(make_user())
+    chunks = [_chunk(text, page=number, index=number * 10) for number, text in enumerate(_paragraphs(10), 1)]
+
+    def packed_tokens(history_messages):
+        prompts = []
+        create = pipeline.client.chat.completions.create
+        monkeypatch.setattr(pipeline.client.chat.completions, 'create',
+                            lambda **kwargs: prompts.append(kwargs['messages'][-1]['content']) or create(**kwargs))
+        pipeline._generate_answer("What changed?", chunks, history_messages, {})
+        context = prompts[0].split("CONTEXT:\n", 1)[1].split("\n\nUSER QUESTION:", 1)[0]
+        return count_tokens(context)
+
+    history = [{'role': 'user', 'content': ' '.join(_paragraphs(2)[:3])},
+               {'role': 'assistant', 'content': ' '.join(_paragraphs(2)[3:8])}]
+    history_tokens = sum(count_tokens(message['content']) for message in history)
+    assert 100 < history_tokens < 500
+
+    without_history = packed_tokens([])
+    with_history = packed_tokens(history)
+    assert without_history > 500
+    # Allow for the blank lines joining sources
+    assert with_history <= 600 - history_tokens + 20
@@ -0,0 +1,89 @@
+"""
+Keyset pagination and the session summary kept by the models
+"""
+import pytest
+from database import ChatHistory, Document, encode_cursor, get_db, init_db
+
+def _pages(fetch, limit):
+    """Follow next_cursor through every page"""
+    items, cursor = [], None
+    while True:
+        page = fetch(limit=limit, cursor=cursor)
+        assert len(page['items']) <= limit
+        items += page['items']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+@pytest.fixture
+def conversation(make_user):
+    """Seven exchanges in one session (created within the same second, so timestamps tie) and one elsewhere"""
+    user_id = make_user()
+    ids = [ChatHistory.create(user_id, f"question {i}", f"answer {i}", [], session_id='s1') for i in range(7)]
+    ChatHistory.create(user_id, "other", "other", [], session_id='s2')
+    ChatHistory.create(make_user(), "someone else", "someone else", [], session_id='s1')
+    return user_id, ids
+
+@pytest.mark.parametrize('limit', [1, 3, 7, 50])
+def test_session_pages_are_oldest_first_without_gaps_or_repeats(conversation, limit):
+    user_id, ids = conversation
+    items = _pages(lambda **page: ChatHistory.get_page_by_session(user_id, 's1', **page), limit)
+    assert [item['id'] for item in items] == ids
+
+@pytest.mark.parametrize('limit', [1, 4, 8, 50])
+def test_history_pages_are_newest_first_without_gaps_or_repeats(conversation, limit):
+    user_id, _ = conversation
+    items = _pages(lambda **page: ChatHistory.get_page_by_user(user_id, **page), limit)
+    assert [item['id'] for item in items] == sorted((item['id'] for item in items), reverse=True)
+    assert len(items) == 8
+
+def test_last_full_page_has_no_cursor(conversation):
+    user_id, _ = conversation
+    assert ChatHistory.get_page_by_session(user_id, 's1', limit=7)['next_cursor'] is None
+
+def test_document_pages(make_user):
+    user_id = make_user()
+    ids = [Document.create(user_id, f"d{i}.pdf", f"d{i}.pdf", f"d{i}.pdf", page_count=1, file_size=1) for i in range(5)]
+    items = _pages(lambda **page: Document.get_page_by_user(user_id, **page), 2)
+    assert [item['id'] for item in items] == ids[::-1]
+
+@pytest.mark.parametrize('cursor', ['not-base64!', encode_cursor('only-one-value')])
+def test_malformed_cursor_is_rejected(make_user, cursor):
+    with pytest.raises(ValueError):
+        ChatHistory.get_page_by_user(make_user(), cursor=cursor)
+
+def test_session_summary_counts_messages(conversation):
+    user_id, _ = conversation
+    sessions = {session['session_id']: session for session in ChatHistory.get_sessions(user_id)}
+    assert sessions['s1']['message_count'] == 7
+    assert sessions['s1']['first_question'] == "question 0"
+    assert sessions['s2']['message_count'] == 1
+
+def test_init_db_is_idempotent_and_creates_the_pagination_indexes(workspace):
+    init_db()
+    with get_db() as conn:
+        indexes = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_documents_user_upload', 'idx_chat_history_user_time', 'idx_chat_history_user_session_time',
+            'idx_chat_sessions_user_last'} <= indexes
+    assert not indexes & {'idx_documents_user_id', 'idx_chat_history_user_id', 'idx_chat_history_session_id'}
+
+def test_user_stats_follow_document_changes(make_user):
+    user_id = make_user()
+    other_user = make_user()
+    first = Document.create(user_id, 'a.pdf', 'a.pdf', 'a.pdf', page_count=4, file_size=100, status='processing')
+    Document.create(user_id, 'b.pdf', 'b.pdf', 'b.pdf', page_count=2, file_size=50)
+    Document.create(other_user, 'c.pdf', 'c.pdf', 'c.pdf', page_count=9, file_size=900)
+
+    Document.set_chunk_count(first, user_id, 10, 'model-a', last_page=2)
+    Document.set_chunk_count(first, user_id, 25, 'model-a', last_page=4)  # checkpoints replace, not add
+    assert Document.get_stats(user_id) == {'total_documents': 2, 'total_pages': 6, 'total_chunks': 25,
+                                           'total_bytes': 150, 'embedding_model': 'model-a'}
+
+    assert Document.delete(first, user_id)
+    assert not Document.delete(first, user_id)
+    assert Document.get_stats(user_id) == {'total_documents': 1, 'total_pages': 2, 'total_chunks': 0,
+                                           'total_bytes': 50, 'embedding_model': 'model-a'}
+    assert Document.get_stats(other_user)['total_pages'] == 9
+
+def test_stats_of_a_user_without_documents(make_user):
+    assert Document.get_stats(make_user())['total_documents'] == 0
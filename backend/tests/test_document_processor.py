@@ -0,0 +1,83 @@
+"""
+Extraction through the text cache and page counting
+"""
+import gzip
+import os
+import pytest
+from config import Config
+from utils import text_cache
+from utils.document_processor import DocumentProcessor
+from utils.extractors import MarkdownExtractor
+
+MARKDOWN = "# Intro\n\nFirst paragraph.\n\n## Details\n\nSecond paragraph.\n\n# Outro\n\nLast words.\n"
+
+@pytest.fixture
+def extractions(monkeypatch):
+    """Count how often the Markdown extractor actually parses a file"""
+    calls = []
+    iter_sections = MarkdownExtractor.iter_sections
+
+    def counted(self, file_path, start=1):
+        calls.append(start)
+        return iter_sections(self, file_path, start)
+
+    monkeypatch.setattr(MarkdownExtractor, 'iter_sections', counted)
+    return calls
+
+@pytest.fixture
+def markdown_file(workspace):
+    path = workspace / 'notes.md'
+    path.write_text(MARKDOWN, encoding='utf-8')
+    return str(path)
+
+def test_counting_sections_fills_the_cache_for_ingestion(markdown_file, extractions):
+    processor = DocumentProcessor()
+    assert processor.get_page_count(markdown_file) == 3
+    pages = list(processor.iter_pages(markdown_file))
+    assert [page['heading'] for page in pages] == ['Intro', 'Details', 'Outro']
+    assert len(extractions) == 1
+
+def test_identical_files_share_an_entry(markdown_file, workspace, extractions):
+    copy = workspace / 'copy.md'
+    copy.write_text(MARKDOWN, encoding='utf-8')
+    processor = DocumentProcessor()
+    first = list(processor.iter_pages(markdown_file))
+    second = list(processor.iter_pages(str(copy)))
+    assert [page['text'] for page in first] == [page['text'] for page in second]
+    assert second[0]['metadata']['source'] == 'copy.md'
+    assert len(extractions) == 1
+
+def test_partial_read_is_not_cached(markdown_file, extractions):
+    processor = DocumentProcessor()
+    pages = processor.iter_pages(markdown_file)
+    next(pages)
+    pages.close()
+    assert len(list(processor.iter_pages(markdown_file))) == 3
+    assert len(extractions) == 2
+
+def test_damaged_entry_is_replaced(markdown_file, extractions):
+    processor = DocumentProcessor()
+    list(processor.iter_pages(markdown_file))
+    entry = text_cache._entry_path(text_cache.hash_file(markdown_file), MarkdownExtractor().cache_key)
+    with gzip.open(entry, 'wt', encoding='utf-8') as f:
+        f.write('{"page_number": 1, "text": "Intro"\n')
+    assert [page['page_number'] for page in processor.iter_pages(markdown_file)] == [1, 2, 3]
+    assert [page['page_number'] for page in processor.iter_pages(markdown_file)] == [1, 2, 3]
+    assert len(extractions) == 2
+
+def test_prune_evicts_least_recently_used(workspace):
+    for name in ('a' * 64, 'b' * 64):
+        list(text_cache.store_sections(name, 'md-v1', [{'page_number': 1, 'text': name, 'metadata': {}}]))
+    entry_size = os.path.getsize(text_cache._entry_path('a' * 64, 'md-v1'))
+    os.utime(text_cache._entry_path('b' * 64, 'md-v1'), (0, 0))
+    text_cache.read_sections('a' * 64, 'md-v1')  # marks it as recently used
+    assert text_cache.prune(max_bytes=entry_size) == 1
+    assert text_cache.read_sections('b' * 64, 'md-v1') is None
+    assert text_cache.read_sections('a' * 64, 'md-v1') is not None
+
+def test_every_allowed_extension_has_an_extractor_and_vice_versa():
+    assert set(DocumentProcessor._extractors) == Config.ALLOWED_EXTENSIONS
+
+def test_pdf_pages_are_counted_without_extracting(sample_pdf, monkeypatch):
+    monkeypatch.setattr(DocumentProcessor, 'iter_pages', lambda *args, **kwargs: pytest.fail("extracted"))
+    assert DocumentProcessor().get_page_count(sample_pdf) == 6
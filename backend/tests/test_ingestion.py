@@ -0,0 +1,158 @@
+"""
+Streaming ingestion: checkpoints, resuming an interrupted document, concurrent writers
+"""
+import os
+import threading
+import pytest
+from config import Config
+from database import Document
+from utils.document_processor import DocumentProcessor
+from utils.ingestion import ingest_document, reconcile_ingestion, resume_document
+from utils.vector_store import VectorStore
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    """Checkpoint after every small batch so a document spans several checkpoints"""
+    monkeypatch.setattr(Config, 'EMBED_BATCH_SIZE', 3)
+    monkeypatch.setattr(Config, 'INGEST_SAVE_EVERY_BATCHES', 1)
+
+def _create_document(user_id, file_path):
+    return Document.create(user_id, 'sample.pdf', 'sample.pdf', file_path, page_count=6, status='processing')
+
+def _document_row(doc_id):
+    return next(document for document in Document.get_all() if document['id'] == doc_id)
+
+def _chunks(store, doc_id):
+    """What a document contributed to an index, minus the document id"""
+    return [
+        (item['text'], item['metadata']['chunk_index'], item['metadata']['page_number'])
+        for item in store.metadata if item['metadata']['doc_id'] == doc_id
+    ]
+
+def _interrupt_after(store, batches):
+    """Make the store's embedder fail once it has embedded `batches` batches"""
+    generate = store.generate_embeddings
+    calls = []
+
+    def generate_embeddings(texts):
+        calls.append(len(texts))
+        if len(calls) > batches:
+            raise RuntimeError("simulated crash")
+        return generate(texts)
+
+    store.generate_embeddings = generate_embeddings
+
+def _clean_run(make_user, sample_pdf):
+    user_id = make_user()
+    doc_id = _create_document(user_id, sample_pdf)
+    result = ingest_document(DocumentProcessor(), VectorStore(user_id), user_id, doc_id, sample_pdf, 'sample.pdf')
+    return result, _chunks(VectorStore(user_id), doc_id)
+
+@pytest.mark.parametrize('strategy', ['structured', 'recursive'])
+def test_resumed_ingestion_matches_a_clean_one(make_user, sample_pdf, monkeypatch, strategy):
+    if strategy == 'recursive':
+        pytest.importorskip('langchain.text_splitter')
+    monkeypatch.setattr(Config, 'CHUNK_STRATEGY', strategy)
+    clean_result, clean_chunks = _clean_run(make_user, sample_pdf)
+    assert clean_result['chunks'] == len(clean_chunks) > 6
+
+    user_id = make_user()
+    doc_id = _create_document(user_id, sample_pdf)
+    store = VectorStore(user_id)
+    _interrupt_after(store, 2)
+    with pytest.raises(RuntimeError):
+        ingest_document(DocumentProcessor(), store, user_id, doc_id, sample_pdf, 'sample.pdf')
+    interrupted = _document_row(doc_id)
+    assert interrupted['status'] == 'failed'
+    assert 0 < interrupted['chunk_count'] < len(clean_chunks)
+
+    result = resume_document(DocumentProcessor(), VectorStore(user_id), _document_row(doc_id))
+
+    assert result['chunks'] == len(clean_chunks)
+    assert _chunks(VectorStore(user_id), doc_id) == clean_chunks
+    resumed = _document_row(doc_id)
+    assert resumed['status'] == 'ready'
+    assert resumed['chunk_count'] == len(clean_chunks)
+
+def test_resume_drops_chunks_flushed_after_the_checkpoint(make_user, sample_pdf):
+    _, clean_chunks = _clean_run(make_user, sample_pdf)
+
+    user_id = make_user()
+    doc_id = _create_document(user_id, sample_pdf)
+    store = VectorStore(user_id)
+    _interrupt_after(store, 3)
+    with pytest.raises(RuntimeError):
+        ingest_document(DocumentProcessor(), store, user_id, doc_id, sample_pdf, 'sample.pdf')
+    # A crash between saving the index and recording the checkpoint leaves extra chunks behind
+    checkpoint = _document_row(doc_id)['chunk_count']
+    Document.set_chunk_count(doc_id, user_id, checkpoint - 2)
+
+    resume_document(DocumentProcessor(), VectorStore(user_id), _document_row(doc_id))
+
+    assert _chunks(VectorStore(user_id), doc_id) == clean_chunks
+    assert _document_row(doc_id)['chunk_count'] == len(clean_chunks)
+
+def test_resume_starts_over_when_the_index_lost_the_checkpointed_chunks(make_user, sample_pdf):
+    _, clean_chunks = _clean_run(make_user, sample_pdf)
+
+    user_id = make_user()
+    doc_id = _create_document(user_id, sample_pdf)
+    Document.set_chunk_count(doc_id, user_id, 5)  # e.g. recorded against an index version since replaced
+
+    result = resume_document(DocumentProcessor(), VectorStore(user_id), _document_row(doc_id))
+
+    assert result['chunks'] == len(clean_chunks)
+    assert _chunks(VectorStore(user_id), doc_id) == clean_chunks
+
+def test_ingest_opens_the_active_index_when_given_none(make_user, sample_pdf):
+    _, clean_chunks = _clean_run(make_user, sample_pdf)
+    user_id = make_user()
+    doc_id = _create_document(user_id, sample_pdf)
+    result = ingest_document(DocumentProcessor(), None, user_id, doc_id, sample_pdf, 'sample.pdf')
+    assert result['chunks'] == len(clean_chunks)
+    assert _chunks(VectorStore(user_id), doc_id) == clean_chunks
+
+def test_concurrent_ingestions_keep_each_others_chunks(make_user, sample_pdf):
+    _, clean_chunks = _clean_run(make_user, sample_pdf)
+    user_id = make_user()
+    doc_ids = [_create_document(user_id, sample_pdf) for _ in range(3)]
+    # Each writer opens the index before any of the others has saved
+    stores = [VectorStore(user_id) for _ in doc_ids]
+    errors = []
+
+    def ingest(store, doc_id):
+        try:
+            ingest_document(DocumentProcessor(), store, user_id, doc_id, sample_pdf, 'sample.pdf')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest, args=pair) for pair in zip(stores, doc_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    store = VectorStore(user_id)
+    assert [store.count_document_chunks(doc_id) for doc_id in doc_ids] == [len(clean_chunks)] * 3
+
+def test_reconcile_resumes_and_purges_without_losing_concurrent_uploads(make_user, sample_pdf):
+    _, clean_chunks = _clean_run(make_user, sample_pdf)
+    user_id = make_user()
+    interrupted = _create_document(user_id, sample_pdf)
+    Document.set_chunk_count(interrupted, user_id, 0)
+    missing_path = os.path.join(os.path.dirname(sample_pdf), 'gone.pdf')
+    missing = _create_document(user_id, missing_path)
+    uploaded = _create_document(user_id, sample_pdf)
+    upload_store = VectorStore(user_id)
+
+    reconciler = threading.Thread(target=reconcile_ingestion)
+    reconciler.start()
+    ingest_document(DocumentProcessor(), upload_store, user_id, uploaded, sample_pdf, 'sample.pdf')
+    reconciler.join()
+
+    store = VectorStore(user_id)
+    assert store.count_document_chunks(interrupted) == len(clean_chunks)
+    assert store.count_document_chunks(uploaded) == len(clean_chunks)
+    assert _document_row(interrupted)['status'] == 'ready'
+    assert all(document['id'] != missing for document in Document.get_all())
@@ -0,0 +1,39 @@
+"""
+Request ids assigned by RequestContextMiddleware
+"""
+import asyncio
+from utils.logger import RequestContextMiddleware, get_request_id, is_valid_request_id
+
+def _request_id_for(header: bytes):
+    """Run one request through the middleware and return the id the app saw and the id echoed back"""
+    seen = {}
+    sent = []
+
+    async def app(scope, receive, send):
+        seen['id'] = get_request_id()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/', 'headers': [(b'x-request-id', header)]}
+    asyncio.run(RequestContextMiddleware(app)(scope, None, send))
+    echoed = dict(sent[0]['headers'])[b'x-request-id'].decode('latin-1')
+    return seen['id'], echoed
+
+def test_caller_request_id_is_kept():
+    assert _request_id_for(b'trace-42_a.b') == ('trace-42_a.b', 'trace-42_a.b')
+
+def test_unsafe_request_ids_are_replaced():
+    for header in (b'../../etc/passwd', b'a..b', b'*', b'id[0]', b'has space', b'x' * 65, b''):
+        request_id, echoed = _request_id_for(header)
+        assert request_id == echoed
+        assert request_id != header.decode('latin-1')
+        assert is_valid_request_id(request_id) and len(request_id) == 32
+
+def test_is_valid_request_id():
+    assert is_valid_request_id('abc-DEF_123.x')
+    assert not is_valid_request_id('a/b')
+    assert not is_valid_request_id('..')
+    assert not is_valid_request_id('')
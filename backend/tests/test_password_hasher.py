@@ -0,0 +1,41 @@
+"""
+Password hashing in the worker process pool
+"""
+import asyncio
+import pytest
+from utils.password_hasher import PasswordHasher, PasswordHashingBusyError
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    yield hasher
+    hasher.shutdown()
+
+def test_workers_are_spawned_not_forked(hasher):
+    assert hasher._get_executor()._mp_context.get_start_method() == 'spawn'
+
+def test_hash_and_verify(hasher):
+    async def run():
+        password_hash = await hasher.hash('correct horse', client_ip='10.0.0.1', email='a@example.com')
+        return (password_hash,
+                await hasher.verify('correct horse', password_hash),
+                await hasher.verify('wrong horse', password_hash))
+
+    password_hash, right, wrong = asyncio.run(run())
+    assert right and not wrong
+    assert not hasher.needs_rehash(password_hash)
+    assert hasher._pending == 0 and not hasher._per_ip and not hasher._per_email
+
+def test_per_email_limit(hasher, monkeypatch):
+    monkeypatch.setattr('config.Config.PASSWORD_HASH_MAX_PER_EMAIL', 1)
+
+    async def run():
+        first = asyncio.ensure_future(hasher.hash('pw', email='a@example.com'))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(PasswordHashingBusyError):
+                await hasher.hash('pw', email='a@example.com')
+        finally:
+            await first
+
+    asyncio.run(run())
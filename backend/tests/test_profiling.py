@@ -0,0 +1,51 @@
+"""
+Storing and pruning request profiles
+"""
+import cProfile
+import json
+import os
+import pytest
+from config import Config
+from utils import profiling
+from utils.profiling import RequestProfile, save_profile
+
+def _profile() -> RequestProfile:
+    profile = RequestProfile('header')
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(100))
+    profiler.disable()
+    profile.add('retrieval', profiler)
+    return profile
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'profiles'
+    monkeypatch.setattr(Config, 'PROFILE_DIR', str(directory))
+    return directory
+
+def test_files_are_named_by_profile_id_not_request_id(profile_dir, tmp_path):
+    profile_id = save_profile('../../escaped', _profile(), {'created': 0})
+    assert sorted(os.listdir(profile_dir)) == [f"{profile_id}.json", f"{profile_id}.retrieval.prof"]
+    assert not list(tmp_path.glob('escaped*'))
+    with open(profile_dir / f"{profile_id}.json") as f:
+        assert json.load(f)['request_id'] == '../../escaped'
+
+def test_pruning_stays_inside_the_profile_directory(profile_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PROFILE_MAX_REQUESTS', 1)
+    outside = tmp_path / 'keep.retrieval.prof'
+    outside.write_text('not a profile')
+    first = save_profile('*', _profile(), {'created': 0})
+    os.utime(profile_dir / f"{first}.json", (0, 0))
+    second = save_profile('*', _profile(), {'created': 1})
+    assert sorted(os.listdir(profile_dir)) == [f"{second}.json", f"{second}.retrieval.prof"]
+    assert outside.exists()
+
+def test_profile_file_rejects_names_outside_the_directory(profile_dir):
+    with pytest.raises(ValueError):
+        profiling._profile_file(str(profile_dir), '../x.json')
+
+def test_show_finds_a_profile_by_request_id(profile_dir, capsys):
+    save_profile('trace-1', _profile(), {'created': 0})
+    profiling.main(['--dir', str(profile_dir), 'show', 'trace-1', '--limit', '1'])
+    assert '.retrieval.prof' in capsys.readouterr().out
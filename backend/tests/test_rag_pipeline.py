@@ -0,0 +1,46 @@
+"""
+Conversation-aware retrieval: reusing the previous turn's chunks
+"""
+import pytest
+from benchmarks.synthetic import StubLLMClient
+from utils import rag_pipeline
+from utils.vector_store import VectorStore
+
+def _chunks(doc_id, count=3):
+    return [{'text': f"document {doc_id} passage {i} about budgets", 'metadata': {'doc_id': doc_id, 'page_number': i}}
+            for i in range(count)]
+
+@pytest.fixture
+def retrieve(make_user, monkeypatch):
+    """Run one retrieval per fresh pipeline (as each request does); returns (chunks, searched)"""
+    monkeypatch.setattr(rag_pipeline, '_llm_client', StubLLMClient())
+    user_id = make_user()
+    store = VectorStore(user_id)
+    store.add_documents(_chunks(1) + _chunks(2))
+
+    def run(question):
+        pipeline = rag_pipeline.RAGPipeline(user_id, session_id='s1')
+        searches = []
+        search = pipeline.vector_store.search_by_vector
+        pipeline.vector_store.search_by_vector = lambda *args, **kwargs: searches.append(1) or search(*args, **kwargs)
+        return pipeline._retrieve(question, k=3), bool(searches)
+
+    run.store = store
+    return run
+
+def test_repeated_question_reuses_the_previous_chunks(retrieve):
+    retrieve("What about budgets?")
+    _, searched = retrieve("What about budgets?")
+    assert not searched
+
+def test_reused_chunks_are_dropped_after_a_same_size_rewrite(retrieve):
+    retrieve("What about budgets?")
+    # Delete a document and add another with as many chunks: same index size, different positions
+    retrieve.store.delete_document(1)
+    retrieve.store.add_documents(_chunks(3))
+
+    chunks, searched = retrieve("What about budgets?")
+    assert searched
+    assert all(chunk['metadata']['doc_id'] in (2, 3) for chunk in chunks)
+    store = VectorStore(retrieve.store.user_id)
+    assert all(store.metadata[chunk['id']]['text'] == chunk['text'] for chunk in chunks)
@@ -0,0 +1,50 @@
+"""
+Versioned indexes: adopting pre-versioning stores and rebuilding with an atomic swap
+"""
+import os
+import shutil
+from database import Document
+from utils.document_processor import DocumentProcessor
+from utils.ingestion import ingest_document
+from utils.reindex import Throttle, index_status, is_stale, rebuild_index
+from utils.vector_store import LEGACY_SIGNATURE, VectorStore, read_manifest, user_store_dir
+
+def _ingest(user_id, sample_pdf):
+    doc_id = Document.create(user_id, 'sample.pdf', 'sample.pdf', sample_pdf, page_count=6, status='processing')
+    return ingest_document(DocumentProcessor(), VectorStore(user_id), user_id, doc_id, sample_pdf, 'sample.pdf')
+
+def _make_legacy(user_id):
+    """Move the user's index to where stores lived before versioning and forget the manifest"""
+    store_dir = user_store_dir(user_id)
+    for name in ('faiss.index', 'metadata.pkl'):
+        shutil.move(os.path.join(store_dir, 'v1', name), os.path.join(store_dir, name))
+    shutil.rmtree(os.path.join(store_dir, 'v1'))
+    os.remove(os.path.join(store_dir, 'index.json'))
+
+def test_legacy_store_is_adopted_with_its_original_settings(make_user, sample_pdf):
+    user_id = make_user()
+    chunks = _ingest(user_id, sample_pdf)['chunks']
+    _make_legacy(user_id)
+
+    manifest = read_manifest(user_id)
+    assert manifest['active'] == 0
+    assert manifest['versions']['0']['dir'] == '.'
+    assert manifest['versions']['0']['chunking'] == LEGACY_SIGNATURE['chunking']
+    assert is_stale(user_id)
+    assert VectorStore(user_id).get_chunk_count() == chunks
+
+def test_rebuild_swaps_in_a_version_with_the_current_settings(make_user, sample_pdf):
+    user_id = make_user()
+    chunks = _ingest(user_id, sample_pdf)['chunks']
+    _make_legacy(user_id)
+
+    build = rebuild_index(user_id, throttle=Throttle(1.0))
+
+    assert build['status'] == 'ready'
+    status = index_status(user_id)
+    assert status['active']['version'] == build['version'] == 1
+    assert not status['stale']
+    assert VectorStore(user_id).get_chunk_count() == build['chunks'] == chunks
+    assert [document['chunk_count'] for document in Document.get_by_user(user_id)] == [chunks]
+    # The replaced legacy files are kept for rollback (INDEX_VERSIONS_KEPT)
+    assert os.path.exists(os.path.join(user_store_dir(user_id), 'faiss.index'))
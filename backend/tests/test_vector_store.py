@@ -0,0 +1,103 @@
+"""
+Filtered search over a user's index, and recovering from interrupted saves
+"""
+import pickle
+import pytest
+from utils.ingestion import reconcile_ingestion
+from utils.vector_store import VectorStore
+
+def _chunk(doc_id, page_start, page_end=None):
+    metadata = {'doc_id': doc_id, 'filename': f"doc{doc_id}.pdf", 'page_number': page_start, 'chunk_index': 0}
+    if page_end is not None:
+        metadata.update(page_start=page_start, page_end=page_end)
+    return {'text': f"doc {doc_id} pages {page_start}-{page_end or page_start}", 'metadata': metadata}
+
+@pytest.fixture
+def store(make_user):
+    store = VectorStore(make_user())
+    store.add_documents([
+        _chunk(1, 1, 1),
+        _chunk(1, 2, 4),   # spans pages 2-4
+        _chunk(1, 5, 5),
+        _chunk(2, 3),      # recursive chunking: page_number only
+        _chunk(2, 7),
+    ])
+    return store
+
+@pytest.mark.parametrize('filters, expected', [
+    ({}, [0, 1, 2, 3, 4]),
+    ({'doc_ids': [2]}, [3, 4]),
+    ({'page_start': 3}, [1, 2, 3, 4]),
+    ({'page_end': 3}, [0, 1, 3]),
+    ({'page_start': 3, 'page_end': 3}, [1, 3]),
+    ({'page_start': 4, 'page_end': 4}, [1]),
+    ({'doc_ids': [1], 'page_start': 6}, []),
+    ({'doc_ids': [], 'page_start': 1}, []),
+])
+def test_select_ids_matches_chunks_overlapping_the_page_range(store, filters, expected):
+    assert store.select_ids(filters).tolist() == expected
+
+def test_filtered_search_only_returns_allowed_chunks(store):
+    results = store.search("doc 1 pages", k=10, filters={'doc_ids': [1], 'page_start': 4, 'page_end': 6})
+    assert sorted(result['metadata']['page_number'] for result in results) == [2, 5]
+
+def test_filter_columns_follow_index_changes(store):
+    assert store.select_ids({'doc_ids': [2]}).tolist() == [3, 4]
+    store.delete_document(1)
+    assert store.select_ids({'doc_ids': [2]}).tolist() == [0, 1]
+    assert store.select_ids({'page_start': 3, 'page_end': 3}).tolist() == [0]
+    store.append_embeddings([_chunk(3, 1, 2)], store.generate_embeddings(["doc 3"]))
+    assert store.select_ids({'page_end': 2}).tolist() == [2]
+
+def _crash(*args, **kwargs):
+    raise RuntimeError("simulated crash")
+
+def _assert_aligned(store):
+    """Every stored vector is the embedding of the chunk text at the same position"""
+    assert store.index.ntotal == len(store.metadata)
+    for position, item in enumerate(store.metadata):
+        assert store.search(item['text'], k=1)[0]['id'] == position
+
+def test_crash_between_index_and_metadata_save_on_append(store, monkeypatch):
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(VectorStore, '_save_metadata', _crash)
+        store.add_documents([_chunk(3, 1, 1), _chunk(3, 2, 2)])
+
+    reopened = VectorStore(store.user_id)
+    assert reopened.realigned and len(reopened.metadata) == 5
+    _assert_aligned(reopened)
+    reopened.add_documents([_chunk(4, 1, 1)])
+    _assert_aligned(VectorStore(store.user_id))
+
+def test_crash_between_index_and_metadata_save_on_delete(store, monkeypatch):
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(VectorStore, '_save_metadata', _crash)
+        store.delete_document(1)
+
+    reopened = VectorStore(store.user_id)
+    assert reopened.realigned and len(reopened.metadata) == 5
+    _assert_aligned(reopened)
+    reopened.truncate_document(1, 1)
+    _assert_aligned(VectorStore(store.user_id))
+
+def test_crash_while_writing_metadata_keeps_the_previous_file(store, monkeypatch):
+    def partial_dump(obj, f):
+        f.write(b'partial')
+        raise RuntimeError("simulated crash")
+
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(pickle, 'dump', partial_dump)
+        store.add_documents([_chunk(3, 1, 1)])
+
+    with open(store.metadata_path, 'rb') as f:
+        assert len(pickle.load(f)) == 5
+    _assert_aligned(VectorStore(store.user_id))
+
+def test_reconcile_saves_the_realigned_index(store, monkeypatch):
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(VectorStore, '_save_metadata', _crash)
+        store.add_documents([_chunk(3, 1, 1)])
+
+    assert reconcile_ingestion()['repaired'] == 1
+    assert not VectorStore(store.user_id).realigned
+    assert reconcile_ingestion()['repaired'] == 0
@@ -0,0 +1,226 @@
+"""
+Structure-aware, token-based chunking
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from config import Config
+from utils.tokenizer import count_tokens, split_tokens
+
+# The closing quote or bracket stays with its sentence (lookbehind), only the whitespace is consumed
+_SENTENCE_SPLIT = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=[A-Z0-9"\'(\[])')
+_SENTENCE_END = re.compile(r'[.!?:;]["\')\]]?$')
+_NUMBERED_HEADING = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.|Chapter\s+\d+|Section\s+\d+)\s+\S', re.IGNORECASE)
+
+class StructuredChunker:
+    """
+    Split a stream of pages into chunks measured in tokens
+
+    Chunks break at headings first, then paragraphs, then sentences. Overlap
+    is made of whole sentences and, like the chunk buffer itself, carries
+    across page boundaries; each chunk records the pages it spans.
+    """
+
+    def __init__(self, chunk_tokens: int = None, overlap_tokens: int = None):
+        self.chunk_tokens = chunk_tokens if chunk_tokens is not None else Config.CHUNK_SIZE_TOKENS
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else Config.CHUNK_OVERLAP_TOKENS
+
+    @staticmethod
+    def _is_heading(line: str) -> bool:
+        """Guess whether a line is a heading rather than body text"""
+        words = line.split()
+        if not words or len(words) > 12 or len(line) > 100 or _SENTENCE_END.search(line):
+            return False
+        if _NUMBERED_HEADING.match(line):
+            return True
+        letters = [c for c in line if c.isalpha()]
+        if letters and all(c.isupper() for c in letters) and len(letters) > 3:
+            return True
+        # Title Case lines: most words capitalised
+        capitalised = sum(1 for word in words if word[0].isupper())
+        return len(words) <= 8 and capitalised >= max(2, int(len(words) * 0.8))
+
+    def _blocks(self, text: str) -> Iterator[Dict]:
+        """Yield headings and paragraphs from one page of extracted text"""
+        paragraph = []
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                if paragraph:
+                    yield {'type': 'paragraph', 'text': ' '.join(paragraph)}
+                    paragraph = []
+                continue
+            if self._is_heading(line) and (not paragraph or _SENTENCE_END.search(paragraph[-1])):
+                if paragraph:
+                    yield {'type': 'paragraph', 'text': ' '.join(paragraph)}
+                    paragraph = []
+                yield {'type': 'heading', 'text': line}
+                continue
+            if paragraph and paragraph[-1].endswith('-') and line[:1].islower():
+                # Re-join words hyphenated across line wraps
+                paragraph[-1] = paragraph[-1][:-1] + line
+            else:
+                paragraph.append(line)
+        if paragraph:
+            yield {'type': 'paragraph', 'text': ' '.join(paragraph)}
+
+    def _sentences(self, text: str) -> List[str]:
+        """Split a paragraph into sentences, breaking any that exceed the chunk size"""
+        sentences = []
+        for sentence in _SENTENCE_SPLIT.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if count_tokens(sentence) > self.chunk_tokens:
+                sentences.extend(piece.strip() for piece in split_tokens(sentence, self.chunk_tokens) if piece.strip())
+            else:
+                sentences.append(sentence)
+        return sentences
+
+    def _paragraph_units(self, text: str, breaks: List[Tuple[int, int]]) -> Iterator[Dict]:
+        """
+        Sentence units of a paragraph, each tagged with the pages it covers
+
+        breaks lists (character offset, page) where the paragraph's text moves
+        to a new page, starting with (0, first page); a paragraph joined across
+        a page break has more than one.
+        """
+        def page_at(offset: int) -> int:
+            return next(page for start, page in reversed(breaks) if start <= offset)
+
+        sentences = self._sentences(text)
+        position = 0
+        for index, sentence in enumerate(sentences):
+            start = text.find(sentence, position)
+            if start < 0:
+                start = position  # a piece of an over-long sentence, re-joined differently
+            position = start + len(sentence)
+            yield {'type': 'sentence', 'text': sentence, 'page': page_at(start),
+                   'page_end': page_at(max(start, position - 1)),
+                   'tokens': count_tokens(sentence), 'paragraph_end': index == len(sentences) - 1}
+
+    def _units(self, pages: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Yield sentence and heading units tagged with their first and last page
+
+        A paragraph that runs off the end of a page without finishing its
+        sentence is held back and joined with the start of the next page.
+        """
+        carry = None  # (text, page breaks) of an unfinished trailing paragraph
+        for page_data in pages:
+            page_num = page_data['page_number']
+            blocks = list(self._blocks(page_data['text']))
+            if page_data.get('heading'):
+                # Extractors that know the document structure pass its headings explicitly
+                blocks[:0] = [{'type': 'heading', 'text': line.strip()}
+                              for line in page_data['heading'].splitlines() if line.strip()]
+            if carry:
+                text, breaks = carry
+                carry = None
+                if blocks and blocks[0]['type'] == 'paragraph':
+                    blocks[0] = {'type': 'paragraph', 'text': f"{text} {blocks[0]['text']}",
+                                 'breaks': breaks + [(len(text) + 1, page_num)]}
+                else:
+                    blocks.insert(0, {'type': 'paragraph', 'text': text, 'breaks': breaks})
+
+            for position, block in enumerate(blocks):
+                breaks = block.get('breaks', [(0, page_num)])
+                is_last = position == len(blocks) - 1
+                if is_last and block['type'] == 'paragraph' and not _SENTENCE_END.search(block['text']):
+                    carry = (block['text'], breaks)
+                    continue
+                if block['type'] == 'heading':
+                    yield {'type': 'heading', 'text': block['text'], 'page': page_num, 'page_end': page_num,
+                           'tokens': count_tokens(block['text'])}
+                    continue
+                yield from self._paragraph_units(block['text'], breaks)
+        if carry:
+            yield from self._paragraph_units(*carry)
+
+    def _overlap(self, units: List[Dict]) -> List[Dict]:
+        """Trailing whole sentences of a chunk that fit in the overlap budget"""
+        overlap = []
+        total = 0
+        for unit in reversed(units):
+            if unit['type'] != 'sentence' or total + unit['tokens'] > self.overlap_tokens:
+                break
+            overlap.insert(0, unit)
+            total += unit['tokens']
+        # Never carry the whole chunk forward, or chunks would repeat
+        return overlap if len(overlap) < len(units) else []
+
+    def iter_chunks(self, pages: Iterable[Dict], doc_id: int, filename: str,
+                    start_index: int = 0) -> Iterator[Dict]:
+        """
+        Lazily chunk pages as they arrive, numbering chunks from start_index
+
+        Returns:
+            Iterator of chunks with 'text' and 'metadata' (page_number is the
+            first page; page_start/page_end give the full span; offset, for
+            formats without pages, is where the first section starts)
+        """
+        buffer: List[Dict] = []
+        buffer_tokens = 0
+        fresh_units = 0  # units in the buffer that are not overlap from the previous chunk
+        heading: Optional[str] = None  # latest heading seen
+        heading_of_chunk: Optional[str] = None  # section the current chunk belongs to
+        chunk_index = start_index
+        offsets = {}  # page -> character offset of that section, for formats without pages
+
+        def track_offsets(pages: Iterable[Dict]) -> Iterator[Dict]:
+            for page_data in pages:
+                offset = page_data.get('metadata', {}).get('offset')
+                if offset is not None:
+                    offsets[page_data['page_number']] = offset
+                yield page_data
+
+        def emit(units: List[Dict]) -> Dict:
+            pages_spanned = [unit['page'] for unit in units] + [unit['page_end'] for unit in units]
+            text = ""
+            for unit in units:
+                if unit['type'] == 'heading':
+                    text += "\n\n" + unit['text'] + "\n"
+                else:
+                    text += ("" if not text or text.endswith("\n") else " ") + unit['text']
+            metadata = {
+                'doc_id': doc_id,
+                'filename': filename,
+                'page_number': pages_spanned[0],
+                'page_start': min(pages_spanned),
+                'page_end': max(pages_spanned),
+                'chunk_index': chunk_index,
+                'heading': heading_of_chunk,
+                'tokens': sum(unit['tokens'] for unit in units)
+            }
+            if pages_spanned[0] in offsets:
+                metadata['offset'] = offsets[pages_spanned[0]]
+            return {'text': text.strip(), 'metadata': metadata}
+
+        for unit in self._units(track_offsets(pages)):
+            starts_section = unit['type'] == 'heading'
+            # Start a new chunk at a heading once the current one has some substance,
+            # at a paragraph end when nearly full, or when the next unit would overflow
+            section_break = starts_section and buffer_tokens >= self.chunk_tokens // 3
+            paragraph_break = bool(buffer) and buffer[-1].get('paragraph_end', False) \
+                and buffer_tokens >= self.chunk_tokens * 0.85
+            overflow = buffer_tokens + unit['tokens'] > self.chunk_tokens
+            if fresh_units and (section_break or paragraph_break or overflow):
+                # A heading never ends a chunk; it moves on with its section
+                trailing = [buffer.pop()] if buffer[-1]['type'] == 'heading' and fresh_units > 1 else []
+                yield emit(buffer)
+                chunk_index += 1
+                buffer = ([] if section_break or trailing else self._overlap(buffer)) + trailing
+                buffer_tokens = sum(item['tokens'] for item in buffer)
+                fresh_units = len(trailing)
+                heading_of_chunk = heading
+            if starts_section:
+                heading = unit['text']
+                if not fresh_units:
+                    heading_of_chunk = heading
+            elif heading_of_chunk is None:
+                heading_of_chunk = heading
+            buffer.append(unit)
+            buffer_tokens += unit['tokens']
+            fresh_units += 1
+
+        if fresh_units:
+            yield emit(buffer)
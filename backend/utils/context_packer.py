@@ -0,0 +1,118 @@
+"""
+Token-budgeted packing of retrieved chunks into LLM context
+"""
+import re
+from typing import List, Dict
+from config import Config
+from utils.tokenizer import count_tokens, truncate_tokens
+
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]?(?=\s|$)')
+
+def source_header(number: int, metadata: Dict) -> str:
+    """The line introducing a source in the prompt, e.g. '[Source 2] Document: report.pdf, Page: 3-4'"""
+    page_end = metadata.get('page_end', metadata['page_number'])
+    pages = metadata['page_number'] if page_end == metadata['page_number'] else f"{metadata['page_number']}-{page_end}"
+    # Only PDFs have pages; other formats are numbered by section
+    location = 'Page' if metadata['filename'].lower().endswith('.pdf') else 'Section'
+    return f"[Source {number}] Document: {metadata['filename']}, {location}: {pages}\n"
+
+class ContextPacker:
+    """Fit ranked chunks into a token budget, merging neighbours and removing overlap"""
+
+    def __init__(self, budget: int = None):
+        self.budget = budget if budget is not None else Config.CONTEXT_TOKEN_BUDGET
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """Count tokens in text"""
+        return count_tokens(text)
+
+    @staticmethod
+    def truncate(text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, ending on a sentence boundary where possible"""
+        head = truncate_tokens(text, max_tokens)
+        if len(head) >= len(text):
+            return text
+
+        sentence_ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+        if sentence_ends and sentence_ends[-1] >= len(head) // 2:
+            return head[:sentence_ends[-1]]
+        # No usable sentence end: fall back to the last word boundary
+        cut = head.rfind(' ')
+        return (head[:cut] if cut > 0 else head).rstrip() + "..."
+
+    @staticmethod
+    def _join_overlapping(first: str, second: str) -> str:
+        """Concatenate two consecutive chunks, dropping the text they share"""
+        # Overlap is at most CHUNK_OVERLAP characters or CHUNK_OVERLAP_TOKENS tokens
+        max_overlap = min(len(first), len(second), max(Config.CHUNK_OVERLAP, Config.CHUNK_OVERLAP_TOKENS * 8) + 50)
+        for size in range(max_overlap, 10, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return first + " " + second
+
+    def _merge(self, chunks: List[Dict]) -> List[Dict]:
+        """Merge consecutive chunks of the same page, keeping the best rank of each group"""
+        groups = {}
+        for rank, chunk in enumerate(chunks):
+            metadata = chunk['metadata']
+            key = (metadata.get('doc_id'), metadata.get('page_number'))
+            groups.setdefault(key, []).append((rank, chunk))
+
+        merged = []
+        for members in groups.values():
+            members.sort(key=lambda item: item[1]['metadata'].get('chunk_index', 0))
+            seen_texts = set()
+            current = None
+            for rank, chunk in members:
+                if chunk['text'] in seen_texts:
+                    continue
+                seen_texts.add(chunk['text'])
+                index = chunk['metadata'].get('chunk_index', 0)
+                if current and index == current['last_index'] + 1:
+                    current['text'] = self._join_overlapping(current['text'], chunk['text'])
+                    current['last_index'] = index
+                    if 'page_end' in chunk['metadata']:
+                        page_end = max(current['metadata'].get('page_end', 0), chunk['metadata']['page_end'])
+                        current['metadata'] = {**current['metadata'], 'page_end': page_end}
+                    current['rank'] = min(current['rank'], rank)
+                    continue
+                if current:
+                    merged.append(current)
+                current = {
+                    'text': chunk['text'],
+                    'metadata': chunk['metadata'],
+                    'rank': rank,
+                    'last_index': index
+                }
+            if current:
+                merged.append(current)
+
+        merged.sort(key=lambda item: item['rank'])
+        return merged
+
+    def pack(self, chunks: List[Dict]) -> List[Dict]:
+        """
+        Select and trim ranked chunks so their text fits the token budget
+
+        Returns:
+            List of dicts with 'text', 'metadata' and 'tokens', best first
+        """
+        packed = []
+        remaining = self.budget
+        for item in self._merge(chunks):
+            if remaining <= Config.CONTEXT_MIN_CHUNK_TOKENS:
+                break
+            # Room for the source header the prompt puts above the text
+            header_tokens = self.count_tokens(source_header(len(packed) + 1, item['metadata']))
+            available = remaining - header_tokens
+            text = item['text']
+            tokens = self.count_tokens(text)
+            if tokens > available:
+                text = self.truncate(text, available)
+                tokens = self.count_tokens(text)
+                if not text or tokens < Config.CONTEXT_MIN_CHUNK_TOKENS:
+                    break
+            packed.append({'text': text, 'metadata': item['metadata'], 'tokens': tokens})
+            remaining -= tokens + header_tokens
+        return packed
@@ -0,0 +1,49 @@
+"""
+Per-session retrieval state shared across RAGPipeline instances
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import Config
+
+class ConversationCache:
+    """Bounded LRU of recent question embeddings and retrieved chunks per chat session"""
+
+    def __init__(self, max_sessions: int = None):
+        self.max_sessions = max_sessions if max_sessions is not None else Config.CONVERSATION_CACHE_SIZE
+        self._sessions = OrderedDict()  # (user_id, session_id) -> state dict
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, session_id: str) -> Optional[Dict]:
+        """
+        Get cached state for a session
+
+        Returns:
+            Dict with 'question_vectors', 'query_vector', 'chunks' and 'revision'
+            (of the index the chunks came from), or None
+        """
+        key = (user_id, session_id)
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None:
+                self._sessions.move_to_end(key)
+            return state
+
+    def put(self, user_id: int, session_id: str, state: Dict):
+        """Store state for a session, evicting the least recently used one"""
+        if self.max_sessions <= 0:
+            return
+        key = (user_id, session_id)
+        with self._lock:
+            self._sessions[key] = state
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every session of a user (their vector store changed)"""
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == user_id]:
+                del self._sessions[key]
+
+conversation_cache = ConversationCache()
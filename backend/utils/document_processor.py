@@ -2,49 +2,102 @@
 Document processing utilities
 """
 import os
-from typing import List, Dict
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Iterable, Iterator, Optional
 from config import Config
+from utils.chunker import StructuredChunker
+from utils.extractors import DEFAULT_EXTRACTORS, Extractor
+from utils.logger import get_logger
+from utils.metrics import instrument, timed_iter
+from utils.text_cache import discard_sections, hash_file, read_sections, store_sections
+
+logger = get_logger('extract')
 
 class DocumentProcessor:
-    """Handle PDF processing and text extraction"""
+    """Handle text extraction (PDF, DOCX, HTML, Markdown, plain text) and chunking"""
+    
+    # Extractors by file extension; see register_extractor
+    _extractors: Dict[str, Extractor] = {}
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self._text_splitter = None
+        self.chunker = StructuredChunker()
     
-    def extract_text_from_pdf(self, file_path: str) -> List[Dict[str, any]]:
+    @property
+    def text_splitter(self):
+        """Character splitter for the 'recursive' strategy (langchain is imported on first use)"""
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=Config.CHUNK_SIZE,
+                chunk_overlap=Config.CHUNK_OVERLAP,
+                length_function=len,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._text_splitter
+    
+    @classmethod
+    def register_extractor(cls, extractor: Extractor):
+        """Handle the extractor's extensions with it (replacing any earlier one)"""
+        for extension in extractor.extensions:
+            cls._extractors[extension.lower()] = extractor
+    
+    @classmethod
+    def get_extractor(cls, file_path: str) -> Extractor:
+        """
+        Pick the extractor for a file by its extension
+        
+        Uploads are accepted by extension (Config.ALLOWED_EXTENSIONS), and
+        stored files are re-read by path when resuming or re-indexing, so the
+        extension is the one thing every caller has.
+        """
+        extension = os.path.splitext(file_path)[1].lstrip('.').lower()
+        extractor = cls._extractors.get(extension)
+        if extractor is None:
+            raise ValueError(f"Unsupported file type: {extension or 'unknown'}")
+        return extractor
+    
+    def iter_pages(self, file_path: str, start_page: int = 1, file_hash: Optional[str] = None) -> Iterator[Dict[str, any]]:
         """
-        Extract text from PDF with page numbers
+        Lazily extract text one page (or section, for formats without pages) at a time
+        
+        Text already extracted from an identical file is read back from the
+        text cache; pass file_hash if it is known to skip hashing the file.
         
         Returns:
-            List of dicts with 'page_number', 'text', and 'metadata'
+            Iterator of dicts with 'page_number', 'text', and 'metadata'
+            ('heading' too, for sections that open with one)
         """
+        extractor = self.get_extractor(file_path)
+        if Config.TEXT_CACHE_ENABLED:
+            file_hash = file_hash or hash_file(file_path)
+            cached = read_sections(file_hash, extractor.cache_key, start_page)
+            if cached is not None:
+                try:
+                    for page in timed_iter('text_cache', cached, 'read'):
+                        page['metadata']['source'] = os.path.basename(file_path)  # entries are shared by identical files
+                        start_page = page['page_number'] + 1
+                        yield page
+                    return
+                except Exception as e:
+                    # Damaged entry: drop it and extract the rest of the file
+                    logger.warning("Unreadable text cache entry", extra={'path': file_path, 'error': str(e)})
+                    discard_sections(file_hash, extractor.cache_key)
         try:
-            reader = PdfReader(file_path)
-            pages = []
-            
-            for page_num, page in enumerate(reader.pages, start=1):
-                text = page.extract_text()
-                if text.strip():  # Only add non-empty pages
-                    pages.append({
-                        'page_number': page_num,
-                        'text': text,
-                        'metadata': {
-                            'source': os.path.basename(file_path),
-                            'page': page_num
-                        }
-                    })
-            
-            return pages
-            
+            sections = extractor.iter_sections(file_path, start=start_page)
+            if Config.TEXT_CACHE_ENABLED and start_page <= 1:
+                sections = store_sections(file_hash, extractor.cache_key, sections)
+            yield from sections
         except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
+            raise Exception(f"Error extracting text from {extractor.name.upper()}: {str(e)}")
+    
+    def extract_text_from_pdf(self, file_path: str) -> List[Dict[str, any]]:
+        """
+        Extract text with page numbers (from any supported format, despite the name)
+        
+        Returns:
+            List of dicts with 'page_number', 'text', and 'metadata'
+        """
+        return list(self.iter_pages(file_path))
     
     def chunk_text(self, pages: List[Dict[str, any]], doc_id: int, filename: str) -> List[Dict[str, any]]:
         """
@@ -53,32 +106,66 @@ class DocumentProcessor:
         Returns:
             List of chunks with metadata
         """
-        chunks = []
+        return list(self.iter_chunks(pages, doc_id, filename))
+    
+    def iter_chunks(self, pages: Iterable[Dict[str, any]], doc_id: int, filename: str,
+                    start_index: int = 0) -> Iterator[Dict[str, any]]:
+        """
+        Lazily split a stream of pages into chunks using Config.CHUNK_STRATEGY
         
+        Returns:
+            Iterator of chunks with metadata
+        """
+        if Config.CHUNK_STRATEGY == 'structured':
+            chunks = self.chunker.iter_chunks(pages, doc_id, filename, start_index=start_index)
+        else:
+            chunks = self._iter_recursive_chunks(pages, doc_id, filename, start_index=start_index)
+        # Page extraction pulled in by the chunker is timed separately and excluded here
+        return timed_iter('chunking', chunks, Config.CHUNK_STRATEGY)
+    
+    def _iter_recursive_chunks(self, pages: Iterable[Dict[str, any]], doc_id: int, filename: str,
+                               start_index: int = 0) -> Iterator[Dict[str, any]]:
+        """Split each page independently on character length, numbering chunks across the document"""
+        chunk_index = start_index
         for page_data in pages:
             page_num = page_data['page_number']
             text = page_data['text']
+            if page_data.get('heading'):
+                text = f"{page_data['heading']}\n\n{text}"
+            location = {key: page_data['metadata'][key] for key in ('heading', 'offset')
+                        if page_data.get('metadata', {}).get(key) is not None}
             
             # Split text into chunks
             text_chunks = self.text_splitter.split_text(text)
             
-            for chunk_idx, chunk in enumerate(text_chunks):
-                chunks.append({
+            for chunk in text_chunks:
+                yield {
                     'text': chunk,
                     'metadata': {
                         'doc_id': doc_id,
                         'filename': filename,
                         'page_number': page_num,
-                        'chunk_index': chunk_idx
+                        'chunk_index': chunk_index,
+                        **location
                     }
-                })
-        
-        return chunks
+                }
+                chunk_index += 1
     
-    def get_page_count(self, file_path: str) -> int:
-        """Get total page count of PDF"""
+    @instrument('pdf_extract', 'page_count')
+    def get_page_count(self, file_path: str, file_hash: Optional[str] = None) -> int:
+        """
+        Get total page count (number of sections for formats without pages)
+        
+        Sections can only be counted by extracting them, so that goes through
+        the text cache and the ingestion that follows reads the text back.
+        """
+        extractor = self.get_extractor(file_path)
+        if not extractor.paged and Config.TEXT_CACHE_ENABLED:
+            return sum(1 for _ in self.iter_pages(file_path, file_hash=file_hash))
         try:
-            reader = PdfReader(file_path)
-            return len(reader.pages)
+            return extractor.count_sections(file_path)
         except Exception as e:
-            raise Exception(f"Error reading PDF: {str(e)}")
+            raise Exception(f"Error reading {extractor.name.upper()}: {str(e)}")
+
+for _extractor in DEFAULT_EXTRACTORS:
+    DocumentProcessor.register_extractor(_extractor)
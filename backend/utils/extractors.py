@@ -0,0 +1,365 @@
+"""
+Text extractors for each supported file format
+
+An extractor streams a file as sections in the same schema as PDF pages:
+'page_number' (the page, or the section number for formats without pages),
+'text' and 'metadata'. Text-based formats are read natively, without a PDF
+round trip, and keep their structure: headings are passed to the chunker
+explicitly ('heading') and each section records where it starts
+('offset': characters into the file for plain text and Markdown, into the
+extracted text for HTML and DOCX).
+"""
+import os
+import re
+import zipfile
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from xml.etree import ElementTree
+from config import Config
+from utils.logger import get_logger
+from utils.metrics import timed
+from utils.pdf_backends import FALLBACK_BACKEND, get_pdf_backend
+
+logger = get_logger('extract')
+
+Block = Tuple[str, str, int]  # ('heading' | 'paragraph', text, character offset)
+
+class Extractor:
+    """Base class: turn one file format into a stream of sections"""
+
+    name = None
+    extensions: Tuple[str, ...] = ()
+    version = 1  # bump when output changes, so anything derived from it is rebuilt
+    paged = False  # True if the file records its page count, so counting needs no extraction
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies this extractor's output in the extracted text cache"""
+        return f"{self.name}-v{self.version}"
+
+    def iter_sections(self, file_path: str, start: int = 1) -> Iterator[Dict[str, any]]:
+        """Yield non-empty sections numbered from 1, skipping those before `start`"""
+        raise NotImplementedError
+
+    def count_sections(self, file_path: str) -> int:
+        """Number of sections (pages for paged formats)"""
+        return sum(1 for _ in self.iter_sections(file_path))
+
+class PdfExtractor(Extractor):
+    """PDF pages via the configured backend (utils/pdf_backends.py), falling back to PyPDF2"""
+
+    name = 'pdf'
+    extensions = ('pdf',)
+    paged = True
+
+    @property
+    def cache_key(self) -> str:
+        # Backends extract slightly different text, so each gets its own entries
+        return f"{self.name}-{get_pdf_backend().name}-v{self.version}"
+
+    def iter_sections(self, file_path: str, start: int = 1) -> Iterator[Dict[str, any]]:
+        backend = get_pdf_backend()
+        pages = backend.iter_pages(file_path, start)
+        fallback_reader = None
+        next_page = max(1, start)
+
+        while True:
+            try:
+                with timed('pdf_extract', backend.name):
+                    item = next(pages, None)
+            except Exception as e:
+                if backend is FALLBACK_BACKEND:
+                    raise
+                # The backend gave up on the whole document: finish it with PyPDF2
+                logger.warning("PDF backend failed, continuing with PyPDF2",
+                               extra={'backend': backend.name, 'page': next_page, 'error': str(e)})
+                backend = FALLBACK_BACKEND
+                pages = backend.iter_pages(file_path, next_page)
+                continue
+            if item is None:
+                return
+            page_num, text = item
+            next_page = page_num + 1
+            if text is None:
+                with timed('pdf_extract', FALLBACK_BACKEND.name):
+                    if fallback_reader is None:
+                        from PyPDF2 import PdfReader
+                        fallback_reader = PdfReader(file_path)
+                    text = FALLBACK_BACKEND.page_text(fallback_reader, page_num)
+            if text.strip():  # Only yield non-empty pages
+                yield {
+                    'page_number': page_num,
+                    'text': text,
+                    'metadata': {
+                        'source': os.path.basename(file_path),
+                        'page': page_num
+                    }
+                }
+
+    def count_sections(self, file_path: str) -> int:
+        backend = get_pdf_backend()
+        try:
+            return backend.page_count(file_path)
+        except Exception:
+            if backend is FALLBACK_BACKEND:
+                raise
+            return FALLBACK_BACKEND.page_count(file_path)
+
+class TextExtractor(Extractor):
+    """Plain text: paragraphs are separated by blank lines"""
+
+    name = 'text'
+    extensions = ('txt', 'text')
+
+    def _blocks(self, lines: Iterable[str]) -> Iterator[Block]:
+        paragraph, start, offset = [], 0, 0
+        for line in lines:
+            stripped = line.strip()
+            if stripped:
+                if not paragraph:
+                    start = offset
+                paragraph.append(stripped)
+            elif paragraph:
+                yield 'paragraph', '\n'.join(paragraph), start
+                paragraph = []
+            offset += len(line)
+        if paragraph:
+            yield 'paragraph', '\n'.join(paragraph), start
+
+    def iter_sections(self, file_path: str, start: int = 1) -> Iterator[Dict[str, any]]:
+        with open(file_path, encoding='utf-8', errors='replace') as f:
+            yield from group_sections(self._timed_blocks(f), file_path, start)
+
+    def _timed_blocks(self, lines: Iterable[str]) -> Iterator[Block]:
+        blocks = self._blocks(lines)
+        while True:
+            with timed('extract', self.name):
+                block = next(blocks, None)
+            if block is None:
+                return
+            yield block
+
+_ATX_HEADING = re.compile(r'^ {0,3}(#{1,6})\s+(.*?)\s*#*\s*$')
+_SETEXT_UNDERLINE = re.compile(r'^ {0,3}(=+|-+)\s*$')
+_FENCE = re.compile(r'^ {0,3}(```|~~~)')
+
+class MarkdownExtractor(TextExtractor):
+    """Markdown: '#' and underlined headings start sections; fenced code is kept verbatim"""
+
+    name = 'markdown'
+    extensions = ('md', 'markdown')
+
+    def _blocks(self, lines: Iterable[str]) -> Iterator[Block]:
+        paragraph, start, offset = [], 0, 0
+        fence = None
+        for line in lines:
+            stripped = line.strip()
+            if fence:
+                paragraph.append(line.rstrip('\n'))
+                if stripped.startswith(fence):
+                    fence = None
+            elif _FENCE.match(line):
+                if not paragraph:
+                    start = offset
+                fence = _FENCE.match(line).group(1)
+                paragraph.append(line.rstrip('\n'))
+            elif _ATX_HEADING.match(line):
+                if paragraph:
+                    yield 'paragraph', '\n'.join(paragraph), start
+                    paragraph = []
+                yield 'heading', _ATX_HEADING.match(line).group(2), offset
+            elif _SETEXT_UNDERLINE.match(line) and len(paragraph) == 1 and not paragraph[0].startswith(('-', '*', '>')):
+                yield 'heading', paragraph[0], start
+                paragraph = []
+            elif stripped:
+                if not paragraph:
+                    start = offset
+                paragraph.append(stripped)
+            elif paragraph:
+                yield 'paragraph', '\n'.join(paragraph), start
+                paragraph = []
+            offset += len(line)
+        if paragraph:
+            yield 'paragraph', '\n'.join(paragraph), start
+
+class _HtmlBlockParser(HTMLParser):
+    """Collect headings and paragraphs from HTML as it is fed"""
+
+    SKIP = {'script', 'style', 'noscript', 'template', 'title', 'svg'}
+    HEADINGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    BREAKS = {'p', 'div', 'li', 'ul', 'ol', 'tr', 'table', 'section', 'article', 'header', 'footer',
+              'blockquote', 'pre', 'br', 'hr', 'dt', 'dd', 'figcaption', 'main', 'aside', 'nav'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._text = []
+        self._skip_depth = 0
+        self._heading = False
+        self._offset = 0
+
+    def _flush(self):
+        text = re.sub(r'\s+', ' ', ''.join(self._text)).strip()
+        self._text = []
+        if text:
+            self.blocks.append(('heading' if self._heading else 'paragraph', text, self._offset))
+            self._offset += len(text) + 2
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.HEADINGS:
+            self._flush()
+            self._heading = True
+        elif tag in self.BREAKS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.BREAKS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.HEADINGS:
+            self._flush()
+            self._heading = False
+        elif tag in self.BREAKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+class HtmlExtractor(Extractor):
+    """HTML: <h1>-<h6> start sections, block elements separate paragraphs, scripts and styles are dropped"""
+
+    name = 'html'
+    extensions = ('html', 'htm', 'xhtml')
+    READ_SIZE = 64 * 1024
+
+    def _blocks(self, file_path: str) -> Iterator[Block]:
+        parser = _HtmlBlockParser()
+        with open(file_path, encoding='utf-8', errors='replace') as f:
+            while True:
+                with timed('extract', self.name):
+                    data = f.read(self.READ_SIZE)
+                    if data:
+                        parser.feed(data)
+                    else:
+                        parser.close()
+                blocks, parser.blocks = parser.blocks, []
+                yield from blocks
+                if not data:
+                    return
+
+    def iter_sections(self, file_path: str, start: int = 1) -> Iterator[Dict[str, any]]:
+        return group_sections(self._blocks(file_path), file_path, start)
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_HEADING_STYLE = re.compile(r'^(heading\s*\d|title)$', re.IGNORECASE)
+
+class DocxExtractor(Extractor):
+    """Word .docx: body paragraphs and table cells, with Heading/Title styles as headings (stdlib only)"""
+
+    name = 'docx'
+    extensions = ('docx',)
+
+    def _blocks(self, file_path: str) -> Iterator[Block]:
+        offset = 0
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as document:
+            events = ElementTree.iterparse(document, events=('end',))
+            while True:
+                with timed('extract', self.name):
+                    block = None
+                    for _, element in events:
+                        if element.tag != f"{_W}p":
+                            continue
+                        block = self._paragraph(element, offset)
+                        element.clear()  # keep memory flat on large documents
+                        if block:
+                            break
+                if block is None:
+                    return
+                offset += len(block[1]) + 2
+                yield block
+
+    @staticmethod
+    def _paragraph(element, offset: int) -> Optional[Block]:
+        parts = []
+        for node in element.iter():
+            if node.tag == f"{_W}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{_W}tab":
+                parts.append('\t')
+            elif node.tag in (f"{_W}br", f"{_W}cr"):
+                parts.append('\n')
+        text = ''.join(parts).strip()
+        if not text:
+            return None
+        style = element.find(f"{_W}pPr/{_W}pStyle")
+        style_name = style.get(f"{_W}val", '') if style is not None else ''
+        return ('heading' if _DOCX_HEADING_STYLE.match(style_name) else 'paragraph'), text, offset
+
+    def iter_sections(self, file_path: str, start: int = 1) -> Iterator[Dict[str, any]]:
+        return group_sections(self._blocks(file_path), file_path, start)
+
+def group_sections(blocks: Iterable[Block], file_path: str, start: int = 1,
+                   max_chars: int = None) -> Iterator[Dict[str, any]]:
+    """
+    Group headings and paragraphs into sections of at most about max_chars
+
+    A heading always starts a new section and is passed as its 'heading'; a
+    long run of text under one heading continues in further sections.
+    """
+    max_chars = max_chars or Config.TEXT_SECTION_CHARS
+    source = os.path.basename(file_path)
+    number = 0
+    heading = None  # heading the text currently belongs to
+    new_heading = None  # heading that opens the pending section, if any
+    parts, size, offset = [], 0, None
+
+    def section():
+        return {
+            'page_number': number,
+            'text': '\n\n'.join(parts),
+            'heading': new_heading,
+            'metadata': {
+                'source': source,
+                'page': number,
+                'heading': heading,
+                'offset': offset
+            }
+        }
+
+    for kind, text, position in blocks:
+        if kind == 'heading':
+            if parts:
+                number += 1
+                if number >= start:
+                    yield section()
+                parts, size, new_heading = [], 0, None
+            # Consecutive headings (e.g. a chapter and its first subsection) open one section
+            new_heading = f"{new_heading}\n{text}" if new_heading else text
+            heading = text
+            offset = position
+            continue
+        if parts and size + len(text) > max_chars:
+            number += 1
+            if number >= start:
+                yield section()
+            parts, size, new_heading, offset = [], 0, None, None
+        if offset is None:
+            offset = position
+        parts.append(text)
+        size += len(text) + 2
+    if parts or new_heading:
+        number += 1
+        if number >= start:
+            yield section()
+
+DEFAULT_EXTRACTORS = (PdfExtractor(), DocxExtractor(), HtmlExtractor(), MarkdownExtractor(), TextExtractor())
@@ -0,0 +1,309 @@
+"""
+Streaming document ingestion
+
+Pages are extracted, chunked, embedded and appended to the vector store as a
+pipeline of three threads joined by small bounded queues. A slow stage makes
+the stages before it wait, so memory stays flat however large the document
+is, and the index is flushed to disk every few batches so partial progress
+is searchable and can be resumed.
+"""
+import contextvars
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+from config import Config
+from database import Document
+from utils.logger import get_logger
+from utils.profiling import profiled
+from utils.vector_store import VectorStore, index_lock
+
+logger = get_logger('ingestion')
+_DONE = object()  # end-of-stream marker passed down the queues
+
+class IngestionPipeline:
+    """Pages -> chunks -> embedding batches -> index appends, with backpressure"""
+
+    def __init__(self, processor, vector_store, batch_size: int = None,
+                 queue_size: int = None, save_every: int = None):
+        self.processor = processor
+        self.vector_store = vector_store
+        self.batch_size = max(1, batch_size if batch_size is not None else Config.EMBED_BATCH_SIZE)
+        self.queue_size = max(1, queue_size if queue_size is not None else Config.INGEST_QUEUE_SIZE)
+        self.save_every = max(1, save_every if save_every is not None else Config.INGEST_SAVE_EVERY_BATCHES)
+
+    @staticmethod
+    def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+        """Block until there is room in the queue; False if the pipeline was stopped"""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(source: queue.Queue, stop: threading.Event):
+        """Block until an item arrives; _DONE if the pipeline was stopped"""
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    @profiled('ingestion')
+    def _produce(self, pages, doc_id, filename, skip_chunks, batches, stop, errors):
+        """Stage 1: extract and chunk pages, grouping chunks into embedding batches"""
+        try:
+            batch = []
+            chunks = self.processor.iter_chunks(pages, doc_id, filename)
+            for chunk in itertools.islice(chunks, skip_chunks, None):
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    if not self._put(batches, batch, stop):
+                        return
+                    batch = []
+            if batch and not self._put(batches, batch, stop):
+                return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            self._put(batches, _DONE, stop)
+
+    @profiled('ingestion')
+    def _embed(self, batches, embedded, stop, errors):
+        """Stage 2: embed each batch of chunk texts"""
+        try:
+            while True:
+                batch = self._get(batches, stop)
+                if batch is _DONE:
+                    return
+                vectors = self.vector_store.generate_embeddings([chunk['text'] for chunk in batch])
+                if not self._put(embedded, (batch, vectors), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            self._put(embedded, _DONE, stop)
+
+    def run(self, file_path: str, doc_id: int, filename: str, skip_chunks: int = 0,
+            on_progress: Optional[Callable[[int, int], None]] = None,
+            file_hash: Optional[str] = None) -> Dict:
+        """
+        Ingest a document, leaving out its first skip_chunks chunks
+
+        The chunker carries headings, overlap and unfinished paragraphs from page
+        to page, so a partly indexed document is re-chunked from the start and
+        the chunks already in the index are skipped rather than embedded again.
+
+        on_progress(chunks_written, last_page) is called after every flush to disk,
+        where chunks_written counts chunks after the skipped ones.
+
+        Returns:
+            Dict with 'chunks' (written by this run) and 'last_page' (last page
+            reached by a written chunk, 0 if none)
+        """
+        batches = queue.Queue(maxsize=self.queue_size)
+        embedded = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+
+        pages = self.processor.iter_pages(file_path, file_hash=file_hash)
+        # Each stage runs in a copy of this context so request timings see it
+        workers = [
+            threading.Thread(target=contextvars.copy_context().run, name=f"ingest-chunk-{doc_id}", daemon=True,
+                             args=(self._produce, pages, doc_id, filename, skip_chunks, batches, stop, errors)),
+            threading.Thread(target=contextvars.copy_context().run, name=f"ingest-embed-{doc_id}", daemon=True,
+                             args=(self._embed, batches, embedded, stop, errors)),
+        ]
+        for worker in workers:
+            worker.start()
+
+        # Stage 3 (this thread): append to the index and flush periodically
+        written = 0
+        last_page = 0
+        unsaved_batches = 0
+
+        def flush():
+            self.vector_store.save()
+            if on_progress:
+                on_progress(written, last_page)
+
+        try:
+            while True:
+                item = self._get(embedded, stop)
+                if item is _DONE:
+                    break
+                batch, vectors = item
+                self.vector_store.append_embeddings(batch, vectors)
+                written += len(batch)
+                last_page = max(last_page, batch[-1]['metadata'].get('page_end', batch[-1]['metadata']['page_number']))
+                unsaved_batches += 1
+                if unsaved_batches >= self.save_every:
+                    flush()
+                    unsaved_batches = 0
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            # Chunks appended before a failure are kept; they form the resume point
+            if unsaved_batches:
+                flush()
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        if errors:
+            raise errors[0]
+        return {'chunks': written, 'last_page': last_page}
+
+@profiled('ingestion')
+def ingest_document(processor, vector_store, user_id: int, doc_id: int, file_path: str, filename: str,
+                    skip_chunks: int = 0, file_hash: Optional[str] = None) -> Dict:
+    """
+    Stream a stored document into the vector store, checkpointing progress on the document row
+
+    skip_chunks is the number of the document's chunks already in the index (see resume_document).
+    With vector_store None the user's active index is opened here, under the lock.
+    The document ends up 'ready', or 'failed' (with its checkpoint intact) if ingestion raised.
+
+    Returns:
+        Dict with 'chunks' (total for the document) and 'last_page'
+    """
+    # Uploads, deletions and reconciliation for this user take turns on the index,
+    # and an index rebuild swaps in its new version before or after this document
+    with index_lock(user_id):
+        vector_store = VectorStore(user_id) if vector_store is None else _current_store(vector_store)
+
+        def checkpoint(chunks_written: int, last_page: int):
+            Document.set_chunk_count(doc_id, user_id, skip_chunks + chunks_written,
+                                     vector_store.model_name, last_page=last_page)
+
+        pipeline = IngestionPipeline(processor, vector_store)
+        try:
+            result = pipeline.run(file_path, doc_id, filename, skip_chunks=skip_chunks,
+                                  on_progress=checkpoint, file_hash=file_hash)
+        except Exception:
+            Document.set_status(doc_id, user_id, 'failed')
+            raise
+        Document.set_status(doc_id, user_id, 'ready')
+        return {'chunks': skip_chunks + result['chunks'], 'last_page': result['last_page']}
+
+def _current_store(vector_store):
+    """
+    The user's active index as last saved (call holding index_lock)
+
+    The given store is reloaded, or replaced if a rebuilt version was swapped in since it was opened.
+    """
+    if not vector_store.is_active():
+        return VectorStore(vector_store.user_id)
+    vector_store.reload()
+    return vector_store
+
+def resume_document(processor, vector_store, document) -> Dict:
+    """
+    Continue ingesting a document from its last checkpoint
+
+    Chunks flushed to the index after the checkpoint was recorded are dropped
+    first; the document is then re-chunked from the start (from the text cache,
+    where possible) and embedding picks up after the checkpointed chunk count,
+    so the result matches an uninterrupted ingestion.
+
+    Returns:
+        Dict with 'chunks' (total for the document) and 'last_page'
+    """
+    with index_lock(document['user_id']):
+        vector_store = _current_store(vector_store)
+        chunk_count = document['chunk_count'] or 0
+        if vector_store.count_document_chunks(document['id']) < chunk_count:
+            # The checkpoint belongs to an index version that has since been replaced: start over
+            chunk_count = 0
+        vector_store.truncate_document(document['id'], chunk_count)
+        return ingest_document(
+            processor, vector_store, document['user_id'], document['id'],
+            document['file_path'], document['original_filename'],
+            skip_chunks=chunk_count,
+            file_hash=document['file_hash']
+        )
+
+def reconcile_ingestion() -> Dict:
+    """
+    Repair ingestion state left behind by a crash or restart
+
+    Indexes whose metadata save was interrupted are realigned, documents
+    still marked 'processing' are resumed from their checkpoint, rows whose
+    file is gone are deleted along with their chunks, and uploaded files that
+    no row refers to are removed. Runs alongside the API, taking each user's
+    index_lock for every index change like uploads and deletions do.
+
+    Returns:
+        Dict with 'repaired', 'resumed', 'failed', 'purged_rows' and 'purged_files' counts
+    """
+    from utils.document_processor import DocumentProcessor
+
+    started = time.time()
+    summary = {'repaired': 0, 'resumed': 0, 'failed': 0, 'purged_rows': 0, 'purged_files': 0}
+    processor = None
+
+    if os.path.isdir(Config.VECTOR_STORE_PATH):
+        for user_dir in os.listdir(Config.VECTOR_STORE_PATH):
+            user_id = user_dir[len('user_'):]
+            if not user_dir.startswith('user_') or not user_id.isdigit():
+                continue
+            try:
+                with index_lock(int(user_id)):
+                    if VectorStore(int(user_id)).repair():
+                        logger.warning("Repaired index after an interrupted save", extra={'user_id': int(user_id)})
+                        summary['repaired'] += 1
+            except Exception:
+                logger.exception("Could not check index", extra={'user_id': int(user_id)})
+
+    documents = Document.get_all()
+    known_files = {os.path.abspath(document['file_path']) for document in documents}
+
+    for document in documents:
+        if not os.path.exists(document['file_path']):
+            logger.warning("Purging document whose file is missing", extra={'doc_id': document['id']})
+            with index_lock(document['user_id']):
+                VectorStore(document['user_id']).delete_document(document['id'])
+            Document.delete(document['id'], document['user_id'])
+            summary['purged_rows'] += 1
+            continue
+        if document['status'] != 'processing':
+            continue
+        logger.info("Resuming interrupted ingestion", extra={
+            'doc_id': document['id'],
+            'page': document['last_page_indexed'],
+            'chunk': document['chunk_count']
+        })
+        try:
+            processor = processor or DocumentProcessor()
+            result = resume_document(processor, VectorStore(document['user_id']), document)
+            logger.info("Resumed document ready", extra={'doc_id': document['id'], 'chunks': result['chunks']})
+            summary['resumed'] += 1
+        except Exception:
+            logger.exception("Resumed ingestion failed", extra={'doc_id': document['id']})
+            summary['failed'] += 1
+
+    # Files written before their row was created; skip anything saved since we started
+    if os.path.isdir(Config.UPLOAD_FOLDER):
+        for user_dir in os.listdir(Config.UPLOAD_FOLDER):
+            user_path = os.path.join(Config.UPLOAD_FOLDER, user_dir)
+            if not user_dir.startswith('user_') or not os.path.isdir(user_path):
+                continue
+            for name in os.listdir(user_path):
+                path = os.path.abspath(os.path.join(user_path, name))
+                if path in known_files or not os.path.isfile(path) or os.path.getmtime(path) >= started:
+                    continue
+                logger.info("Removing orphaned upload", extra={'path': path})
+                os.remove(path)
+                summary['purged_files'] += 1
+
+    logger.info("Ingestion reconciliation complete", extra=summary)
+    return summary
@@ -0,0 +1,204 @@
+"""
+Structured logging
+
+Records are formatted as one JSON object per line and written by a
+background thread: request handlers only put records on a bounded queue,
+so a slow stdout never stalls them. Every record carries the id of the
+request it was logged under, and high-volume loggers can be sampled per
+request so a kept request keeps all of its lines.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, Optional
+from config import Config
+
+ROOT_LOGGER = 'docintel'
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+_listener = None
+_listener_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else was passed via extra= and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+# Caller-supplied request ids end up in log lines and profile summaries, so only plain tokens are accepted
+_REQUEST_ID = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+def get_logger(name: str) -> logging.Logger:
+    """Get a logger under the application root (e.g. get_logger('upload') -> 'docintel.upload')"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+def get_request_id() -> Optional[str]:
+    """Id of the request being handled, if any"""
+    return _request_id.get()
+
+def is_valid_request_id(value: str) -> bool:
+    """Whether a caller-supplied request id is a short token of letters, digits, '.', '_' and '-' (no '..')"""
+    return bool(value) and _REQUEST_ID.fullmatch(value) is not None and '..' not in value
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """Parse 'a=1,b=2' settings"""
+    pairs = {}
+    for item in value.split(','):
+        if '=' in item:
+            key, _, setting = item.partition('=')
+            pairs[key.strip()] = setting.strip()
+    return pairs
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request id and apply per-logger sampling"""
+
+    def __init__(self, sample_rates: Dict[str, float] = None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+
+    def _sample_rate(self, logger_name: str) -> float:
+        """Rate of the most specific configured logger prefix"""
+        name = logger_name[len(ROOT_LOGGER) + 1:] if logger_name.startswith(ROOT_LOGGER + '.') else logger_name
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs on the calling thread, so the request id is still in context here
+        record.request_id = _request_id.get()
+        if record.levelno >= logging.WARNING:
+            return True  # problems are never sampled away
+        rate = self._sample_rate(record.name)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        # Decide per request, not per line, so sampled requests are complete
+        key = record.request_id or f"{record.thread}:{record.created}"
+        return zlib.crc32(key.encode('utf-8')) % 10000 < rate * 10000
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking or raising when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback on the calling thread, but leave the
+        # final formatting (JSON or text) to the writer thread
+        prepared = copy.copy(record)
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        if record.exc_info:
+            prepared.exc_text = logging.Formatter().formatException(record.exc_info)
+            prepared.exc_info = None
+        return prepared
+
+def setup_logging():
+    """Configure the application loggers once per process (safe to call repeatedly)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if Config.LOG_FORMAT == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        queue_handler.addFilter(RequestContextFilter(
+            {name: float(rate) for name, rate in _parse_pairs(Config.LOG_SAMPLE_RATES).items()}
+        ))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [queue_handler]
+        root.setLevel(Config.LOG_LEVEL.upper())
+        root.propagate = False
+        for name, level in _parse_pairs(Config.LOG_LEVELS).items():
+            get_logger(name).setLevel(level.upper())
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread (call on shutdown)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+_access_log = get_logger('access')
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning each request an id (X-Request-ID) and writing an access log line"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get('headers', [])).get(b'x-request-id', b'').decode('latin-1').strip()
+        # Accept a caller's id for cross-service correlation, or assign a fresh one
+        request_id = incoming if is_valid_request_id(incoming) else uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        started = time.perf_counter()
+        status_code = [500]
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                status_code[0] = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'x-request-id', request_id.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _access_log.info("request", extra={
+                'method': scope.get('method'),
+                'path': scope.get('path'),
+                'status': status_code[0],
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            })
+            _request_id.reset(token)
@@ -0,0 +1,184 @@
+"""
+Lightweight latency instrumentation
+
+Stages (vector search, embedding, LLM calls, DB methods, ...) are timed with
+`timed()` or `@instrument()`. Each sample goes into a process-wide histogram
+exported in Prometheus text format, and is also added to the current
+request's timings so they can be returned as a Server-Timing header.
+
+Stages nest: a stage records only its own time, excluding any stage timed
+inside it, so vector_search does not double count the query embedding.
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from config import Config
+
+# Upper bounds in seconds; spans sub-millisecond SQLite calls to slow LLM answers
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage -> accumulated milliseconds for the request being handled (None outside requests)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    'request_timings', default=None
+)
+_active = threading.local()  # per-thread stack of running timers, for exclusive time
+_request_lock = threading.Lock()  # batch queries add to one request's timings from several threads
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        """Record one sample"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition of every series"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return '\n'.join(lines)
+
+def _escape(value) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+stage_duration = Histogram(
+    'docintel_stage_duration_seconds',
+    'Time spent in each processing stage, excluding nested stages',
+    ('stage', 'operation')
+)
+request_duration = Histogram(
+    'docintel_http_request_duration_seconds',
+    'HTTP request latency by route',
+    ('method', 'route', 'status')
+)
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text format"""
+    return stage_duration.render() + '\n' + request_duration.render() + '\n'
+
+@contextmanager
+def timed(stage: str, operation: str = ''):
+    """Time a block as one sample of a stage"""
+    stack = getattr(_active, 'stack', None)
+    if stack is None:
+        stack = _active.stack = []
+    frame = [0.0]  # time spent in nested stages
+    stack.append(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+        own = max(0.0, elapsed - frame[0])
+        stage_duration.observe(own, stage, operation)
+        timings = _request_timings.get()
+        if timings is not None:
+            with _request_lock:
+                timings[stage] = timings.get(stage, 0.0) + own * 1000
+
+def instrument(stage: str, operation: str = None):
+    """Decorator form of timed(); operation defaults to the function's qualified name"""
+    def decorator(func):
+        name = operation if operation is not None else func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_methods(cls, stage: str):
+    """Time every public static method of a model class"""
+    for name, attribute in list(vars(cls).items()):
+        if isinstance(attribute, staticmethod) and not name.startswith('_'):
+            setattr(cls, name, staticmethod(instrument(stage, f"{cls.__name__}.{name}")(attribute.__func__)))
+    return cls
+
+def timed_iter(stage: str, iterable: Iterable, operation: str = '') -> Iterator:
+    """Time each step of a lazy iterator (e.g. a generator pipeline stage)"""
+    iterator = iter(iterable)
+    while True:
+        with timed(stage, operation):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+class TimingMiddleware:
+    """ASGI middleware recording request latency and adding Server-Timing headers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status_code = [500]
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                status_code[0] = message['status']
+                if Config.TIMING_HEADERS_ENABLED:
+                    total_ms = (time.perf_counter() - started) * 1000
+                    entries = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+                    entries.append(f"total;dur={total_ms:.1f}")
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', ', '.join(entries).encode('latin-1')))
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            request_duration.observe(time.perf_counter() - started, scope.get('method', ''),
+                                     _route_template(scope), status_code[0])
+
+def _route_template(scope) -> str:
+    """Request path with path parameters put back as {name}, so /documents/1 and /documents/2 share a series"""
+    if 'endpoint' not in scope:
+        return 'unmatched'
+    names = {str(value): name for name, value in scope.get('path_params', {}).items()}
+    return '/'.join(f"{{{names[segment]}}}" if segment in names else segment
+                    for segment in scope['path'].split('/'))
@@ -0,0 +1,117 @@
+"""
+Password hashing service
+
+bcrypt is deliberately slow, so hashing and verification run in a small
+process pool instead of on the event loop. Concurrent work is capped
+globally, per client IP and per email so a login burst cannot starve
+the rest of the API.
+"""
+import asyncio
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+import bcrypt
+from config import Config
+
+class PasswordHashingBusyError(Exception):
+    """Raised when a hashing request exceeds the configured concurrency limits"""
+
+def _hash_password(password: str, rounds: int) -> str:
+    """Hash a password (runs in a worker process)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+def _check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a hash (runs in a worker process)"""
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+class PasswordHasher:
+    """Run bcrypt in a bounded process pool with per-client concurrency limits"""
+
+    def __init__(self, rounds: int = None, workers: int = None):
+        self.rounds = rounds if rounds is not None else Config.BCRYPT_ROUNDS
+        self.workers = max(1, workers if workers is not None else Config.PASSWORD_HASH_WORKERS)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self._per_ip = defaultdict(int)
+        self._per_email = defaultdict(int)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # Forking now would copy a process already running warmup, DB and ingestion
+                    # threads (and any locks they hold), so start clean interpreters instead
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    @contextmanager
+    def _slot(self, client_ip: Optional[str], email: Optional[str]):
+        """Reserve a hashing slot, refusing when any limit is reached"""
+        # Only touched from the event loop thread, so plain counters are safe
+        if self._pending >= Config.PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHashingBusyError("Too many authentication requests, please retry shortly")
+        if client_ip and self._per_ip[client_ip] >= Config.PASSWORD_HASH_MAX_PER_IP:
+            raise PasswordHashingBusyError("Too many concurrent authentication attempts from this address")
+        if email and self._per_email[email] >= Config.PASSWORD_HASH_MAX_PER_EMAIL:
+            raise PasswordHashingBusyError("Too many concurrent authentication attempts for this account")
+
+        self._pending += 1
+        if client_ip:
+            self._per_ip[client_ip] += 1
+        if email:
+            self._per_email[email] += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+            if client_ip:
+                self._release(self._per_ip, client_ip)
+            if email:
+                self._release(self._per_email, email)
+
+    @staticmethod
+    def _release(counters: dict, key: str):
+        """Decrement a counter, dropping it at zero so the dict stays small"""
+        counters[key] -= 1
+        if counters[key] <= 0:
+            del counters[key]
+
+    async def _run(self, func, *args):
+        """Run a bcrypt call in the process pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def hash(self, password: str, client_ip: str = None, email: str = None) -> str:
+        """Hash a password at the configured cost"""
+        with self._slot(client_ip, email):
+            return await self._run(_hash_password, password, self.rounds)
+
+    async def verify(self, password: str, password_hash: str, client_ip: str = None, email: str = None) -> bool:
+        """Verify a password against a stored hash"""
+        with self._slot(client_ip, email):
+            return await self._run(_check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Check whether a stored hash was made at a different cost than configured"""
+        try:
+            # bcrypt hashes look like $2b$12$<salt+digest>
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,163 @@
+"""
+PDF text extraction backends
+
+PyPDF2 is always available but its pure-Python extract_text is the slowest
+stage of ingestion. pypdfium2 (PDFium bindings) is much faster and pdfminer.six
+gives careful layout analysis; either is used when installed and selected
+by Config.PDF_BACKEND. PdfExtractor falls back to PyPDF2 for any page the
+chosen backend fails on.
+"""
+import importlib.util
+import io
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+from config import Config
+from utils.logger import get_logger
+
+logger = get_logger('extract')
+
+class PdfBackend:
+    """Base class: page count and per-page text for one PDF library"""
+
+    name = None
+    module = None  # importable module the backend needs
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError
+
+    def iter_pages(self, file_path: str, start: int = 1) -> Iterator[Tuple[int, Optional[str]]]:
+        """Yield (page_number, text) from start on; text is None for a page this backend could not read"""
+        raise NotImplementedError
+
+class PyPDF2Backend(PdfBackend):
+    """Pure Python, always installed; the fallback for every other backend"""
+
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def page_count(self, file_path: str) -> int:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(file_path).pages)
+
+    def iter_pages(self, file_path: str, start: int = 1) -> Iterator[Tuple[int, Optional[str]]]:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(file_path)
+        for page_num in range(max(1, start), len(reader.pages) + 1):
+            yield page_num, reader.pages[page_num - 1].extract_text()
+
+    @staticmethod
+    def page_text(reader, page_num: int) -> str:
+        """Text of one page of an open PdfReader"""
+        return reader.pages[page_num - 1].extract_text()
+
+# PDFium is not thread-safe, and uploads are ingested on several threads at once
+_pdfium_lock = threading.Lock()
+
+class Pypdfium2Backend(PdfBackend):
+    """PDFium via pypdfium2: native code, typically several times faster than PyPDF2"""
+
+    name = 'pypdfium2'
+    module = 'pypdfium2'
+
+    def page_count(self, file_path: str) -> int:
+        import pypdfium2 as pdfium
+        with _pdfium_lock:
+            document = pdfium.PdfDocument(file_path)
+            try:
+                return len(document)
+            finally:
+                document.close()
+
+    def iter_pages(self, file_path: str, start: int = 1) -> Iterator[Tuple[int, Optional[str]]]:
+        import pypdfium2 as pdfium
+        with _pdfium_lock:
+            document = pdfium.PdfDocument(file_path)
+            page_count = len(document)
+        try:
+            for page_num in range(max(1, start), page_count + 1):
+                try:
+                    # Hold the lock per page only, so concurrent uploads interleave
+                    with _pdfium_lock:
+                        page = document[page_num - 1]
+                        text_page = page.get_textpage()
+                        text = text_page.get_text_range()
+                        text_page.close()
+                        page.close()
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+                except Exception as e:
+                    logger.warning("pypdfium2 could not read page", extra={'page': page_num, 'error': str(e)})
+                    text = None
+                yield page_num, text
+        finally:
+            with _pdfium_lock:
+                document.close()
+
+class PdfminerBackend(PdfBackend):
+    """pdfminer.six: pure Python layout analysis; slower, but better reading order on complex layouts"""
+
+    name = 'pdfminer'
+    module = 'pdfminer'
+
+    def page_count(self, file_path: str) -> int:
+        from pdfminer.pdfpage import PDFPage
+        with open(file_path, 'rb') as f:
+            return sum(1 for _ in PDFPage.get_pages(f))
+
+    def iter_pages(self, file_path: str, start: int = 1) -> Iterator[Tuple[int, Optional[str]]]:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        resources = PDFResourceManager(caching=True)
+        with open(file_path, 'rb') as f:
+            for page_num, page in enumerate(PDFPage.get_pages(f), start=1):
+                if page_num < start:
+                    continue
+                output = io.StringIO()
+                try:
+                    device = TextConverter(resources, output, laparams=LAParams())
+                    PDFPageInterpreter(resources, device).process_page(page)
+                    device.close()
+                    text = output.getvalue().replace('\x0c', '')
+                except Exception as e:
+                    logger.warning("pdfminer could not read page", extra={'page': page_num, 'error': str(e)})
+                    text = None
+                yield page_num, text
+
+PDF_BACKENDS: Dict[str, PdfBackend] = {}
+FALLBACK_BACKEND = PyPDF2Backend()
+
+def register_pdf_backend(backend: PdfBackend):
+    """Make a backend selectable by name in Config.PDF_BACKEND"""
+    PDF_BACKENDS[backend.name] = backend
+
+for _backend in (Pypdfium2Backend(), PdfminerBackend(), FALLBACK_BACKEND):
+    register_pdf_backend(_backend)
+
+_selected = {}  # configured name -> resolved backend
+
+def get_pdf_backend(name: str = None) -> PdfBackend:
+    """
+    Resolve a backend name ('auto' picks pypdfium2 when installed)
+
+    Unknown or uninstalled backends fall back to PyPDF2 with a warning.
+    """
+    name = (name or Config.PDF_BACKEND).lower()
+    backend = _selected.get(name)
+    if backend is None:
+        if name == 'auto':
+            candidates = [PDF_BACKENDS['pypdfium2'], FALLBACK_BACKEND]
+        elif name in PDF_BACKENDS:
+            candidates = [PDF_BACKENDS[name], FALLBACK_BACKEND]
+        else:
+            logger.warning("Unknown PDF backend, using PyPDF2", extra={'backend': name})
+            candidates = [FALLBACK_BACKEND]
+        backend = next(candidate for candidate in candidates if candidate.is_available())
+        if name not in ('auto', backend.name):
+            logger.warning("PDF backend not installed, using PyPDF2", extra={'backend': name})
+        _selected[name] = backend
+    return backend
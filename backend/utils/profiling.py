@@ -0,0 +1,297 @@
+"""
+Opt-in request profiling
+
+A request is profiled when it carries "X-Profile: <PROFILING_TOKEN>", when
+it is made by a user listed in PROFILE_USER_IDS, or by random sampling
+(PROFILE_SAMPLE_RATE). For such requests the retrieval and ingestion paths
+run under cProfile, on every thread that works on them, and the merged
+statistics are stored in PROFILE_DIR under a server-generated profile id; the
+summary records the request id (the X-Request-ID response header) so it can
+be looked up by either. Requests that are not profiled pay only a context lookup.
+
+Aggregate the hottest functions across stored profiles (from backend/):
+    python -m utils.profiling top --path retrieval
+    python -m utils.profiling top --path ingestion --user 7 --sort cumtime
+    python -m utils.profiling show <request_id>
+"""
+import argparse
+import asyncio
+import contextvars
+import cProfile
+import glob
+import hmac
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import Config
+from utils.logger import get_logger, get_request_id
+
+logger = get_logger('profiling')
+
+PATHS = ('retrieval', 'ingestion')
+
+_request_profile: contextvars.ContextVar[Optional['RequestProfile']] = contextvars.ContextVar(
+    'request_profile', default=None
+)
+_thread_state = threading.local()  # a thread runs at most one profiler at a time
+_profile_user_ids = None
+
+class RequestProfile:
+    """Profiling state of one request, shared by every thread working on it"""
+
+    def __init__(self, reason: Optional[str] = None):
+        self.reason = reason  # 'header', 'sample' or 'user'; None while not profiled
+        self.user_id = None
+        self.stats: Dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    def add(self, path: str, profiler: cProfile.Profile):
+        """Merge one thread's profile into the request's statistics for path"""
+        with self._lock:
+            if path in self.stats:
+                self.stats[path].add(profiler)
+            else:
+                self.stats[path] = pstats.Stats(profiler)
+
+def _user_ids():
+    global _profile_user_ids
+    if _profile_user_ids is None:
+        _profile_user_ids = {int(user_id) for user_id in Config.PROFILE_USER_IDS.split(',') if user_id.strip()}
+    return _profile_user_ids
+
+def note_user(user_id: int):
+    """Record the authenticated user, switching profiling on if the user is listed in PROFILE_USER_IDS"""
+    profile = _request_profile.get()
+    if profile is None:
+        return
+    profile.user_id = user_id
+    if profile.reason is None and user_id in _user_ids():
+        profile.reason = 'user'
+
+@contextmanager
+def profiled(path: str):
+    """
+    Run the enclosed code under cProfile if the current request is being profiled
+
+    Also usable as a decorator. Nested uses on the same thread are folded into
+    the outermost one.
+    """
+    profile = _request_profile.get()
+    if profile is None or profile.reason is None or getattr(_thread_state, 'active', False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler owns this interpreter (Python 3.12+ allows only one at a time)
+        yield
+        return
+    _thread_state.active = True
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _thread_state.active = False
+        profile.add(path, profiler)
+
+def _profile_reason(scope) -> Optional[str]:
+    """Why this request should be profiled, before the user is known"""
+    if Config.PROFILING_TOKEN:
+        value = dict(scope.get('headers', [])).get(b'x-profile', b'').decode('latin-1').strip()
+        if value and hmac.compare_digest(value, Config.PROFILING_TOKEN):
+            return 'header'
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+def _profile_file(directory: str, name: str) -> str:
+    """Path of a file in the profile directory, refusing names that would resolve outside it"""
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"Profile file name escapes {directory}: {name!r}")
+    return path
+
+def _remove_profile(directory: str, profile_id: str):
+    """Delete a stored profile's summary and .prof files"""
+    for name in [f"{profile_id}.json"] + [f"{profile_id}.{path}.prof" for path in PATHS]:
+        path = _profile_file(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def save_profile(request_id: str, profile: RequestProfile, meta: Dict) -> str:
+    """
+    Write one .prof file per path plus a JSON summary, then prune the oldest requests
+
+    Files are named by a fresh profile id; the (caller-influenced) request id
+    is only stored inside the summary.
+
+    Returns:
+        The profile id
+    """
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    for path, stats in profile.stats.items():
+        stats.dump_stats(_profile_file(Config.PROFILE_DIR, f"{profile_id}.{path}.prof"))
+    meta = {
+        **meta,
+        'profile_id': profile_id,
+        'request_id': request_id,
+        'reason': profile.reason,
+        'user_id': profile.user_id,
+        'paths': {path: round(stats.total_tt * 1000, 1) for path, stats in profile.stats.items()},
+    }
+    with open(_profile_file(Config.PROFILE_DIR, f"{profile_id}.json"), 'w') as f:
+        json.dump(meta, f)
+
+    summaries = sorted(glob.glob(os.path.join(glob.escape(Config.PROFILE_DIR), '*.json')), key=os.path.getmtime)
+    for summary in summaries[:max(0, len(summaries) - Config.PROFILE_MAX_REQUESTS)]:
+        _remove_profile(Config.PROFILE_DIR, os.path.basename(summary)[:-len('.json')])
+    return profile_id
+
+class ProfilingMiddleware:
+    """ASGI middleware deciding which requests are profiled and storing their profiles"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(_profile_reason(scope))
+        token = _request_profile.set(profile)
+        started = time.perf_counter()
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status_code[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_profile.reset(token)
+            if profile.stats:
+                meta = {
+                    'method': scope.get('method'),
+                    'path': scope.get('path'),
+                    'status': status_code[0],
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                    'created': time.time(),
+                }
+                request_id = get_request_id()
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, save_profile, request_id, profile, meta)
+                    logger.info("Stored request profile", extra={'paths': sorted(profile.stats)})
+                except Exception:
+                    logger.exception("Could not store request profile")
+
+def _load_summaries(directory: str) -> List[Dict]:
+    summaries = []
+    for path in glob.glob(os.path.join(glob.escape(directory), '*.json')):
+        with open(path) as f:
+            summary = json.load(f)
+        summary.setdefault('profile_id', os.path.basename(path)[:-len('.json')])
+        summaries.append(summary)
+    return sorted(summaries, key=lambda summary: summary.get('created', 0))
+
+def _function_label(key) -> str:
+    filename, line, name = key
+    if filename == '~':
+        return name  # built-in
+    return f"{'/'.join(filename.split(os.sep)[-2:])}:{line}({name})"
+
+def aggregate(files: List[str]) -> Dict:
+    """
+    Combine profiles function by function
+
+    Returns:
+        Dict of function label -> calls, tottime and cumtime (seconds) summed
+        over the profiles, and 'requests', the number of profiles it appears in
+    """
+    functions = {}
+    for path in files:
+        for key, (_, calls, tottime, cumtime, _) in pstats.Stats(path).stats.items():
+            entry = functions.setdefault(_function_label(key), {'calls': 0, 'tottime': 0.0, 'cumtime': 0.0, 'requests': 0})
+            entry['calls'] += calls
+            entry['tottime'] += tottime
+            entry['cumtime'] += cumtime
+            entry['requests'] += 1
+    return functions
+
+def print_top(functions: Dict, profiles: int, sort: str, limit: int):
+    total = sum(entry['tottime'] for entry in functions.values()) or 1.0
+    print(f"{'tottime':>9} {'%':>6} {'cumtime':>9} {'per req':>9} {'calls':>9} {'reqs':>5}  function")
+    ranked = sorted(functions.items(), key=lambda item: item[1][sort], reverse=True)
+    for label, entry in ranked[:limit]:
+        print(f"{entry['tottime']:>8.3f}s {entry['tottime'] / total:>6.1%} {entry['cumtime']:>8.3f}s "
+              f"{entry['tottime'] / profiles * 1000:>7.1f}ms {entry['calls']:>9} {entry['requests']:>5}  {label}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate stored request profiles")
+    parser.add_argument('--dir', default=Config.PROFILE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    top = commands.add_parser('top', help="Hottest functions across stored profiles")
+    top.add_argument('--path', choices=PATHS, default='retrieval')
+    top.add_argument('--user', type=int, help="Only requests made by this user")
+    top.add_argument('--since', type=float, help="Only requests from the last N hours")
+    top.add_argument('--sort', choices=('tottime', 'cumtime', 'calls'), default='tottime')
+    top.add_argument('--limit', type=int, default=25)
+
+    show = commands.add_parser('show', help="One request's profile")
+    show.add_argument('request_id', help="Request id (X-Request-ID) or profile id")
+    show.add_argument('--path', choices=PATHS)
+    show.add_argument('--sort', choices=('tottime', 'cumtime', 'calls'), default='cumtime')
+    show.add_argument('--limit', type=int, default=40)
+
+    commands.add_parser('list', help="Stored profiles, oldest first")
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for summary in _load_summaries(args.dir):
+            paths = ', '.join(f"{path} {ms}ms" for path, ms in summary['paths'].items())
+            print(f"{summary['profile_id']}  request={summary['request_id']}  {summary['method']} {summary['path']} {summary['status']} "
+                  f"{summary['duration_ms']}ms user={summary['user_id']} ({summary['reason']}): {paths}")
+        return
+
+    if args.command == 'show':
+        paths = [args.path] if args.path else PATHS
+        matches = [summary['profile_id'] for summary in _load_summaries(args.dir)
+                   if args.request_id in (summary['profile_id'], summary['request_id'])]
+        files = [_profile_file(args.dir, f"{profile_id}.{path}.prof") for profile_id in matches for path in paths]
+        files = [path for path in files if os.path.exists(path)]
+        if not files:
+            parser.error(f"No profile stored for request {args.request_id}")
+        for path in files:
+            print(f"== {os.path.basename(path)}")
+            pstats.Stats(path).sort_stats(args.sort).print_stats(args.limit)
+        return
+
+    cutoff = time.time() - args.since * 3600 if args.since else 0
+    files = []
+    for summary in _load_summaries(args.dir):
+        if args.path not in summary['paths'] or summary.get('created', 0) < cutoff:
+            continue
+        if args.user is not None and summary.get('user_id') != args.user:
+            continue
+        files.append(_profile_file(args.dir, f"{summary['profile_id']}.{args.path}.prof"))
+    files = [path for path in files if os.path.exists(path)]
+    if not files:
+        print(f"No stored {args.path} profiles match")
+        return
+    print(f"{len(files)} {args.path} profiles")
+    print_top(aggregate(files), len(files), args.sort, args.limit)
+
+if __name__ == '__main__':
+    main()
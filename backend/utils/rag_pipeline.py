@@ -1,12 +1,43 @@
 """
 RAG (Retrieval-Augmented Generation) pipeline
 """
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
-from openai import OpenAI
-from groq import Groq
+import numpy as np
 from config import Config
 from utils.vector_store import VectorStore
 from database import ChatHistory
+from utils.conversation_cache import conversation_cache
+from utils.reranker import Reranker
+from utils.context_packer import ContextPacker, source_header
+from utils.metrics import timed
+from utils.profiling import profiled
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Shared Groq/OpenAI client, so HTTP connections are reused across requests"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                # The SDKs are imported here, not at module load, to keep API startup fast
+                if Config.AI_PROVIDER == 'groq':
+                    from groq import Groq as client_class
+                    api_key = Config.GROQ_API_KEY
+                else:
+                    from openai import OpenAI as client_class
+                    api_key = Config.OPENAI_API_KEY
+                if Config.LLM_BASE_URL:
+                    # Local stand-ins don't check keys, but the SDKs insist on one
+                    _llm_client = client_class(api_key=api_key or 'local-stub', base_url=Config.LLM_BASE_URL)
+                else:
+                    _llm_client = client_class(api_key=api_key)
+    return _llm_client
 
 class RAGPipeline:
     """Handle RAG query processing"""
@@ -16,15 +47,13 @@ class RAGPipeline:
         self.session_id = session_id
         self.ai_provider = Config.AI_PROVIDER
         
-        # Initialize appropriate client
-        if self.ai_provider == 'groq':
-            self.client = Groq(api_key=Config.GROQ_API_KEY)
-        else:
-            self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client = get_llm_client()
         
         self.vector_store = VectorStore(user_id)
         self.llm_model = Config.LLM_MODEL
         self.temperature = Config.TEMPERATURE
+        self._history = []  # Session turns fetched during retrieval
+        self.timings = {}  # Per-stage latency of the last query, in milliseconds
     
     def _is_greeting(self, query: str) -> bool:
         """Check if the query is a greeting or casual conversation"""
@@ -41,22 +70,117 @@ class RAGPipeline:
         if not self.session_id:
             return []
         try:
-            history = ChatHistory.get_by_session(self.user_id, self.session_id, limit=limit)
+            history = ChatHistory.get_recent_by_session(self.user_id, self.session_id, limit=limit)
             return history
         except:
             return []
     
+    def _build_query_vector(self, question: str, history: List[Dict], state: Optional[Dict]) -> tuple:
+        """
+        Embed the question blended with recent session questions
+        
+        Follow-ups like "what about page 5?" carry little meaning alone, so the
+        previous questions are added with decaying weights. Their embeddings come
+        from the session cache; only cache misses are embedded (in one batch).
+        
+        Returns:
+            Tuple of (query_vector, question_vectors) where question_vectors is the
+            question -> embedding dict to keep in the session cache
+        """
+        cached_vectors = dict(state['question_vectors']) if state else {}
+        previous = [turn['question'] for turn in history]
+        to_embed = [question] + [q for q in previous if q not in cached_vectors]
+        embedded = self.vector_store.generate_embeddings(list(dict.fromkeys(to_embed)))
+        fresh = dict(zip(dict.fromkeys(to_embed), embedded))
+        cached_vectors.update(fresh)
+        
+        question_vector = fresh[question]
+        query_vector = question_vector.copy()
+        weight = Config.CONVERSATION_HISTORY_WEIGHT
+        for previous_question in reversed(previous):
+            query_vector += weight * cached_vectors[previous_question]
+            weight /= 2
+        
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector = query_vector / norm * np.linalg.norm(question_vector)
+        
+        # Keep only the questions that can still appear in the history window
+        keep = set(previous[-(Config.CONVERSATION_HISTORY_TURNS - 1):] if Config.CONVERSATION_HISTORY_TURNS > 1 else [])
+        keep.add(question)
+        question_vectors = {q: v for q, v in cached_vectors.items() if q in keep}
+        return query_vector.astype('float32'), question_vectors
+    
+    def _retrieve(self, question: str, k: int = None, filters: Optional[Dict] = None) -> List[Dict]:
+        """Retrieve chunks for a question, using session history when available"""
+        if k is None:
+            k = Config.TOP_K_RETRIEVAL
+        if not self.session_id:
+            return self.vector_store.search(question, k=k, filters=filters)
+        
+        if self.vector_store.index.ntotal == 0:
+            return []
+        
+        history = self._get_conversation_history(limit=Config.CONVERSATION_HISTORY_TURNS)
+        state = conversation_cache.get(self.user_id, self.session_id)
+        revision = self.vector_store.revision
+        if state and state['revision'] != revision:
+            # The index was written since the last turn; warm chunk positions are stale
+            state = {'question_vectors': state['question_vectors']}
+        
+        query_vector, question_vectors = self._build_query_vector(question, history, state)
+        
+        previous_vector = state.get('query_vector') if state else None
+        warm_ids = [chunk['id'] for chunk in state.get('chunks', [])] if state else []
+        if filters and warm_ids:
+            allowed = set(self.vector_store.select_ids(filters).tolist())
+            warm_ids = [i for i in warm_ids if i in allowed]
+        similarity = 0.0
+        if previous_vector is not None and state.get('filters') == filters:
+            denominator = np.linalg.norm(previous_vector) * np.linalg.norm(query_vector)
+            if denominator > 0:
+                similarity = float(np.dot(previous_vector, query_vector) / denominator)
+        
+        if warm_ids and similarity >= Config.CONVERSATION_REUSE_THRESHOLD:
+            # Near-identical follow-up: rescore the last turn's chunks instead of searching
+            chunks = self.vector_store.score_ids(warm_ids, query_vector)
+        else:
+            chunks = self.vector_store.search_by_vector(query_vector, k=k, filters=filters)
+            # Earlier turns' chunks stay candidates so the conversation keeps its grounding
+            seen = {chunk['id'] for chunk in chunks}
+            chunks += self.vector_store.score_ids([i for i in warm_ids if i not in seen], query_vector)
+        
+        chunks.sort(key=lambda chunk: chunk['score'])
+        chunks = chunks[:k]
+        
+        conversation_cache.put(self.user_id, self.session_id, {
+            'question_vectors': question_vectors,
+            'query_vector': query_vector,
+            'chunks': chunks,
+            'revision': revision,
+            'filters': filters
+        })
+        self._history = history
+        return chunks
+    
+    def _history_messages(self) -> List[Dict]:
+        """Format the turns fetched during retrieval as chat messages"""
+        messages = []
+        for turn in self._history:
+            answer = turn['answer']
+            if len(answer) > Config.CONVERSATION_ANSWER_PREVIEW:
+                answer = answer[:Config.CONVERSATION_ANSWER_PREVIEW] + "..."
+            messages.append({"role": "user", "content": turn['question']})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+    
     def _build_prompt(self, query: str, context_chunks: List[Dict]) -> str:
         """Build prompt with strict instructions to prevent hallucination"""
         
         # Format context with sources
         context_parts = []
         for i, chunk in enumerate(context_chunks, 1):
-            metadata = chunk['metadata']
-            context_parts.append(
-                f"[Source {i}] Document: {metadata['filename']}, "
-                f"Page: {metadata['page_number']}\n{chunk['text']}\n"
-            )
+            context_parts.append(f"{source_header(i, chunk['metadata'])}{chunk['text']}\n")
         
         context = "\n".join(context_parts)
         
@@ -87,72 +211,189 @@ Provide a well-formatted, professional answer:"""
         
         return prompt
     
-    def query(self, question: str) -> Dict[str, any]:
+    GREETING_ANSWER = "Hello! 👋 I'm your document assistant. I can help you find information from your uploaded documents, answer questions, and provide summaries. What would you like to know?"
+    
+    def _no_results_answer(self, filters: Optional[Dict]) -> str:
+        """Explain why retrieval came back empty"""
+        if filters and self.vector_store.index.ntotal > 0:
+            return "None of your documents match the selected filters. Try widening the document or page selection."
+        return "No documents have been uploaded yet. Please upload documents to ask questions."
+    
+    def _generate_answer(self, question: str, relevant_chunks: List[Dict],
+                         history_messages: List[Dict], timings: Dict) -> Dict[str, any]:
+        """Pack context, call the LLM and collect sources for one question"""
+        # Fit the best chunks into what the conversation history leaves of the context token budget
+        history_tokens = sum(ContextPacker.count_tokens(message['content']) for message in history_messages)
+        context_chunks = ContextPacker(max(0, Config.CONTEXT_TOKEN_BUDGET - history_tokens)).pack(relevant_chunks)
+        
+        # Build prompt
+        prompt = self._build_prompt(question, context_chunks)
+        
+        # Generate answer using OpenAI
+        started = time.perf_counter()
+        with timed('llm', 'answer'):
+            response = self.client.chat.completions.create(
+                model=self.llm_model,
+                messages=[
+                    {"role": "system", "content": "You are a precise document assistant that answers questions only from provided context."},
+                    *history_messages,
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=self.temperature,
+                max_tokens=Config.LLM_MAX_TOKENS
+            )
+        
+        answer = response.choices[0].message.content.strip()
+        timings['llm_ms'] = (time.perf_counter() - started) * 1000
+        
+        # Extract unique sources
+        sources = []
+        seen_sources = set()
+        
+        for chunk in context_chunks:
+            metadata = chunk['metadata']
+            source_key = (metadata['doc_id'], metadata['page_number'])
+            
+            if source_key not in seen_sources:
+                sources.append({
+                    'doc_id': metadata['doc_id'],
+                    'filename': metadata['filename'],
+                    'page_number': metadata['page_number'],
+                    'text_preview': chunk['text'][:200] + "..."
+                })
+                seen_sources.add(source_key)
+        
+        return {
+            'answer': answer,
+            'sources': sources,
+            'timings': timings
+        }
+    
+    @profiled('retrieval')
+    def query(self, question: str, filters: Optional[Dict] = None) -> Dict[str, any]:
         """
-        Process a query using RAG
+        Process a query using RAG, optionally scoped by filters (see VectorStore.select_ids)
         
         Returns:
-            Dict with 'answer' and 'sources'
+            Dict with 'answer', 'sources' and per-stage 'timings' (ms)
         """
+        self.timings = {}
         try:
             # Handle greetings and casual conversation
             if self._is_greeting(question):
                 return {
-                    'answer': "Hello! 👋 I'm your document assistant. I can help you find information from your uploaded documents, answer questions, and provide summaries. What would you like to know?",
+                    'answer': self.GREETING_ANSWER,
                     'sources': []
                 }
             
-            # Retrieve relevant chunks
-            relevant_chunks = self.vector_store.search(question, k=Config.TOP_K_RETRIEVAL)
+            # Retrieve relevant chunks (blending in the session's recent turns),
+            # over-fetching candidates when a re-ranker will narrow them down
+            rerank = Reranker.is_available()
+            started = time.perf_counter()
+            relevant_chunks = self._retrieve(
+                question,
+                k=Config.RERANK_CANDIDATES if rerank else Config.TOP_K_RETRIEVAL,
+                filters=filters
+            )
+            self.timings['retrieval_ms'] = (time.perf_counter() - started) * 1000
+            
+            if rerank and relevant_chunks:
+                started = time.perf_counter()
+                # Follow-ups are scored together with the previous question for context
+                rerank_query = f"{self._history[-1]['question']} {question}" if self._history else question
+                relevant_chunks = Reranker.rerank(rerank_query, relevant_chunks)
+                self.timings['rerank_ms'] = (time.perf_counter() - started) * 1000
             
             # Check if we have any documents
             if not relevant_chunks:
                 return {
-                    'answer': "No documents have been uploaded yet. Please upload documents to ask questions.",
+                    'answer': self._no_results_answer(filters),
                     'sources': []
                 }
             
-            # Build prompt
-            prompt = self._build_prompt(question, relevant_chunks)
-            
-            # Generate answer using OpenAI
-            response = self.client.chat.completions.create(
-                model=self.llm_model,
-                messages=[
-                    {"role": "system", "content": "You are a precise document assistant that answers questions only from provided context."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=1000
-            )
-            
-            answer = response.choices[0].message.content.strip()
-            
-            # Extract unique sources
-            sources = []
-            seen_sources = set()
-            
-            for chunk in relevant_chunks:
-                metadata = chunk['metadata']
-                source_key = (metadata['doc_id'], metadata['page_number'])
-                
-                if source_key not in seen_sources:
-                    sources.append({
-                        'doc_id': metadata['doc_id'],
-                        'filename': metadata['filename'],
-                        'page_number': metadata['page_number'],
-                        'text_preview': chunk['text'][:200] + "..."
-                    })
-                    seen_sources.add(source_key)
-            
-            return {
-                'answer': answer,
-                'sources': sources
-            }
+            return self._generate_answer(question, relevant_chunks, self._history_messages(), self.timings)
             
         except Exception as e:
             raise Exception(f"Error processing query: {str(e)}")
     
+    @profiled('retrieval')
+    def query_batch(self, items: List[Dict], max_concurrency: int = None) -> List[Dict[str, any]]:
+        """
+        Answer many independent questions at once (no session history)
+        
+        All questions are embedded in one pass and unfiltered ones share a single
+        batched index search; LLM calls then run concurrently.
+        
+        Args:
+            items: List of dicts with 'question' and optional 'filters'
+        
+        Returns:
+            One dict per item, in order, with 'question' plus either
+            'answer', 'sources' and 'timings' or 'error'
+        """
+        if max_concurrency is None:
+            max_concurrency = Config.BATCH_LLM_CONCURRENCY
+        results = [None] * len(items)
+        pending = []  # (position, question, filters)
+        
+        for position, item in enumerate(items):
+            question = (item.get('question') or '').strip()
+            if not question:
+                results[position] = {'question': question, 'error': 'Question is required'}
+            elif self._is_greeting(question):
+                results[position] = {'question': question, 'answer': self.GREETING_ANSWER, 'sources': []}
+            else:
+                pending.append((position, question, item.get('filters')))
+        
+        if not pending:
+            return results
+        
+        # Retrieval: one embedding pass, one index search for every unfiltered question
+        rerank = Reranker.is_available()
+        k = Config.RERANK_CANDIDATES if rerank else Config.TOP_K_RETRIEVAL
+        started = time.perf_counter()
+        retrieved = {}
+        try:
+            vectors = self.vector_store.generate_embeddings([question for _, question, _ in pending])
+            unfiltered = [i for i, (_, _, filters) in enumerate(pending) if not filters]
+            if unfiltered:
+                batch_results = self.vector_store.search_batch(vectors[unfiltered], k=k)
+                for i, chunks in zip(unfiltered, batch_results):
+                    retrieved[i] = chunks
+            for i, (_, _, filters) in enumerate(pending):
+                if filters:
+                    retrieved[i] = self.vector_store.search_by_vector(vectors[i], k=k, filters=filters)
+        except Exception as e:
+            for position, question, _ in pending:
+                results[position] = {'question': question, 'error': f"Retrieval failed: {str(e)}"}
+            return results
+        retrieval_ms = (time.perf_counter() - started) * 1000 / len(pending)
+        
+        @profiled('retrieval')
+        def answer(i: int) -> Dict[str, any]:
+            position, question, filters = pending[i]
+            timings = {'retrieval_ms': retrieval_ms}
+            try:
+                chunks = retrieved[i]
+                if rerank and chunks:
+                    started = time.perf_counter()
+                    chunks = Reranker.rerank(question, chunks)
+                    timings['rerank_ms'] = (time.perf_counter() - started) * 1000
+                if not chunks:
+                    return {'question': question, 'answer': self._no_results_answer(filters), 'sources': []}
+                result = self._generate_answer(question, chunks, [], timings)
+                return {'question': question, **result}
+            except Exception as e:
+                return {'question': question, 'error': str(e)}
+        
+        # LLM calls are network-bound, so a small thread pool bounds concurrency
+        contexts = [contextvars.copy_context() for _ in pending]  # keep request timings in the workers
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            for i, result in enumerate(executor.map(lambda i: contexts[i].run(answer, i), range(len(pending)))):
+                results[pending[i][0]] = result
+        
+        return results
+    
     def summarize_document(self, doc_id: int, filename: str) -> str:
         """Generate a summary of a specific document"""
         try:
@@ -170,8 +411,9 @@ Provide a well-formatted, professional answer:"""
                 key=lambda x: (x['metadata']['page_number'], x['metadata']['chunk_index'])
             )
             
-            # Combine text (limit to avoid token limits)
-            combined_text = "\n\n".join([chunk['text'] for chunk in all_chunks[:20]])
+            # Combine text from the start of the document, up to the summary token budget
+            packed = ContextPacker(Config.SUMMARY_CONTEXT_TOKEN_BUDGET).pack(all_chunks)
+            combined_text = "\n\n".join([chunk['text'] for chunk in packed])
             
             # Create summary prompt
             prompt = f"""Provide a comprehensive, professionally formatted summary of the following document.
@@ -202,15 +444,16 @@ Any critical details, conclusions, or recommendations
 Provide the summary in markdown format:"""
             
             # Generate summary
-            response = self.client.chat.completions.create(
-                model=self.llm_model,
-                messages=[
-                    {"role": "system", "content": "You are a professional document summarization assistant. Always use proper markdown formatting with headings, bold text, and bullet points for clarity."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
+            with timed('llm', 'summary'):
+                response = self.client.chat.completions.create(
+                    model=self.llm_model,
+                    messages=[
+                        {"role": "system", "content": "You are a professional document summarization assistant. Always use proper markdown formatting with headings, bold text, and bullet points for clarity."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=Config.SUMMARY_MAX_TOKENS
+                )
             
             summary = response.choices[0].message.content.strip()
             return summary
@@ -0,0 +1,275 @@
+"""
+Online index rebuilds
+
+Changing the embedding model or the chunking settings needs every user's
+index rebuilt. A rebuild writes a new index version (see utils/vector_store.py)
+next to the active one from the cached document text, pausing between batches
+so it uses at most REINDEX_CPU_FRACTION of a CPU, while queries keep being
+served from the active version. Documents uploaded or deleted meanwhile are
+caught up, then the new version is swapped in atomically. One background
+worker rebuilds one tenant at a time; progress is kept per tenant in its
+index manifest.
+
+From backend/:
+    python -m utils.reindex status
+    python -m utils.reindex rebuild --user 7
+    python -m utils.reindex rebuild --stale
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import Config
+from database import Document
+from utils.conversation_cache import conversation_cache
+from utils.logger import get_logger
+from utils.vector_store import (
+    VectorStore, activate_version, create_version, discard_version, index_lock,
+    index_signature, read_manifest, update_manifest, user_store_dir
+)
+
+logger = get_logger('reindex')
+
+_queue = queue.Queue()
+_queued = set()  # users waiting for or undergoing a rebuild in this process
+_queued_lock = threading.Lock()
+_worker = None
+
+class Throttle:
+    """Hold a background job to a fraction of one CPU by sleeping in proportion to the work done"""
+
+    def __init__(self, fraction: float = None):
+        fraction = fraction if fraction is not None else Config.REINDEX_CPU_FRACTION
+        self.fraction = min(1.0, max(0.01, fraction))
+
+    @contextmanager
+    def step(self):
+        started = time.perf_counter()
+        yield
+        busy = time.perf_counter() - started
+        if self.fraction < 1.0:
+            time.sleep(busy * (1 - self.fraction) / self.fraction)
+
+def is_stale(user_id: int, manifest: Dict = None) -> bool:
+    """Whether the user's active index was built with other settings than the current ones"""
+    manifest = manifest or read_manifest(user_id)
+    active = manifest['versions'][str(manifest['active'])]
+    target = index_signature()
+    return active['model'] != target['model'] or active['chunking'] != target['chunking']
+
+def index_status(user_id: int) -> Dict:
+    """
+    A tenant's index versions and rebuild progress
+
+    Returns:
+        Dict with 'active' (version, model, chunking, created), 'target' (the
+        current settings), 'stale' and 'rebuild' (progress of the latest
+        rebuild, or None)
+    """
+    manifest = read_manifest(user_id)
+    active = manifest['versions'][str(manifest['active'])]
+    build = manifest.get('build')
+    with _queued_lock:
+        if user_id in _queued and (not build or build['status'] in ('ready', 'failed')):
+            build = {'status': 'queued'}
+    return {
+        'active': {'version': manifest['active'], 'model': active['model'],
+                   'chunking': active['chunking'], 'created': active['created']},
+        'target': index_signature(),
+        'stale': is_stale(user_id, manifest),
+        'rebuild': build
+    }
+
+def schedule_rebuild(user_id: int) -> bool:
+    """
+    Queue a rebuild of the user's index on the background worker
+
+    Returns:
+        False if one is already queued or running for this user
+    """
+    global _worker
+    with _queued_lock:
+        if user_id in _queued:
+            return False
+        _queued.add(user_id)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name="reindex", daemon=True)
+            _worker.start()
+    _queue.put(user_id)
+    logger.info("Index rebuild queued", extra={'user_id': user_id})
+    return True
+
+def _work():
+    while True:
+        user_id = _queue.get()
+        try:
+            rebuild_index(user_id)
+        except Exception:
+            pass  # logged and recorded in the manifest by rebuild_index
+        finally:
+            with _queued_lock:
+                _queued.discard(user_id)
+
+def _tenants() -> List[int]:
+    """Users with a document or an index directory"""
+    users = {document['user_id'] for document in Document.get_all()}
+    if os.path.isdir(Config.VECTOR_STORE_PATH):
+        for name in os.listdir(Config.VECTOR_STORE_PATH):
+            if name.startswith('user_') and name[len('user_'):].isdigit():
+                users.add(int(name[len('user_'):]))
+    return sorted(users)
+
+def schedule_stale_rebuilds() -> int:
+    """
+    Queue rebuilds for every tenant whose index is stale (run at startup)
+
+    Versions left half-built by a previous process are discarded first.
+
+    Returns:
+        Number of rebuilds queued
+    """
+    scheduled = 0
+    for user_id in _tenants():
+        manifest = read_manifest(user_id)
+        build = manifest.get('build')
+        if build and build['status'] in ('building', 'swapping'):
+            logger.warning("Discarding interrupted index rebuild", extra={'user_id': user_id, 'version': build['version']})
+            discard_version(user_id, build['version'])
+            _record(user_id, status='failed', error="interrupted by a restart", finished=time.time())
+        if is_stale(user_id) and schedule_rebuild(user_id):
+            scheduled += 1
+    if scheduled:
+        logger.info("Stale indexes queued for rebuild", extra={'tenants': scheduled})
+    return scheduled
+
+def _record(user_id: int, **progress):
+    """Update the tenant's rebuild progress in its manifest"""
+    def change(manifest):
+        manifest['build'] = {**(manifest.get('build') or {}), **progress}
+
+    update_manifest(user_id, change)
+
+def rebuild_index(user_id: int, throttle: Optional[Throttle] = None, processor=None) -> Dict:
+    """
+    Build a new index version with the current settings and swap it in
+
+    Runs in the calling thread; queries keep using the active version until
+    the swap. The document text comes from the text cache where possible.
+
+    Returns:
+        Final progress dict ('version', 'documents', 'chunks', timings)
+    """
+    from utils.document_processor import DocumentProcessor
+
+    throttle = throttle or Throttle()
+    processor = processor or DocumentProcessor()
+    signature = index_signature()
+    version = create_version(user_id, signature)
+    store = VectorStore(user_id, version=version)
+    started = time.time()
+    indexed = {}  # doc_id -> chunks in the new version
+    _record(user_id, version=version, status='building', model=signature['model'], started=started,
+            finished=None, error=None, documents_total=0, documents_done=0, chunks=0)
+    logger.info("Index rebuild started", extra={'user_id': user_id, 'version': version, 'model': signature['model']})
+
+    def pending() -> List:
+        """Ready documents not yet in the new version; chunks of deleted ones are dropped"""
+        documents = [document for document in Document.get_by_user(user_id) if document['status'] == 'ready']
+        current = {document['id'] for document in documents}
+        for doc_id in [doc_id for doc_id in indexed if doc_id not in current]:
+            store.truncate_document(doc_id, 0)
+            del indexed[doc_id]
+        return [document for document in documents if document['id'] not in indexed]
+
+    def index_documents(documents: List):
+        _record(user_id, documents_total=len(indexed) + len(documents))
+        for document in documents:
+            if not os.path.exists(document['file_path']):
+                logger.warning("Skipping document whose file is missing", extra={'doc_id': document['id']})
+                indexed[document['id']] = 0
+                continue
+            pages = processor.iter_pages(document['file_path'], file_hash=document['file_hash'])
+            chunks = processor.iter_chunks(pages, document['id'], document['original_filename'])
+            count = 0
+            while True:
+                with throttle.step():
+                    batch = [chunk for _, chunk in zip(range(Config.EMBED_BATCH_SIZE), chunks)]
+                    if batch:
+                        store.append_embeddings(batch, store.generate_embeddings([chunk['text'] for chunk in batch]))
+                if not batch:
+                    break
+                count += len(batch)
+            store.save()
+            indexed[document['id']] = count
+            _record(user_id, documents_done=len(indexed), chunks=store.get_chunk_count())
+
+    try:
+        index_documents(pending())
+        # Catch up with uploads made during the build without holding up new ones
+        for _ in range(3):
+            documents = pending()
+            if not documents:
+                break
+            index_documents(documents)
+        with index_lock(user_id):
+            # Ingestions in progress finish first and are caught up; later ones open the new version
+            _record(user_id, status='swapping')
+            index_documents(pending())
+            store.save()
+            activate_version(user_id, version)
+            for doc_id, count in indexed.items():
+                Document.set_chunk_count(doc_id, user_id, count, store.model_name)
+        conversation_cache.invalidate_user(user_id)  # cached question vectors came from the old model
+    except Exception as e:
+        logger.exception("Index rebuild failed", extra={'user_id': user_id, 'version': version})
+        discard_version(user_id, version)
+        _record(user_id, status='failed', error=str(e), finished=time.time())
+        raise
+
+    _record(user_id, status='ready', finished=time.time(), documents_done=len(indexed), chunks=store.get_chunk_count())
+    logger.info("Index rebuild complete", extra={
+        'user_id': user_id, 'version': version, 'documents': len(indexed),
+        'chunks': store.get_chunk_count(), 'duration_ms': round((time.time() - started) * 1000, 1)
+    })
+    return read_manifest(user_id)['build']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and rebuild per-user vector indexes")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="Active version and rebuild progress of every tenant")
+    rebuild = commands.add_parser('rebuild', help="Rebuild indexes now, in this process")
+    target = rebuild.add_mutually_exclusive_group(required=True)
+    target.add_argument('--user', type=int, action='append', help="Tenant to rebuild (repeatable)")
+    target.add_argument('--stale', action='store_true', help="Every tenant whose index is stale")
+    rebuild.add_argument('--cpu-fraction', type=float, help="Override REINDEX_CPU_FRACTION")
+    args = parser.parse_args(argv)
+
+    from database import init_db
+    init_db()
+
+    if args.command == 'status':
+        for user_id in _tenants():
+            if not os.path.isdir(user_store_dir(user_id)):
+                continue
+            status = index_status(user_id)
+            build = status['rebuild'] or {}
+            progress = (f"{build.get('status')} {build.get('documents_done', 0)}/{build.get('documents_total', 0)} docs, "
+                        f"{build.get('chunks', 0)} chunks" if build else 'none')
+            print(f"user {user_id}: v{status['active']['version']} {status['active']['model']}"
+                  f"{' (stale)' if status['stale'] else ''}; last rebuild: {progress}"
+                  f"{' - ' + build['error'] if build.get('error') else ''}")
+        return
+
+    users = args.user or [user_id for user_id in _tenants() if is_stale(user_id)]
+    throttle = Throttle(args.cpu_fraction)
+    for user_id in users:
+        print(f"Rebuilding user {user_id}...")
+        result = rebuild_index(user_id, throttle=throttle)
+        print(f"  v{result['version']}: {result['documents_done']} documents, {result['chunks']} chunks "
+              f"in {result['finished'] - result['started']:.1f}s")
+
+if __name__ == '__main__':
+    main()
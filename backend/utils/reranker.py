@@ -0,0 +1,61 @@
+"""
+Cross-encoder re-ranking of retrieved chunks
+"""
+import threading
+from typing import List, Dict
+from config import Config
+from utils.metrics import instrument
+from utils.logger import get_logger
+
+logger = get_logger('rerank')
+
+class Reranker:
+    """Rescore (question, chunk) pairs with a small local cross-encoder"""
+
+    _model = None
+    _model_lock = threading.Lock()
+    _load_failed = False
+
+    @classmethod
+    def _get_model(cls):
+        """Load the cross-encoder once per process; None if it is unavailable"""
+        if cls._model is None and not cls._load_failed:
+            with cls._model_lock:
+                if cls._model is None and not cls._load_failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        cls._model = CrossEncoder(Config.RERANK_MODEL, device='cpu')
+                    except Exception as e:
+                        logger.warning("Cross-encoder unavailable, skipping re-ranking", extra={'error': str(e)})
+                        cls._load_failed = True
+        return cls._model
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Check whether re-ranking is enabled and the model can be loaded"""
+        return Config.RERANK_ENABLED and cls._get_model() is not None
+
+    @classmethod
+    @instrument('rerank', 'cross_encoder')
+    def rerank(cls, question: str, chunks: List[Dict], top_n: int = None) -> List[Dict]:
+        """
+        Order chunks by cross-encoder relevance to the question
+
+        Returns:
+            The best top_n chunks, each with an added 'rerank_score'
+        """
+        if top_n is None:
+            top_n = Config.RERANK_TOP_N
+        model = cls._get_model()
+        if model is None or not chunks:
+            return chunks[:top_n]
+
+        scores = model.predict(
+            [(question, chunk['text']) for chunk in chunks],
+            batch_size=Config.RERANK_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        for chunk, score in zip(chunks, scores):
+            chunk['rerank_score'] = float(score)
+
+        return sorted(chunks, key=lambda chunk: chunk['rerank_score'], reverse=True)[:top_n]
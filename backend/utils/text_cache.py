@@ -0,0 +1,133 @@
+"""
+Extracted text cache
+
+Extraction (PDF parsing above all) is the slowest step of ingestion, and
+re-ingesting a file always produces the same sections. Sections are stored
+gzip-compressed, one JSON object per line, under the SHA-256 of the file and
+the extractor's cache key (name, backend and version), so re-uploads,
+re-chunking and re-indexing read the text back instead of re-parsing. Entries
+are content addressed: identical files uploaded by different users share one,
+and an entry outlives the document it came from until it is evicted (least
+recently used first, beyond TEXT_CACHE_MAX_MB).
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, Iterator, Optional
+from config import Config
+from utils.logger import get_logger
+
+logger = get_logger('text_cache')
+
+_prune_lock = threading.Lock()
+_SUFFIX = '.jsonl.gz'
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file, read in UPLOAD_READ_SIZE blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(Config.UPLOAD_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _entry_path(file_hash: str, cache_key: str) -> str:
+    return os.path.join(Config.TEXT_CACHE_PATH, file_hash[:2], f"{file_hash}.{cache_key}{_SUFFIX}")
+
+def read_sections(file_hash: str, cache_key: str, start: int = 1) -> Optional[Iterator[Dict[str, any]]]:
+    """
+    Cached sections numbered from `start` on, or None on a cache miss
+
+    Reading an entry marks it as recently used. A damaged entry raises while
+    being iterated; the caller should drop it with discard_sections() and re-extract.
+    """
+    path = _entry_path(file_hash, cache_key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+
+    def sections():
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                section = json.loads(line)
+                if section['page_number'] >= start:
+                    yield section
+
+    return sections()
+
+def store_sections(file_hash: str, cache_key: str, sections: Iterable[Dict[str, any]]) -> Iterator[Dict[str, any]]:
+    """
+    Pass sections through, saving them as a cache entry
+
+    The entry is only published once the stream is exhausted, so a partial
+    read (a failed or cancelled ingestion) never leaves a truncated entry.
+    """
+    path = _entry_path(file_hash, cache_key)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=Config.TEXT_CACHE_COMPRESSION)
+    except OSError:
+        logger.exception("Cannot write text cache entry", extra={'path': temp_path})
+        yield from sections
+        return
+
+    complete = False
+    try:
+        for section in sections:
+            f.write(json.dumps(section, ensure_ascii=False) + '\n')
+            yield section
+        complete = True
+    finally:
+        f.close()
+        if complete:
+            os.replace(temp_path, path)
+            logger.debug("Cached extracted text", extra={'path': path, 'bytes': os.path.getsize(path)})
+        else:
+            os.remove(temp_path)
+    prune()
+
+def discard_sections(file_hash: str, cache_key: str):
+    """Remove an entry (e.g. one that could not be read)"""
+    try:
+        os.remove(_entry_path(file_hash, cache_key))
+    except FileNotFoundError:
+        pass
+
+def prune(max_bytes: int = None) -> int:
+    """
+    Evict least recently used entries until the cache fits in max_bytes
+
+    Returns:
+        Number of entries removed
+    """
+    max_bytes = max_bytes if max_bytes is not None else Config.TEXT_CACHE_MAX_MB * 1024 * 1024
+    with _prune_lock:
+        entries = []
+        for directory, _, names in os.walk(Config.TEXT_CACHE_PATH):
+            for name in names:
+                if not name.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Evicted text cache entries", extra={'removed': removed, 'bytes': total})
+        return removed
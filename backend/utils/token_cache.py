@@ -0,0 +1,87 @@
+"""
+In-memory cache of verified JWTs and user token versions
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config import Config
+
+class TokenCache:
+    """Bounded LRU of verified tokens plus short-lived token_version lookups"""
+
+    def __init__(self, max_size: int = None, version_ttl: float = None):
+        self.max_size = max_size if max_size is not None else Config.AUTH_TOKEN_CACHE_SIZE
+        self.version_ttl = version_ttl if version_ttl is not None else Config.AUTH_REVOCATION_TTL
+        self._tokens = OrderedDict()  # token hash -> (user_id, token_version, exp)
+        self._versions = {}  # user_id -> (token_version, cached_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        """Hash the token so raw credentials are never held in memory"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token: str) -> Optional[Tuple[int, int]]:
+        """Return (user_id, token_version) for a verified, unexpired token"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            user_id, version, exp = entry
+            if exp <= time.time():
+                # Let the caller re-decode so it reports the expiry
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return user_id, version
+
+    def put(self, token: str, user_id: int, version: int, exp: float):
+        """Remember a token that has just passed signature verification"""
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._tokens[key] = (user_id, version, exp)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def get_version(self, user_id: int) -> Optional[int]:
+        """Return the cached token_version for a user if still fresh"""
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is None:
+                return None
+            version, cached_at = entry
+            if time.monotonic() - cached_at > self.version_ttl:
+                del self._versions[user_id]
+                return None
+            return version
+
+    def put_version(self, user_id: int, version: int):
+        """Cache a user's current token_version"""
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic())
+            if len(self._versions) > max(self.max_size, 1):
+                # Drop the oldest lookups; dicts keep insertion order
+                for stale in list(self._versions)[:len(self._versions) - self.max_size]:
+                    del self._versions[stale]
+
+    def invalidate_user(self, user_id: int):
+        """Forget everything cached for a user (after revoking their tokens)"""
+        with self._lock:
+            self._versions.pop(user_id, None)
+            stale = [key for key, entry in self._tokens.items() if entry[0] == user_id]
+            for key in stale:
+                del self._tokens[key]
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._tokens.clear()
+            self._versions.clear()
+
+token_cache = TokenCache()
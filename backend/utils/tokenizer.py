@@ -0,0 +1,55 @@
+"""
+Shared tiktoken helpers for measuring text in tokens
+"""
+import threading
+from typing import List
+from config import Config
+from utils.logger import get_logger
+
+logger = get_logger('tokenizer')
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+def get_encoding():
+    """Load the tiktoken encoding once per process; None if it is unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(Config.TOKENIZER_ENCODING)
+                except Exception as e:
+                    logger.warning("tiktoken unavailable, estimating tokens from length", extra={'error': str(e)})
+                    _encoding_failed = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text (roughly 4 characters per token without tiktoken)"""
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split text into consecutive pieces of at most max_tokens tokens"""
+    encoding = get_encoding()
+    if encoding is None:
+        size = max(1, max_tokens * 4)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max(1, max_tokens))]
@@ -1,27 +1,218 @@
 """
 Vector store management using FAISS
+
+FAISS and the embedding model (torch) are imported on first use, so the API
+process starts without them.
+
+Each user's index is versioned: vector_stores/user_<id>/index.json lists the
+versions (each with its own directory, embedding model and chunking settings)
+and which one is active. A VectorStore serves the active version unless asked
+for another, so a replacement can be built next to it (see utils/reindex.py)
+and swapped in by rewriting the manifest.
+
+The index and metadata are separate files, each replaced atomically. A crash
+between the two saves leaves them out of step; loading detects that and
+realigns the index with the metadata (see VectorStore._align).
 """
+import json
 import os
 import pickle
+import shutil
+import threading
+import time
+import uuid
 import numpy as np
-from typing import List, Dict, Optional
-from langchain_huggingface import HuggingFaceEmbeddings
-import faiss
+from typing import Callable, List, Dict, Optional
 from config import Config
+from utils.logger import get_logger
+from utils.metrics import instrument, timed
+
+logger = get_logger('vector_store')
+
+_embeddings = {}  # model name -> loaded embeddings, shared by every VectorStore
+_embeddings_lock = threading.Lock()
+_dimensions = {}  # model name -> embedding dimension
+_manifest_lock = threading.RLock()
+_index_locks = {}  # user id -> write lock of the user's active index
+_index_locks_lock = threading.Lock()
+
+def get_embeddings(model_name: str):
+    """Load a HuggingFace embedding model once per process"""
+    embeddings = _embeddings.get(model_name)
+    if embeddings is None:
+        with _embeddings_lock:
+            embeddings = _embeddings.get(model_name)
+            if embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                with timed('model_load', 'embeddings'):
+                    embeddings = _embeddings[model_name] = HuggingFaceEmbeddings(model_name=model_name)
+    return embeddings
+
+def get_embedding_dimension(model_name: str) -> int:
+    """Vector size of an embedding model (measured once per process)"""
+    dimension = _dimensions.get(model_name)
+    if dimension is None:
+        dimension = _dimensions[model_name] = len(get_embeddings(model_name).embed_query("dimension"))
+    return dimension
+
+# What stores from before versioning were built with: the original hard-coded model and character chunking
+LEGACY_SIGNATURE = {
+    'model': 'sentence-transformers/all-MiniLM-L6-v2',
+    'chunking': {'strategy': 'recursive', 'size_tokens': None, 'overlap_tokens': None, 'size': 1000, 'overlap': 200}
+}
+
+def index_signature() -> Dict:
+    """What an index built now depends on: the embedding model and the chunking settings"""
+    return {
+        'model': Config.LOCAL_EMBEDDING_MODEL,
+        'chunking': {
+            'strategy': Config.CHUNK_STRATEGY,
+            'size_tokens': Config.CHUNK_SIZE_TOKENS,
+            'overlap_tokens': Config.CHUNK_OVERLAP_TOKENS,
+            'size': Config.CHUNK_SIZE,
+            'overlap': Config.CHUNK_OVERLAP
+        }
+    }
+
+def index_lock(user_id: int) -> threading.RLock:
+    """
+    Write lock of a user's active index
+    
+    A VectorStore rewrites the whole index when it saves, so every writer
+    (ingestion, deletion, reconciliation, swapping in a rebuilt version) holds
+    it and works on the index as last saved; otherwise concurrent writers
+    would drop each other's chunks. Re-entrant, so writers can nest.
+    """
+    with _index_locks_lock:
+        return _index_locks.setdefault(user_id, threading.RLock())
+
+def _replace_file(path: str, write: Callable[[str], None]):
+    """Write a file through write(temp_path), fsync it and move it into place atomically"""
+    temp_path = f"{path}.tmp"
+    write(temp_path)
+    with open(temp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)  # readers see the old or the new file, never a partial one
+
+def user_store_dir(user_id: int) -> str:
+    return os.path.join(Config.VECTOR_STORE_PATH, f"user_{user_id}")
+
+def _manifest_path(user_id: int) -> str:
+    return os.path.join(user_store_dir(user_id), "index.json")
+
+def _write_manifest(user_id: int, manifest: Dict):
+    path = _manifest_path(user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(temp_path):
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    _replace_file(path, write)
+
+def read_manifest(user_id: int) -> Dict:
+    """
+    A user's index versions
+    
+    Returns:
+        Dict with 'active' (version number), 'versions' (str(number) -> 'dir',
+        'model', 'chunking' and 'created') and 'build' (progress of the last
+        rebuild, or None). A store from before versioning, with its files
+        directly in the user directory, is adopted as version 0 with
+        LEGACY_SIGNATURE, so it counts as stale until rebuilt.
+    """
+    with _manifest_lock:
+        path = _manifest_path(user_id)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        legacy = os.path.exists(os.path.join(user_store_dir(user_id), "faiss.index"))
+        version = 0 if legacy else 1
+        signature = LEGACY_SIGNATURE if legacy else index_signature()
+        manifest = {
+            'active': version,
+            'versions': {str(version): {'dir': '.' if legacy else f"v{version}", **signature, 'created': time.time()}},
+            'build': None
+        }
+        _write_manifest(user_id, manifest)
+        return manifest
+
+def update_manifest(user_id: int, change: Callable[[Dict], None]) -> Dict:
+    """Apply change() to the manifest in place and save it atomically"""
+    with _manifest_lock:
+        manifest = read_manifest(user_id)
+        change(manifest)
+        _write_manifest(user_id, manifest)
+        return manifest
+
+def create_version(user_id: int, signature: Dict) -> int:
+    """Register a new, empty version built with `signature` (not yet active)"""
+    created = {}
+
+    def add(manifest):
+        version = max(int(number) for number in manifest['versions']) + 1
+        manifest['versions'][str(version)] = {'dir': f"v{version}", **signature, 'created': time.time()}
+        created['version'] = version
+
+    update_manifest(user_id, add)
+    return created['version']
+
+def activate_version(user_id: int, version: int, keep: int = None):
+    """
+    Make a version the one that is served, then delete all but the `keep` newest others
+    
+    Stores already open keep serving the version they loaded; every store
+    opened afterwards gets the new one.
+    """
+    keep = keep if keep is not None else Config.INDEX_VERSIONS_KEPT
+    retired = []
+
+    def swap(manifest):
+        manifest['active'] = version
+        older = sorted((int(number) for number in manifest['versions'] if int(number) != version), reverse=True)
+        for number in older[max(0, keep):]:
+            retired.append(manifest['versions'].pop(str(number)))
+
+    update_manifest(user_id, swap)
+    for entry in retired:
+        _remove_version_files(user_id, entry)
+
+def discard_version(user_id: int, version: int):
+    """Delete an inactive version (e.g. an abandoned rebuild)"""
+    removed = {}
+
+    def drop(manifest):
+        if manifest['active'] != version:
+            removed['entry'] = manifest['versions'].pop(str(version), None)
+
+    update_manifest(user_id, drop)
+    if removed.get('entry'):
+        _remove_version_files(user_id, removed['entry'])
+
+def _remove_version_files(user_id: int, entry: Dict):
+    directory = os.path.normpath(os.path.join(user_store_dir(user_id), entry['dir']))
+    if directory == os.path.normpath(user_store_dir(user_id)):
+        # Pre-versioning store: only its own files live here
+        for name in ("faiss.index", "metadata.pkl"):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+    else:
+        shutil.rmtree(directory, ignore_errors=True)
 
 class VectorStore:
     """Manage FAISS vector store for user documents"""
     
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, version: Optional[int] = None):
         self.user_id = user_id
-        # Use free HuggingFace embeddings (all-MiniLM-L6-v2 is fast and good quality)
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        self.dimension = 384  # all-MiniLM-L6-v2 dimension
+        manifest = read_manifest(user_id)
+        self.version = manifest['active'] if version is None else version
+        entry = manifest['versions'][str(self.version)]
+        # Each version keeps the model it was built with, so a model change only applies once a rebuild is swapped in
+        self.model_name = entry['model']
+        self.embeddings = get_embeddings(self.model_name)
         
-        # User-specific paths
-        self.store_dir = os.path.join(Config.VECTOR_STORE_PATH, f"user_{user_id}")
+        # User- and version-specific paths
+        self.store_dir = os.path.normpath(os.path.join(user_store_dir(user_id), entry['dir']))
         self.index_path = os.path.join(self.store_dir, "faiss.index")
         self.metadata_path = os.path.join(self.store_dir, "metadata.pkl")
         
@@ -29,33 +220,156 @@ class VectorStore:
         os.makedirs(self.store_dir, exist_ok=True)
         
         # Load or create index
+        self._filter_columns = None  # doc_id / page range arrays for filtered search, built lazily
+        self.reload()
+    
+    @property
+    def dimension(self) -> int:
+        """Vector size of this version's index"""
+        return self.index.d
+    
+    def is_active(self) -> bool:
+        """Whether this is still the version being served"""
+        return read_manifest(self.user_id)['active'] == self.version
+    
+    def reload(self):
+        """Re-read the index and metadata from disk, dropping unsaved changes"""
         self.index = self._load_or_create_index()
         self.metadata = self._load_metadata()
+        self._filter_columns = None
+        self.realigned = self._align()  # saved files were out of step; see repair()
+    
+    def _align(self) -> bool:
+        """
+        Make the index match the metadata after a save was interrupted (in memory only)
+        
+        save() writes the index before the metadata. Appends only ever add to
+        the end of both, so extra vectors mean an append whose metadata never
+        reached disk: they are dropped. Fewer vectors mean an interrupted
+        rewrite (deletion, truncation) whose new index did not get its
+        metadata: the metadata still describes the previous state, so the
+        index is rebuilt from the stored chunk texts.
+        """
+        vectors, chunks = self.index.ntotal, len(self.metadata)
+        if vectors == chunks:
+            return False
+        logger.warning("Index and metadata out of step, realigning", extra={
+            'user_id': self.user_id, 'version': self.version, 'vectors': vectors, 'chunks': chunks
+        })
+        if vectors > chunks:
+            self.index.remove_ids(np.arange(chunks, vectors, dtype='int64'))
+        else:
+            self._rebuild_index(self.metadata)
+        return True
+    
+    def repair(self) -> bool:
+        """
+        Save the realigned index if loading found it out of step with the metadata
+        
+        Call holding index_lock, on a store loaded while holding it.
+        
+        Returns:
+            True if the saved files were repaired
+        """
+        if not self.realigned:
+            return False
+        self.save()
+        self.realigned = False
+        return True
     
-    def _load_or_create_index(self) -> faiss.Index:
+    def _rebuild_index(self, items: List[Dict]):
+        """Replace the index with freshly embedded vectors for items (metadata entries), in order"""
+        import faiss
+        self.index = faiss.IndexFlatL2(self.dimension)
+        if items:
+            self.index.add(self.generate_embeddings([item['text'] for item in items]))
+    
+    @instrument('index_load', 'faiss')
+    def _load_or_create_index(self) -> 'faiss.Index':
         """Load existing index or create new one"""
+        import faiss
         if os.path.exists(self.index_path):
             return faiss.read_index(self.index_path)
         else:
-            # Create a new FAISS index (L2 distance)
-            return faiss.IndexFlatL2(self.dimension)
+            # Create a new FAISS index (L2 distance) sized for this version's model
+            return faiss.IndexFlatL2(get_embedding_dimension(self.model_name))
     
+    @instrument('index_load', 'metadata')
     def _load_metadata(self) -> List[Dict]:
-        """Load metadata or return empty list"""
+        """Load metadata or return empty list (and note which save it came from; see revision)"""
+        write_id = None
+        metadata = []
         if os.path.exists(self.metadata_path):
             with open(self.metadata_path, 'rb') as f:
-                return pickle.load(f)
-        return []
+                metadata = pickle.load(f)
+                try:
+                    write_id = pickle.load(f)
+                except EOFError:
+                    pass  # saved before write ids were recorded
+        # Changes with every save, even one that leaves the chunk count unchanged,
+        # so callers caching chunk positions can tell they are stale
+        self.revision = (self.version, write_id)
+        return metadata
     
+    @instrument('index_save', 'faiss')
     def _save_index(self):
         """Save FAISS index to disk"""
-        faiss.write_index(self.index, self.index_path)
+        import faiss
+        _replace_file(self.index_path, lambda temp_path: faiss.write_index(self.index, temp_path))
     
+    @instrument('index_save', 'metadata')
     def _save_metadata(self):
         """Save metadata to disk"""
-        with open(self.metadata_path, 'wb') as f:
-            pickle.dump(self.metadata, f)
+        write_id = uuid.uuid4().hex
+
+        def write(temp_path):
+            with open(temp_path, 'wb') as f:
+                pickle.dump(self.metadata, f)
+                pickle.dump(write_id, f)  # after the list, so a plain pickle.load still reads the chunks
+
+        _replace_file(self.metadata_path, write)
+        self.revision = (self.version, write_id)
+        self._filter_columns = None  # Metadata changed, rebuild on next filtered search
+    
+    def _get_filter_columns(self) -> Dict[str, np.ndarray]:
+        """Per-chunk doc_id, page_start and page_end arrays, aligned with index positions"""
+        if self._filter_columns is None:
+            # Chunks that do not record a page range (recursive chunking) cover their page_number only
+            pages = [item['metadata'].get('page_number', 0) for item in self.metadata]
+            self._filter_columns = {
+                'doc_id': np.array([item['metadata'].get('doc_id', -1) for item in self.metadata], dtype='int64'),
+                'page_start': np.array([item['metadata'].get('page_start', page)
+                                        for item, page in zip(self.metadata, pages)], dtype='int64'),
+                'page_end': np.array([item['metadata'].get('page_end', page)
+                                      for item, page in zip(self.metadata, pages)], dtype='int64')
+            }
+        return self._filter_columns
+    
+    def select_ids(self, filters: Dict) -> np.ndarray:
+        """
+        Resolve filters to the index positions they allow
+        
+        Supported keys: 'doc_ids' (iterable), 'page_start' and 'page_end'
+        (inclusive; a chunk spanning pages matches if any of its pages is in range)
+        """
+        columns = self._get_filter_columns()
+        mask = np.ones(len(self.metadata), dtype=bool)
+        if filters.get('doc_ids') is not None:
+            mask &= np.isin(columns['doc_id'], np.fromiter(filters['doc_ids'], dtype='int64'))
+        if filters.get('page_start') is not None:
+            mask &= columns['page_end'] >= filters['page_start']
+        if filters.get('page_end') is not None:
+            mask &= columns['page_start'] <= filters['page_end']
+        return np.nonzero(mask)[0].astype('int64')
     
+    def _reconstruct(self, ids) -> np.ndarray:
+        """Fetch stored vectors for index positions"""
+        ids = np.asarray(ids, dtype='int64')
+        if hasattr(self.index, 'reconstruct_batch'):
+            return np.asarray(self.index.reconstruct_batch(ids), dtype='float32')
+        return np.array([self.index.reconstruct(int(idx)) for idx in ids], dtype='float32')
+    
+    @instrument('embedding', 'generate_embeddings')
     def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """Generate embeddings using HuggingFace sentence-transformers"""
         try:
@@ -71,30 +385,34 @@ class VectorStore:
         if not chunks:
             return
         
-        # Extract texts and metadata
-        texts = [chunk['text'] for chunk in chunks]
-        metadatas = [chunk['metadata'] for chunk in chunks]
-        
         # Generate embeddings
-        embeddings = self.generate_embeddings(texts)
+        embeddings = self.generate_embeddings([chunk['text'] for chunk in chunks])
         
+        self.append_embeddings(chunks, embeddings)
+        self.save()
+    
+    def append_embeddings(self, chunks: List[Dict[str, any]], embeddings: np.ndarray):
+        """Add already embedded chunks to the in-memory index (call save() to persist)"""
         # Add to FAISS index
-        self.index.add(embeddings)
+        self.index.add(np.asarray(embeddings, dtype='float32'))
         
         # Store metadata with text
-        for text, metadata in zip(texts, metadatas):
+        for chunk in chunks:
             self.metadata.append({
-                'text': text,
-                'metadata': metadata
+                'text': chunk['text'],
+                'metadata': chunk['metadata']
             })
-        
-        # Save to disk
+        self._filter_columns = None
+    
+    def save(self):
+        """Persist the index and metadata to disk (the index first; see _align)"""
         self._save_index()
         self._save_metadata()
     
-    def search(self, query: str, k: int = None) -> List[Dict[str, any]]:
+    @instrument('vector_search', 'search')
+    def search(self, query: str, k: int = None, filters: Optional[Dict] = None) -> List[Dict[str, any]]:
         """
-        Search for similar documents
+        Search for similar documents, optionally restricted by filters (see select_ids)
         
         Returns:
             List of dicts with 'text', 'metadata', and 'score'
@@ -106,14 +424,34 @@ class VectorStore:
         if self.index.ntotal == 0:
             return []
         
-        # Limit k to available vectors
-        k = min(k, self.index.ntotal)
-        
         # Generate query embedding
         query_embedding = self.generate_embeddings([query])[0]
-        query_embedding = np.array([query_embedding], dtype='float32')
+        return self.search_by_vector(query_embedding, k, filters=filters)
+    
+    @instrument('vector_search', 'search_by_vector')
+    def search_by_vector(self, query_embedding: np.ndarray, k: int = None,
+                         filters: Optional[Dict] = None) -> List[Dict[str, any]]:
+        """
+        Search with a precomputed query embedding
+        
+        Returns:
+            List of dicts with 'id', 'text', 'metadata', and 'score'
+        """
+        if k is None:
+            k = Config.TOP_K_RETRIEVAL
+        
+        # Handle empty index
+        if self.index.ntotal == 0:
+            return []
+        
+        if filters:
+            return self._search_filtered(query_embedding, k, self.select_ids(filters))
+        
+        # Limit k to available vectors
+        k = min(k, self.index.ntotal)
         
         # Search in FAISS
+        query_embedding = np.array([query_embedding], dtype='float32')
         distances, indices = self.index.search(query_embedding, k)
         
         # Format results
@@ -121,6 +459,7 @@ class VectorStore:
         for idx, distance in zip(indices[0], distances[0]):
             if idx != -1 and idx < len(self.metadata):
                 result = {
+                    'id': int(idx),
                     'text': self.metadata[idx]['text'],
                     'metadata': self.metadata[idx]['metadata'],
                     'score': float(distance)
@@ -129,6 +468,92 @@ class VectorStore:
         
         return results
     
+    @instrument('vector_search', 'search_batch')
+    def search_batch(self, query_embeddings: np.ndarray, k: int = None) -> List[List[Dict[str, any]]]:
+        """
+        Search for many query embeddings with a single FAISS call
+        
+        Returns:
+            One result list per query row, formatted as in search_by_vector
+        """
+        if k is None:
+            k = Config.TOP_K_RETRIEVAL
+        
+        if self.index.ntotal == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        
+        k = min(k, self.index.ntotal)
+        distances, indices = self.index.search(np.asarray(query_embeddings, dtype='float32'), k)
+        
+        return [
+            [
+                {
+                    'id': int(idx),
+                    'text': self.metadata[idx]['text'],
+                    'metadata': self.metadata[idx]['metadata'],
+                    'score': float(distance)
+                }
+                for idx, distance in zip(row_indices, row_distances)
+                if idx != -1 and idx < len(self.metadata)
+            ]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+    
+    def _search_filtered(self, query_embedding: np.ndarray, k: int, ids: np.ndarray) -> List[Dict[str, any]]:
+        """Search only the given index positions"""
+        if len(ids) == 0:
+            return []
+        k = min(k, len(ids))
+        
+        if len(ids) <= Config.FILTER_EXACT_SCAN_MAX:
+            # Small scope: score just the allowed vectors, cost grows with the scope
+            results = self.score_ids(ids.tolist(), query_embedding)
+            results.sort(key=lambda result: result['score'])
+            return results[:k]
+        
+        # Large scope: let FAISS skip everything outside the selection
+        import faiss
+        selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+        params = faiss.SearchParameters(sel=selector)
+        distances, indices = self.index.search(
+            np.array([query_embedding], dtype='float32'), k, params=params
+        )
+        return [
+            {
+                'id': int(idx),
+                'text': self.metadata[idx]['text'],
+                'metadata': self.metadata[idx]['metadata'],
+                'score': float(distance)
+            }
+            for idx, distance in zip(indices[0], distances[0])
+            if idx != -1 and idx < len(self.metadata)
+        ]
+    
+    @instrument('vector_search', 'score_ids')
+    def score_ids(self, ids: List[int], query_embedding: np.ndarray) -> List[Dict[str, any]]:
+        """
+        Score specific stored chunks against a query embedding without searching
+        
+        Returns:
+            List of dicts with 'id', 'text', 'metadata', and 'score' (squared L2, as in search)
+        """
+        ids = [idx for idx in ids if 0 <= idx < min(self.index.ntotal, len(self.metadata))]
+        if not ids:
+            return []
+        
+        vectors = self._reconstruct(ids)
+        distances = ((vectors - np.asarray(query_embedding, dtype='float32')) ** 2).sum(axis=1)
+        
+        return [
+            {
+                'id': idx,
+                'text': self.metadata[idx]['text'],
+                'metadata': self.metadata[idx]['metadata'],
+                'score': float(distance)
+            }
+            for idx, distance in zip(ids, distances)
+        ]
+    
     def delete_document(self, doc_id: int):
         """
         Delete all chunks for a specific document
@@ -143,28 +568,49 @@ class VectorStore:
         if len(remaining_chunks) == len(self.metadata):
             return  # Nothing to delete
         
-        # Rebuild index
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.metadata = []
-        
-        if remaining_chunks:
-            # Re-add remaining chunks
-            texts = [item['text'] for item in remaining_chunks]
-            embeddings = self.generate_embeddings(texts)
-            self.index.add(embeddings)
-            self.metadata = remaining_chunks
+        # Rebuild index from the remaining chunks
+        self._rebuild_index(remaining_chunks)
+        self.metadata = remaining_chunks
         
         # Save
         self._save_index()
         self._save_metadata()
     
+    def truncate_document(self, doc_id: int, keep: int) -> int:
+        """
+        Drop a document's chunks beyond the first `keep` (in insertion order)
+        
+        Used to roll a partially ingested document back to its last checkpoint.
+        
+        Returns:
+            Number of chunks removed
+        """
+        positions = [
+            position for position, item in enumerate(self.metadata)
+            if item['metadata'].get('doc_id') == doc_id
+        ][max(0, keep):]
+        if not positions:
+            return 0
+        
+        # IndexFlat shifts later vectors down, matching the metadata list deletion below
+        self.index.remove_ids(np.array(positions, dtype='int64'))
+        drop = set(positions)
+        self.metadata = [item for position, item in enumerate(self.metadata) if position not in drop]
+        self.save()
+        return len(positions)
+    
     def clear(self):
         """Clear all documents from vector store"""
+        import faiss
         self.index = faiss.IndexFlatL2(self.dimension)
         self.metadata = []
         self._save_index()
         self._save_metadata()
     
+    def count_document_chunks(self, doc_id: int) -> int:
+        """Number of chunks stored for a document"""
+        return sum(1 for item in self.metadata if item['metadata'].get('doc_id') == doc_id)
+    
     def get_document_count(self) -> int:
         """Get number of unique documents in store"""
         doc_ids = set(item['metadata'].get('doc_id') for item in self.metadata)
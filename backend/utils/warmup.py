@@ -0,0 +1,104 @@
+"""
+Model warm-up and readiness
+
+Heavy dependencies (torch via the embedding model, FAISS, the LLM SDKs) are
+imported on first use so the API process starts quickly. Left alone, the
+first query after a deploy would pay for all of them. warm_up() loads them
+in the background at startup instead, and readiness() reports when it is
+done, for load balancer readiness probes (/api/health stays a liveness check).
+"""
+import threading
+import time
+from typing import Dict
+from config import Config
+from utils.logger import get_logger
+
+logger = get_logger('warmup')
+
+_state = {'status': 'idle', 'started': None, 'finished': None, 'components': {}}
+_state_lock = threading.Lock()
+
+def _load_embeddings():
+    from utils.vector_store import get_embeddings
+    get_embeddings(Config.LOCAL_EMBEDDING_MODEL).embed_query("warm up")
+
+def _load_faiss():
+    import faiss  # noqa: F401
+
+def _load_pdf_reader():
+    import importlib
+    from utils.pdf_backends import get_pdf_backend
+    importlib.import_module(get_pdf_backend().module)
+
+def _load_llm_client():
+    from utils.rag_pipeline import get_llm_client
+    get_llm_client()
+
+def _load_tokenizer():
+    from utils.tokenizer import get_encoding
+    get_encoding()  # falls back to estimates if unavailable, so never blocks readiness
+
+def _load_reranker():
+    from utils.reranker import Reranker
+    Reranker.is_available()  # disables itself if the model cannot be loaded
+
+# (name, loader, required for readiness)
+COMPONENTS = [
+    ('embeddings', _load_embeddings, True),
+    ('vector_index', _load_faiss, True),
+    ('pdf_reader', _load_pdf_reader, True),
+    ('llm_client', _load_llm_client, True),
+    ('tokenizer', _load_tokenizer, False),
+]
+
+def warm_up():
+    """Load every heavy component once, recording how long each took (runs in a background thread)"""
+    components = COMPONENTS + ([('reranker', _load_reranker, False)] if Config.RERANK_ENABLED else [])
+    with _state_lock:
+        if _state['status'] != 'idle':
+            return
+        _state['status'] = 'warming'
+        _state['started'] = time.time()
+        _state['components'] = {name: {'status': 'pending', 'required': required} for name, _, required in components}
+
+    failed = False
+    for name, loader, required in components:
+        started = time.perf_counter()
+        try:
+            loader()
+            status, error = 'ready', None
+        except Exception as e:
+            logger.exception("Warm-up failed", extra={'component': name})
+            status, error = 'failed', str(e)
+            failed = failed or required
+        with _state_lock:
+            entry = _state['components'][name]
+            entry.update(status=status, load_ms=round((time.perf_counter() - started) * 1000, 1))
+            if error:
+                entry['error'] = error
+
+    with _state_lock:
+        _state['status'] = 'failed' if failed else 'ready'
+        _state['finished'] = time.time()
+    logger.info("Warm-up finished", extra={
+        'status': _state['status'],
+        'duration_ms': round((_state['finished'] - _state['started']) * 1000, 1)
+    })
+
+def readiness() -> Dict:
+    """
+    Warm-up state for the readiness probe
+
+    Ready once every required component has loaded. When warm-up is disabled
+    the process is reported ready at once and components load on first use.
+    """
+    with _state_lock:
+        status = _state['status']
+        components = {name: dict(entry) for name, entry in _state['components'].items()}
+        started, finished = _state['started'], _state['finished']
+    if status == 'idle' and not Config.WARMUP_ON_STARTUP:
+        status = 'lazy'
+    result = {'ready': status in ('ready', 'lazy'), 'status': status, 'components': components}
+    if started:
+        result['warmup_ms'] = round(((finished or time.time()) - started) * 1000, 1)
+    return result
@@ -51,8 +51,14 @@ export default function Chat() {
   
   const loadSession = async (sessionId) => {
     try {
-      const response = await chatAPI.getSessionHistory(sessionId)
-      const history = response.data.history
+      // Session history comes in pages, oldest first: follow the cursor to get the whole conversation
+      const history = []
+      let cursor = null
+      do {
+        const response = await chatAPI.getSessionHistory(sessionId, cursor)
+        history.push(...response.data.history)
+        cursor = response.data.next_cursor
+      } while (cursor)
       
       // Convert history to messages format
       const msgs = []
@@ -3,6 +3,9 @@ import { documentsAPI } from '../services/api'
 import { Upload, FileText, Trash2, FileCheck, AlertCircle, Sparkles, X } from 'lucide-react'
 import ReactMarkdown from 'react-markdown'
 
+// Keep in sync with Config.ALLOWED_EXTENSIONS on the backend
+const ACCEPTED_EXTENSIONS = ['.pdf', '.docx', '.html', '.htm', '.xhtml', '.md', '.markdown', '.txt', '.text']
+
 export default function Documents() {
   const [documents, setDocuments] = useState([])
   const [loading, setLoading] = useState(true)
@@ -56,7 +59,7 @@ export default function Documents() {
     setDragActive(false)
     
     const files = Array.from(e.dataTransfer.files).filter(
-      file => file.type === 'application/pdf'
+      file => ACCEPTED_EXTENSIONS.some(extension => file.name.toLowerCase().endsWith(extension))
     )
     setSelectedFiles(files)
   }
@@ -121,7 +124,7 @@ export default function Documents() {
     <div className="p-8 animate-fade-in">
       <div className="mb-8">
         <h1 className="text-3xl font-bold text-gray-900 mb-2">Documents</h1>
-        <p className="text-gray-600">Upload and manage your PDF documents</p>
+        <p className="text-gray-600">Upload and manage your documents</p>
       </div>
       
       {/* Upload Section */}
@@ -141,16 +144,16 @@ export default function Documents() {
         >
           <Upload className="w-12 h-12 text-gray-400 mx-auto mb-4" />
           <p className="text-lg font-medium text-gray-900 mb-2">
-            Drop PDF files here or click to browse
+            Drop files here or click to browse
           </p>
           <p className="text-sm text-gray-500 mb-4">
-            Support for multiple files • Max 50MB per file
+            PDF, Word (.docx), HTML, Markdown and text • Multiple files • Max 50MB per file
           </p>
           
           <input
             type="file"
             multiple
-            accept=".pdf"
+            accept={ACCEPTED_EXTENSIONS.join(',')}
             onChange={handleFileSelect}
             className="hidden"
             id="file-upload"
@@ -227,7 +230,7 @@ export default function Documents() {
           <div className="text-center py-12">
             <FileText className="w-16 h-16 text-gray-300 mx-auto mb-4" />
             <h3 className="text-lg font-medium text-gray-900 mb-2">No documents yet</h3>
-            <p className="text-gray-600">Upload your first PDF document to get started</p>
+            <p className="text-gray-600">Upload your first document to get started</p>
           </div>
         ) : (
           <div className="space-y-3">
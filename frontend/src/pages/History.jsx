@@ -4,7 +4,9 @@ import { History as HistoryIcon, Trash2, MessageSquare, FileText, Clock } from '
 
 export default function History() {
   const [history, setHistory] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   
   useEffect(() => {
     loadHistory()
@@ -14,6 +16,7 @@ export default function History() {
     try {
       const response = await chatAPI.getHistory()
       setHistory(response.data.history)
+      setNextCursor(response.data.next_cursor)
     } catch (error) {
       console.error('Failed to load history:', error)
     } finally {
@@ -21,12 +24,28 @@ export default function History() {
     }
   }
   
+  // History is paginated newest first; each page continues after the last item shown
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const response = await chatAPI.getHistory(50, nextCursor)
+      setHistory(prev => [...prev, ...response.data.history])
+      setNextCursor(response.data.next_cursor)
+    } catch (error) {
+      console.error('Failed to load more history:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+  
   const handleClearHistory = async () => {
     if (!confirm('Are you sure you want to clear all chat history?')) return
     
     try {
       await chatAPI.clearHistory()
       setHistory([])
+      setNextCursor(null)
     } catch (error) {
       console.error('Failed to clear history:', error)
       alert('Failed to clear history. Please try again.')
@@ -118,6 +137,18 @@ export default function History() {
               </div>
             </div>
           ))}
+          
+          {nextCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="btn btn-secondary disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
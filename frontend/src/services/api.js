@@ -60,8 +60,8 @@ export const documentsAPI = {
     })
   },
   
-  getAll: () =>
-    api.get('/documents'),
+  getAll: (params = {}) =>
+    api.get('/documents', { params }),
   
   getById: (id) =>
     api.get(`/documents/${id}`),
@@ -81,14 +81,14 @@ export const chatAPI = {
   query: (question, session_id = null) =>
     api.post('/chat/query', { question, session_id }),
   
-  getHistory: (limit = 50) =>
-    api.get('/chat/history', { params: { limit } }),
+  getHistory: (limit = 50, cursor = null) =>
+    api.get('/chat/history', { params: { limit, ...(cursor && { cursor }) } }),
   
   getSessions: () =>
     api.get('/chat/sessions'),
   
-  getSessionHistory: (session_id) =>
-    api.get(`/chat/sessions/${session_id}`),
+  getSessionHistory: (session_id, cursor = null) =>
+    api.get(`/chat/sessions/${session_id}`, { params: cursor ? { cursor } : {} }),
   
   clearHistory: () =>
     api.delete('/chat/history'),